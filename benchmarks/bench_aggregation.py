@@ -0,0 +1,154 @@
+"""
+Compare the legacy per-project, per-date mask loops against the vectorized
+aggregation engine in focusledger.aggregation, and a full re-pivot of the
+history against an incremental DailyTotals update with one new day of entries.
+
+Usage:
+    python benchmarks/bench_aggregation.py [--sizes 1000 100000 1000000]
+                                           [--projects 40] [--days 365]
+                                           [--legacy-max 1000000]
+
+The legacy loops are O(projects x days x entries); at 1M entries they take
+minutes, so --legacy-max can be lowered to skip them on large sizes.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from array import array  # noqa: E402
+from focusledger.aggregation import DailyTotals, daily_totals, rolling_mean, rolling_sum  # noqa: E402
+from focusledger.ingest import EntryColumns  # noqa: E402
+
+
+def make_frame(n_entries, n_projects, n_days, seed=0):
+    """Build a frame shaped like the one the graph builders work on."""
+    rng = np.random.default_rng(seed)
+    day = rng.integers(0, n_days, n_entries)
+    start = pd.Timestamp('2024-01-01', tz='UTC') + pd.to_timedelta(day, unit='D') \
+        + pd.to_timedelta(rng.integers(0, 20 * 3600, n_entries), unit='s')
+    seconds = rng.integers(60, 4 * 3600, n_entries).astype(np.float64)
+    df = pd.DataFrame({
+        'project': np.asarray([f'Project {i}' for i in range(n_projects)], dtype=object)[
+            rng.integers(0, n_projects, n_entries)],
+        'start': start,
+    })
+    df['seconds'] = seconds
+    df['duration'] = seconds / 3600.0
+    df['date'] = df['start'].dt.date
+    return df
+
+
+def legacy_rolling_sum(df, window):
+    all_dates = pd.date_range(df['date'].min(), df['date'].max())
+    result = []
+    for project in df['project'].unique():
+        proj_df = df[df['project'] == project]
+        for date in all_dates:
+            window_start = date - pd.Timedelta(days=window - 1)
+            mask = (proj_df['date'] >= window_start.date()) & (proj_df['date'] <= date.date())
+            result.append(proj_df.loc[mask, 'duration'].sum())
+    return np.array(result).reshape(-1, len(all_dates))
+
+
+def legacy_rolling_avg_of_sum(df, sum_window, avg_window):
+    sums = legacy_rolling_sum(df, sum_window)
+    return np.vstack([
+        pd.Series(row).rolling(window=avg_window, min_periods=1).mean().to_numpy()
+        for row in sums
+    ])
+
+
+def engine_rolling_sum(df, window):
+    _, _, seconds = daily_totals(df['project'], df['date'], df['seconds'])
+    return rolling_sum(seconds, window) / 3600.0
+
+
+def engine_rolling_avg_of_sum(df, sum_window, avg_window):
+    _, _, seconds = daily_totals(df['project'], df['date'], df['seconds'])
+    return rolling_mean(rolling_sum(seconds, sum_window), avg_window) / 3600.0
+
+
+def make_columns(df, first_id=0):
+    """Turn a benchmark frame into EntryColumns keyed by project number."""
+    columns = EntryColumns()
+    start = df['start'].astype('int64').to_numpy() / 1e9
+    columns.id = array('q', np.arange(first_id, first_id + len(df), dtype=np.int64).tobytes())
+    columns.start = array('d', start.tobytes())
+    columns.stop = array('d', (start + df['seconds'].to_numpy()).tobytes())
+    columns.project_id = array('d', df['project'].str.slice(8).astype(np.float64).to_numpy().tobytes())
+    columns.duration = array('d', df['seconds'].to_numpy().tobytes())
+    columns.deleted = array('b', bytes(len(df)))
+    return columns
+
+
+def incremental_refresh(size, n_projects, n_days, window):
+    """Time folding one new day of entries into DailyTotals against a full re-pivot."""
+    history = make_frame(size, n_projects, n_days)
+    today = make_frame(max(1, size // n_days), n_projects, 1, seed=1)
+    today['start'] += pd.Timedelta(days=n_days)
+    totals = DailyTotals()
+    totals.apply(make_columns(history))
+    combined = pd.concat([history, today], ignore_index=True)
+    _, full_time = timed(engine_rolling_sum, combined, window)
+    delta = make_columns(today, first_id=size)
+
+    now = today['start'].max().timestamp()
+
+    def update():
+        totals.apply(delta)
+        return totals.view(window + 7, now=now).rolling_sum(window)
+
+    _, update_time = timed(update)
+    return full_time, update_time
+
+
+def timed(func, *args):
+    begin = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--projects', type=int, default=40)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--window', type=int, default=7)
+    parser.add_argument('--legacy-max', type=int, default=1_000_000,
+                        help='skip the legacy loops above this many entries')
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'case':<18} {'legacy (s)':>12} {'engine (s)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        df = make_frame(size, args.projects, args.days)
+        cases = [
+            ('rolling sum/avg', legacy_rolling_sum, engine_rolling_sum, (args.window,)),
+            ('avg of sums', legacy_rolling_avg_of_sum, engine_rolling_avg_of_sum,
+             (args.window, args.window)),
+        ]
+        for name, legacy, engine, params in cases:
+            new, new_time = timed(engine, df, *params)
+            if size > args.legacy_max:
+                print(f'{size:>10} {name:<18} {"skipped":>12} {new_time:>12.4f} {"-":>9}')
+                continue
+            old, old_time = timed(legacy, df, *params)
+            if not np.allclose(old, new, rtol=1e-9, atol=1e-9):
+                raise SystemExit(f'{name}: engine output differs from legacy at {size} entries')
+            print(f'{size:>10} {name:<18} {old_time:>12.4f} {new_time:>12.4f} '
+                  f'{old_time / new_time:>8.0f}x')
+
+    print(f"\n{'entries':>10} {'case':<18} {'re-pivot (s)':>12} {'update (s)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        full_time, update_time = incremental_refresh(size, args.projects, args.days, args.window)
+        print(f'{size:>10} {"one new day":<18} {full_time:>12.4f} {update_time:>12.4f} '
+              f'{full_time / update_time:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
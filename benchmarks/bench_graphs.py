@@ -0,0 +1,206 @@
+"""
+Time and measure peak memory of the graph builders and of the end-to-end
+refresh (load_dataset plus the three graph callbacks) on seeded synthetic
+Toggl data, with Toggl's HTTP API served locally, and write the results to
+JSON so runs can be compared.
+
+Usage:
+    python benchmarks/bench_graphs.py [--projects 20] [--days 365]
+                                      [--entries-per-day 8] [--running 1]
+                                      [--midnight-spanning 0.05] [--seed 0]
+                                      [--repeat 5] [--output results.json]
+                                      [--compare previous.json]
+
+Each case runs --repeat times for timing (min and median are reported) and
+once more under tracemalloc for its peak Python allocation.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import FakeTogglSession, generate_dataset  # noqa: E402
+from focusledger import app as app_module  # noqa: E402
+from focusledger import toggl_client  # noqa: E402
+from focusledger.graphing import (  # noqa: E402
+    prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph,
+)
+from focusledger.preprocessing import prepare_daily_view  # noqa: E402
+from focusledger.store import EntryStore  # noqa: E402
+from focusledger.tenants import TenantRegistry  # noqa: E402
+from focusledger.toggl_projects import ProjectCache  # noqa: E402
+
+TOKEN = 'benchmark-token'
+WINDOW = 7
+
+
+def measure(func, repeat, setup=None):
+    """Run func() `repeat` times for timing and once under tracemalloc; setup() runs untimed before each call."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        begin = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - begin)
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {
+        'seconds_min': min(times),
+        'seconds_median': statistics.median(times),
+        'peak_mib': peak / 2 ** 20,
+    }
+
+
+def graph_cases(entries, projects, days):
+    """(name, builder) pairs: each graph built from raw entries and from the store's daily totals."""
+    store = EntryStore()
+    store.merge(entries)
+    view = prepare_daily_view(store.totals, days + 2 * WINDOW, projects)
+    builders = [
+        ('cumulative', lambda data: prepare_cumulative_graph(data, projects, days_to_show=days, rolling_window=WINDOW)),
+        ('average', lambda data: prepare_rolling_average_graph(data, projects, days_to_show=days, rolling_window=WINDOW)),
+        ('sumavg', lambda data: prepare_rolling_avg_of_sum_graph(data, projects, days_to_show=days,
+                                                                 sum_window=WINDOW, avg_window=WINDOW)),
+    ]
+    for name, build in builders:
+        yield f'{name}/entries', lambda build=build: build(entries)
+        yield f'{name}/view', lambda build=build: build(view)
+
+
+def install_fake_toggl(entries, projects):
+    """Point the app at a fresh process state and a local Toggl; returns the fake session."""
+    session = FakeTogglSession(entries, projects)
+    toggl_client._default_client = toggl_client.TogglClient(session=session)
+    app_module.tenants = TenantRegistry()
+    app_module.project_cache = ProjectCache()
+    app_module.scheduler = None
+    os.environ['TOGGL_API_TOKEN'] = TOKEN
+    return session
+
+
+def refresh(days, n_clicks=0, handle=None):
+    """One Refresh as the browser drives it: load the dataset, then build all three graphs."""
+    handle = app_module.load_dataset(n_clicks, days, WINDOW, days, WINDOW, days, WINDOW, WINDOW, 'day', handle)[0]
+    figures = [
+        app_module.update_cumulative_graph(handle, days, WINDOW),
+        app_module.update_average_graph(handle, days, WINDOW),
+        app_module.update_sumavg_graph(handle, days, WINDOW, WINDOW),
+    ]
+    return handle, figures
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, params, previous_path):
+    with open(previous_path) as f:
+        report = json.load(f)
+    previous = {r['case']: r for r in report['results']}
+    changed = {k for k in ('projects', 'days', 'entries_per_day', 'running', 'midnight_spanning', 'seed')
+               if report['meta']['params'].get(k) != params[k]}
+    if changed:
+        print(f"\nwarning: {previous_path} was run with different {', '.join(sorted(changed))}")
+    print(f"\n{'case':<22} {'before (s)':>11} {'after (s)':>11} {'change':>8} {'peak MiB':>17}")
+    for result in results:
+        before = previous.get(result['case'])
+        if before is None:
+            continue
+        change = result['seconds_median'] / before['seconds_median'] - 1
+        print(f"{result['case']:<22} {before['seconds_median']:>11.4f} {result['seconds_median']:>11.4f} "
+              f"{change:>+7.0%} {before['peak_mib']:>8.1f}->{result['peak_mib']:<7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--entries-per-day', type=float, default=8.0)
+    parser.add_argument('--running', type=int, default=1)
+    parser.add_argument('--midnight-spanning', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='print the change against an earlier JSON result file')
+    args = parser.parse_args()
+
+    entries, projects = generate_dataset(args.projects, args.days, args.entries_per_day, args.running,
+                                         args.midnight_spanning, seed=args.seed)
+    results = []
+
+    def record(case, stats, **extra):
+        results.append({'case': case, **stats, **extra})
+        print(f"{case:<22} {stats['seconds_median']:>10.4f}s (min {stats['seconds_min']:.4f}s) "
+              f"peak {stats['peak_mib']:>7.1f} MiB" + ''.join(f' {k}={v}' for k, v in extra.items()))
+
+    print(f"{len(entries)} entries, {len(projects)} projects, {args.days} days")
+    for case, build in graph_cases(entries, projects, args.days):
+        figure, stats = measure(build, args.repeat)
+        record(case, stats)
+        if case.endswith('/view'):
+            payload, stats = measure(figure.to_json, args.repeat)
+            record(case.replace('/view', '/serialize'), stats, payload_bytes=len(payload))
+
+    # End to end: a cold refresh backfills the whole window; a warm one syncs changes and hits the caches
+    days = args.days - 2 * WINDOW
+    requests = []
+
+    def cold_setup():
+        requests.append(install_fake_toggl(entries, projects))
+        return (days,)
+
+    _, stats = measure(refresh, args.repeat, setup=cold_setup)
+    record('end_to_end/cold', stats, toggl_requests=requests[-1].requests)
+
+    session = install_fake_toggl(entries, projects)
+    handle, _ = refresh(days)
+    clicks = iter(range(1, 10 ** 6))
+    before = session.requests
+    _, stats = measure(lambda: refresh(days, next(clicks), handle), args.repeat)
+    record('end_to_end/warm', stats, toggl_requests=(session.requests - before) // (args.repeat + 1))
+
+    if args.compare:
+        compare(results, vars(args), args.compare)
+    if args.output:
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'plotly': plotly.__version__,
+                'machine': platform.machine(),
+                'params': vars(args),
+                'entries': len(entries),
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Report where a FocusLedger process spends its startup: the import time of
+focusledger.app broken down by top-level package and by focusledger module
+(from `python -X importtime`), and the graph warm-up that the WSGI entry
+point runs before serving.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--top 15]
+                                       [--output startup.json]
+
+Every run is a fresh interpreter; medians over --repeat runs are reported.
+Heavy packages that only appear here because they are installed (e.g.
+IPython, which Dash imports when available) can be left out of the serving
+environment.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import focusledger.app
+imported = time.perf_counter()
+from focusledger.graphing import warm_up
+warm = warm_up()
+print(json.dumps({'import': imported - started, 'warm_up': warm}))
+"""
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run_once():
+    """Start one interpreter; returns (wall seconds, child timings, [(self, cumulative, depth, module)])."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=ROOT, capture_output=True,
+                          text=True, check=True, env={**os.environ, 'PYTHONPATH': ROOT})
+    wall = time.perf_counter() - started
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2, module))
+    return wall, json.loads(proc.stdout.strip().splitlines()[-1]), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='packages to list')
+    parser.add_argument('--output', help='write the report to this JSON file')
+    args = parser.parse_args()
+
+    walls, phases, packages, modules = [], defaultdict(list), defaultdict(list), defaultdict(list)
+    for _ in range(args.repeat):
+        wall, timings, imports = run_once()
+        walls.append(wall)
+        for phase, seconds in timings.items():
+            phases[phase].append(seconds)
+        # Self time summed per top-level package; cumulative time per focusledger module
+        per_package = defaultdict(float)
+        for self_s, cumulative_s, _, module in imports:
+            per_package[module.split('.')[0]] += self_s
+            if module.startswith('focusledger'):
+                modules[module].append(cumulative_s)
+        for package, seconds in per_package.items():
+            packages[package].append(seconds)
+
+    median = {name: statistics.median(values) for name, values in phases.items()}
+    report = {
+        'wall': statistics.median(walls),
+        'import_app': median['import'],
+        'warm_up': median['warm_up'],
+        'packages': {p: statistics.median(v) for p, v in packages.items()},
+        'focusledger_modules': {m: statistics.median(v) for m, v in modules.items()},
+    }
+    print(f"process start to ready: {report['wall']:.3f}s (median of {args.repeat})")
+    print(f"  import focusledger.app  {report['import_app']:.3f}s")
+    print(f"  graph warm-up           {report['warm_up']:.3f}s")
+    print(f"\n{'package (self time)':<28} {'seconds':>8} {'share':>7}")
+    total = sum(report['packages'].values())
+    for package, seconds in sorted(report['packages'].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28} {seconds:>8.3f} {seconds / total:>7.1%}")
+    print(f"\n{'focusledger module (cumulative)':<34} {'seconds':>8}")
+    for module, seconds in sorted(report['focusledger_modules'].items(), key=lambda item: -item[1]):
+        print(f"{module:<34} {seconds:>8.3f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Local stand-in for the Toggl API v9, serving seeded synthetic data (see
+synthetic.py) for load and soak tests without touching api.track.toggl.com.
+
+Usage:
+    python benchmarks/fake_toggl.py [--port 8099] [--projects 20] [--days 365]
+                                    [--entries-per-day 8] [--pad-bytes 0]
+                                    [--latency 0.05] [--jitter 0.05]
+                                    [--rate-limit 0.01] [--retry-after 1]
+                                    [--quota 0] [--quota-window 3600]
+
+Then point FocusLedger at it:
+    TOGGL_API_BASE_URL=http://127.0.0.1:8099/api/v9 TOGGL_API_TOKEN=any \\
+        gunicorn -c gunicorn.conf.py focusledger.wsgi:server
+
+GET /me/time_entries honors start_date/end_date and since, GET /me/projects
+answers If-None-Match with 304, and GET /stats returns request counts. Every
+response waits --latency plus up to --jitter seconds; --rate-limit is the
+fraction of requests answered 429 with Retry-After, and --quota caps each API
+token at that many requests per --quota-window seconds, reported in the
+X-Toggl-Quota-Remaining/X-Toggl-Quota-Resets-In headers as Toggl does.
+--pad-bytes grows every entry's description to inflate the payloads.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import FakeTogglSession, generate_dataset  # noqa: E402
+
+API_PREFIX = '/api/v9'
+
+
+class FakeToggl:
+    """Responses, injected latency and rate limiting of the fake server, shared by its handler threads."""
+
+    def __init__(self, session, latency=0.0, jitter=0.0, rate_limit=0.0, retry_after=1, quota=0,
+                 quota_window=3600, seed=0):
+        self.session = session
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.quota = quota
+        self.quota_window = quota_window
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._quotas = {}
+        self.statuses = Counter()
+        self.bytes_sent = 0
+        self.projects_etag = '"%s"' % hashlib.sha1(session.body('/me/projects', {})).hexdigest()
+
+    def _spend_quota(self, token):
+        # Returns (remaining, resets_in) after this request, or None without a quota
+        if not self.quota:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            used, window_start = self._quotas.get(token, (0, now))
+            if now - window_start >= self.quota_window:
+                used, window_start = 0, now
+            used += 1
+            self._quotas[token] = (used, window_start)
+        return self.quota - used, math.ceil(window_start + self.quota_window - now)
+
+    def respond(self, path, params, headers):
+        """Return (status, headers, body) for GET `path`."""
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            limited = self._random.random() < self.rate_limit
+        time.sleep(delay)
+        if path == '/stats':
+            with self._lock:
+                stats = {'statuses': dict(self.statuses), 'bytes_sent': self.bytes_sent}
+            return 200, {}, json.dumps(stats).encode()
+        if not path.startswith(API_PREFIX + '/me/'):
+            return 404, {}, b'"Not Found"'
+        auth = headers.get('Authorization', '')
+        if not auth.startswith('Basic '):
+            return 403, {}, b'"Incorrect username and/or password"'
+        token = base64.b64decode(auth[6:]).decode(errors='replace').split(':')[0]
+        quota = self._spend_quota(token)
+        extra = {}
+        if quota is not None:
+            remaining, resets_in = quota
+            extra = {'X-Toggl-Quota-Remaining': str(max(0, remaining)), 'X-Toggl-Quota-Resets-In': str(resets_in)}
+            if remaining < 0:
+                return 429, {**extra, 'Retry-After': str(resets_in)}, b'"Quota exceeded"'
+        if limited:
+            return 429, {**extra, 'Retry-After': str(self.retry_after)}, b'"Too Many Requests"'
+        path = path[len(API_PREFIX):]
+        if path.rstrip('/') == '/me/projects':
+            extra['ETag'] = self.projects_etag
+            if headers.get('If-None-Match') == self.projects_etag:
+                return 304, extra, b''
+        return 200, extra, self.session.body(path, params)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    toggl = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, headers, body = self.toggl.respond(url.path, dict(parse_qsl(url.query)), self.headers)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.toggl._lock:
+            self.toggl.statuses[status] += 1
+            self.toggl.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(toggl, host='127.0.0.1', port=8099, verbose=False):
+    """Return a ThreadingHTTPServer for `toggl`; call serve_forever() (e.g. on a thread) to start it."""
+    handler = type('FakeTogglHandler', (Handler,), {'toggl': toggl, 'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def pad_descriptions(entries, pad_bytes):
+    for entry in entries:
+        entry['description'] = entry['description'] + ' ' + 'x' * pad_bytes
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--entries-per-day', type=float, default=8.0)
+    parser.add_argument('--running', type=int, default=1)
+    parser.add_argument('--midnight-spanning', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pad-bytes', type=int, default=0, help='extra bytes in every entry description')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, uniformly')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of requests answered 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After of injected 429s, seconds')
+    parser.add_argument('--quota', type=int, default=0, help='requests per token per quota window, 0 for none')
+    parser.add_argument('--quota-window', type=int, default=3600, help='seconds')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    entries, projects = generate_dataset(args.projects, args.days, args.entries_per_day, args.running,
+                                         args.midnight_spanning, seed=args.seed)
+    if args.pad_bytes:
+        pad_descriptions(entries, args.pad_bytes)
+    toggl = FakeToggl(FakeTogglSession(entries, projects), args.latency, args.jitter, args.rate_limit,
+                      args.retry_after, args.quota, args.quota_window, args.seed)
+    server = make_server(toggl, args.host, args.port, args.verbose)
+    print(f"{len(entries)} entries, {len(projects)} projects on http://{args.host}:{args.port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"responses: {dict(toggl.statuses)}, {toggl.bytes_sent / 2 ** 20:.1f} MiB sent")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Drive a running FocusLedger server with concurrent dashboard refreshes, the
+way browsers do: each virtual user clicks Refresh (the load_dataset
+callback), then requests the three graphs in parallel with the returned
+dataset handle. Reports throughput and p50/p90/p99 latency per callback.
+
+Usage:
+    python benchmarks/load_driver.py [--url http://127.0.0.1:8050]
+                                     [--users 16] [--duration 30]
+                                     [--days 30] [--window 7] [--tokens 0]
+                                     [--think 0] [--output results.json]
+
+Run it against the app pointed at benchmarks/fake_toggl.py (see its usage).
+--tokens N sends N distinct API tokens in the session token field (for
+FOCUSLEDGER_MULTI_TENANT=1); by default the server's TOGGL_API_TOKEN is used.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+GRAPHS = ('cumulative-graph', 'average-graph', 'sumavg-graph')
+
+
+def _prop(text):
+    component, prop = text.rsplit('.', 1)
+    return {'id': component, 'property': prop}
+
+
+class Dashboard:
+    """Builds /_dash-update-component requests from the server's callback graph."""
+
+    def __init__(self, url, session):
+        self.url = url.rstrip('/')
+        self.session = session
+        self.callbacks = {}
+        for dependency in session.get(f'{self.url}/_dash-dependencies', timeout=30).json():
+            output = dependency['output']
+            outputs = [_prop(o) for o in output[2:-2].split('...')] if output.startswith('..') else _prop(output)
+            first = outputs[0] if isinstance(outputs, list) else outputs
+            self.callbacks[first['id']] = (output, outputs, dependency['inputs'], dependency.get('state', []))
+
+    def call(self, target, values, changed):
+        """Fire the callback whose (first) output is component `target`; returns (seconds, response JSON or None)."""
+        output, outputs, inputs, state = self.callbacks[target]
+        body = {
+            'output': output,
+            'outputs': outputs,
+            'inputs': [{**i, 'value': values.get(i['id'])} for i in inputs],
+            'state': [{**s, 'value': values.get(s['id'])} for s in state],
+            'changedPropIds': [f'{changed}'],
+        }
+        started = time.perf_counter()
+        resp = self.session.post(f'{self.url}/_dash-update-component', json=body, timeout=120)
+        elapsed = time.perf_counter() - started
+        if resp.status_code == 204:
+            return elapsed, None
+        resp.raise_for_status()
+        return elapsed, resp.json()
+
+
+def run_user(dashboard, values, deadline, think, record, graphs):
+    clicks = 0
+    while time.monotonic() < deadline:
+        clicks += 1
+        values = {**values, 'refresh': clicks}
+        started = time.perf_counter()
+        try:
+            seconds, data = dashboard.call('dataset', values, 'refresh.n_clicks')
+            record('load_dataset', seconds)
+            handle = data['response']['dataset']['data'] if data else values.get('dataset')
+            values['dataset'] = handle
+            futures = [graphs.submit(dashboard.call, graph, values, 'dataset.data') for graph in GRAPHS]
+            for graph, future in zip(GRAPHS, futures):
+                record(graph, future.result()[0])
+            record('refresh', time.perf_counter() - started)
+        except Exception as e:
+            record('error', type(e).__name__)
+        if think:
+            time.sleep(think)
+
+
+def percentiles(samples):
+    values = np.asarray(samples)
+    return {
+        'count': len(samples),
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--days', type=int, default=30, help='days shown in every graph')
+    parser.add_argument('--window', type=int, default=7, help='every rolling window, days')
+    parser.add_argument('--resolution', default='day')
+    parser.add_argument('--tokens', type=int, default=0, help='distinct session API tokens, 0 to use the server token')
+    parser.add_argument('--think', type=float, default=0.0, help='seconds between a user\'s refreshes')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.users * 4))
+    dashboard = Dashboard(args.url, session)
+    base_values = {
+        'days_to_show': args.days, 'avg_days_to_show': args.days, 'sumavg_days_to_show': args.days,
+        'rolling_window': args.window, 'avg_rolling_window': args.window,
+        'sum_window': args.window, 'avg_window': args.window, 'resolution': args.resolution,
+    }
+    lock = threading.Lock()
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    def record(name, value):
+        with lock:
+            if name == 'error':
+                errors[value] += 1
+            else:
+                samples[name].append(value)
+
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.users * len(GRAPHS)) as graphs, ThreadPoolExecutor(args.users) as users:
+        for i in range(args.users):
+            values = dict(base_values)
+            if args.tokens:
+                values['api-token'] = f'load-test-{i % args.tokens}'
+            users.submit(run_user, dashboard, values, deadline, args.think, record, graphs)
+    elapsed = time.perf_counter() - started
+
+    results = {name: percentiles(values) for name, values in samples.items()}
+    refreshes = len(samples.get('refresh', []))
+    print(f"{refreshes} refreshes in {elapsed:.1f}s by {args.users} users: {refreshes / elapsed:.2f} refreshes/s")
+    print(f"{'callback':<18} {'count':>6} {'p50 (s)':>9} {'p90 (s)':>9} {'p99 (s)':>9} {'max (s)':>9}")
+    for name, stats in results.items():
+        print(f"{name:<18} {stats['count']:>6} {stats['p50']:>9.3f} {stats['p90']:>9.3f} "
+              f"{stats['p99']:>9.3f} {stats['max']:>9.3f}")
+    if errors:
+        print(f"errors: {dict(errors)}")
+    if args.output:
+        report = {
+            'meta': {'params': vars(args), 'elapsed': elapsed, 'refreshes_per_second': refreshes / elapsed,
+                     'median_refresh': statistics.median(samples['refresh']) if refreshes else None},
+            'results': results,
+            'errors': dict(errors),
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Seeded generator of synthetic Toggl API v9 payloads for the benchmarks.
+
+generate_dataset() returns (entries, projects) shaped like the responses of
+/me/time_entries and /me/projects: ISO 8601 start/stop strings, negative
+durations for running entries, and ids, workspace ids, descriptions and tags
+the graphs never read (so parsing cost is realistic). The same arguments
+always produce the same payloads.
+"""
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+DAY = 86400
+TOGGL_COLORS = ['#0b83d9', '#9e5bd9', '#d94182', '#e36a00', '#bf7000', '#2da608',
+                '#06a893', '#c9806b', '#465bb3', '#990099', '#c7af14', '#566614']
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def generate_projects(n_projects, seed=0, workspace_id=1):
+    """Return `n_projects` project dicts with Toggl colors."""
+    rng = np.random.default_rng(seed)
+    return [{
+        'id': 1000 + i,
+        'workspace_id': workspace_id,
+        'name': f'Project {i}',
+        'color': TOGGL_COLORS[int(rng.integers(len(TOGGL_COLORS)))],
+        'active': True,
+        'billable': bool(i % 3 == 0),
+        'created_at': _iso(1_600_000_000 + i * DAY),
+    } for i in range(n_projects)]
+
+
+def generate_dataset(n_projects=20, days=365, entries_per_day=8.0, running=1, midnight_spanning=0.05,
+                     seed=0, now=None, workspace_id=1):
+    """
+    Build a synthetic history.
+    Args:
+        n_projects (int): Number of projects; entries pick them with a skewed
+            (Zipf-like) popularity, as real accounts do.
+        days (int): Days of history ending at `now`.
+        entries_per_day (float): Mean entries per day (Poisson).
+        running (int): Entries still running at `now` (no stop, negative duration).
+        midnight_spanning (float): Fraction of entries that start late in the
+            evening and run past midnight.
+        seed (int): Random seed.
+        now (float): Unix time the history ends at; defaults to the latest UTC
+            midnight, so a seed always yields the same payloads on the same day.
+        workspace_id (int): Workspace id stamped on every entry.
+    Returns:
+        tuple: (entries, projects), entries sorted by start.
+    """
+    rng = np.random.default_rng(seed)
+    if now is None:
+        now = (int(datetime.now(timezone.utc).timestamp()) // DAY) * DAY
+    projects = generate_projects(n_projects, seed, workspace_id)
+    per_day = rng.poisson(entries_per_day, days)
+    n = int(per_day.sum())
+    day_start = now - days * DAY + np.repeat(np.arange(days), per_day) * DAY
+    spans = rng.random(n) < midnight_spanning
+    # Working-hours entries start 07:00-20:00; midnight-spanning ones 22:00-23:59
+    offsets = np.where(spans, rng.integers(22 * 3600, DAY, n), rng.integers(7 * 3600, 20 * 3600, n))
+    durations = np.where(spans, rng.integers(2 * 3600, 5 * 3600, n), rng.integers(5 * 60, 3 * 3600, n))
+    starts = day_start + offsets
+    stops = np.minimum(starts + durations, now - 60)
+    weights = 1.0 / np.arange(1, n_projects + 1)
+    project_ids = 1000 + rng.choice(n_projects, n, p=weights / weights.sum())
+    order = np.argsort(starts, kind='stable')
+    entries = []
+    for k, i in enumerate(order):
+        start, stop = int(starts[i]), int(stops[i])
+        if stop <= start:
+            continue
+        entries.append({
+            'id': 5_000_000 + k,
+            'workspace_id': workspace_id,
+            'project_id': int(project_ids[i]),
+            'task_id': None,
+            'billable': False,
+            'start': _iso(start),
+            'stop': _iso(stop),
+            'duration': stop - start,
+            'description': f'Focus block {k % 97}',
+            'tags': ['deep-work'] if k % 4 == 0 else [],
+            'duronly': False,
+            'at': _iso(stop),
+            'server_deleted_at': None,
+            'user_id': 1,
+        })
+    for r in range(running):
+        start = int(now - rng.integers(10 * 60, 3 * 3600))
+        entries.append({
+            'id': 9_000_000 + r,
+            'workspace_id': workspace_id,
+            'project_id': int(1000 + rng.integers(n_projects)),
+            'task_id': None,
+            'billable': False,
+            'start': _iso(start),
+            'stop': None,
+            'duration': -start,
+            'description': 'Running',
+            'tags': [],
+            'duronly': False,
+            'at': _iso(start),
+            'server_deleted_at': None,
+            'user_id': 1,
+        })
+    return entries, projects
+
+
+class FakeTogglSession:
+    """
+    requests.Session stand-in serving a synthetic dataset the way Toggl does:
+    /me/time_entries honors start_date/end_date (entries that started in the
+    range) and since (entries changed after it), /me/projects returns every
+    project, and bodies can be streamed with iter_content.
+    """
+
+    def __init__(self, entries, projects):
+        self.entries = entries
+        self.projects = projects
+        self._starts = np.array([datetime.fromisoformat(e['start']).timestamp() for e in entries])
+        self._changed = np.array([datetime.fromisoformat(e['at']).timestamp() for e in entries])
+        self.requests = 0
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.requests += 1
+        return FakeResponse(self.body(url, params or {}))
+
+    def body(self, path, params):
+        """Return the JSON body Toggl would send for GET `path` with query `params`."""
+        if path.rstrip('/').endswith('/me/projects'):
+            return json.dumps(self.projects).encode()
+        if 'start_date' in params:
+            start = datetime.fromisoformat(params['start_date'].replace('Z', '+00:00')).timestamp()
+            end = datetime.fromisoformat(params['end_date'].replace('Z', '+00:00')).timestamp()
+            keep = np.flatnonzero((self._starts >= start) & (self._starts < end))
+        else:
+            keep = np.flatnonzero(self._changed >= float(params.get('since', 0)))
+        return json.dumps([self.entries[i] for i in keep]).encode()
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.content = body
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {}
+        self.text = body.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=65536):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
@@ -0,0 +1,566 @@
+import math
+import threading
+import time
+from array import array
+import numpy as np
+import pandas as pd
+from focusledger.ingest import EntryColumns
+
+# Vectorized aggregation engine shared by the graph builders.
+# Durations are pivoted once into a dense project x day matrix, and every
+# rolling window is derived from cumulative sums along the day axis.
+# DailyTotals keeps that matrix and its prefix sums up to date entry by entry,
+# so a refresh only touches the days that changed. Week and month rollups are
+# read off the same prefix sums at period boundaries.
+
+SECONDS_PER_DAY = 86400
+# Longest span of one period at each resolution, in days
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 31}
+
+
+def daily_totals(projects, dates, durations):
+    """
+    Pivot per-entry durations into a dense project x day matrix.
+    Args:
+        projects: Project label for each entry.
+        dates: Calendar date (datetime.date or datetime64) for each entry.
+        durations: Duration for each entry, in any unit.
+    Returns:
+        tuple: (labels, days, matrix) where labels are the projects in order of
+        first appearance, days is a pd.DatetimeIndex covering every day from the
+        first to the last date, and matrix[i, j] is the total duration of
+        labels[i] on days[j].
+    """
+    projects = pd.Series(projects)
+    if isinstance(projects.dtype, pd.CategoricalDtype):
+        # Reuse the categorical codes instead of hashing every label again
+        projects = projects.cat.remove_unused_categories()
+        codes, labels = projects.cat.codes.to_numpy().astype(np.int64), projects.cat.categories
+    else:
+        codes, labels = pd.factorize(projects.astype(object), sort=False)
+    day_values = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]')
+    first = day_values.min()
+    last = day_values.max()
+    n_days = int((last - first).astype(np.int64)) + 1
+    offsets = (day_values - first).astype(np.int64)
+    flat = np.bincount(
+        codes * n_days + offsets,
+        weights=np.asarray(durations, dtype=np.float64),
+        minlength=len(labels) * n_days,
+    )
+    days = pd.date_range(pd.Timestamp(first), periods=n_days, freq='D')
+    return list(labels), days, flat.reshape(len(labels), n_days)
+
+
+def rolling_sum(matrix, window):
+    """
+    Sum each row of `matrix` over a trailing window of `window` columns.
+    Columns before the start of the matrix count as zero, so the first
+    window - 1 columns hold partial sums. A window below 1 yields zeros.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if window < 1:
+        return np.zeros_like(matrix)
+    cumulative = np.cumsum(matrix, axis=1)
+    result = cumulative.copy()
+    result[:, window:] -= cumulative[:, :-window]
+    return result
+
+
+def rolling_mean(matrix, window):
+    """
+    Average each row of `matrix` over a trailing window of `window` columns,
+    using only the columns available (pandas' rolling(window, min_periods=1).mean()).
+    Raises ValueError if window is below 1.
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    matrix = np.asarray(matrix, dtype=np.float64)
+    counts = np.minimum(np.arange(1, matrix.shape[1] + 1), window)
+    return rolling_sum(matrix, window) / counts
+
+
+def last_days(days, matrix, days_to_show):
+    """
+    Keep only the trailing `days_to_show` columns of `matrix` and their days.
+    """
+    keep = max(0, min(len(days), days_to_show))
+    start = len(days) - keep
+    return days[start:], matrix[:, start:]
+
+
+def _period_starts(days, resolution):
+    # Epoch day 0 (1970-01-01) was a Thursday; weeks start on Monday
+    if resolution == 'week':
+        return days - (days.astype(np.int64) + 3) % 7
+    if resolution == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown resolution: {resolution!r}")
+
+
+def lttb_indices(values, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: positions of `n_out` points
+    of the series `values` (x = position) that best keep its visual shape.
+    The first and last points are always kept; a series that already fits
+    is returned whole.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    for bucket in range(n_out - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point) as the third vertex
+        if bucket + 2 < len(edges):
+            next_low, next_high = edges[bucket + 1], edges[bucket + 2]
+            third_x, third_y = (next_low + next_high - 1) / 2.0, values[next_low:next_high].mean()
+        else:
+            third_x, third_y = n - 1, values[-1]
+        first_x = picked[bucket]
+        first_y = values[first_x]
+        xs = np.arange(low, high)
+        areas = np.abs((first_x - third_x) * (values[low:high] - first_y) - (first_x - xs) * (third_y - first_y))
+        picked[bucket + 1] = low + int(np.argmax(areas))
+    return picked
+
+
+def _local_midnights(first_day, last_day, timezone):
+    """
+    Unix times of local midnight in `timezone` for calendar days first_day
+    through last_day + 1 (days since 1970-01-01). A midnight skipped by a DST
+    change moves to the first valid instant; a repeated one takes its first
+    occurrence.
+    """
+    days = np.arange(first_day, last_day + 2, dtype=np.int64)
+    if timezone == 'UTC':
+        return (days * SECONDS_PER_DAY).astype(np.float64)
+    naive = pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'))
+    local = naive.tz_localize(timezone, ambiguous=np.ones(len(naive), dtype=bool), nonexistent='shift_forward')
+    return local.asi8 / 1e9
+
+
+def local_days(timestamps, timezone='UTC'):
+    """Calendar day in `timezone` (days since 1970-01-01) of each unix time."""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timezone == 'UTC':
+        return np.floor(timestamps / SECONDS_PER_DAY).astype(np.int64)
+    local = pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(timezone).tz_localize(None)
+    return local.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def split_by_day(starts, stops, timezone='UTC'):
+    """
+    Split intervals [start, stop) given in unix seconds at local midnights in
+    `timezone`, on whole arrays at once. A stop before its start counts as a
+    zero-length interval.
+    Returns:
+        tuple: (index, days, piece_starts, piece_stops) with one item per
+        piece: the position of the interval it came from, its calendar day
+        (days since 1970-01-01) and its clipped bounds. The pieces of an
+        interval are consecutive and in day order.
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    stops = np.maximum(np.asarray(stops, dtype=np.float64), starts)
+    if not len(starts):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    # A local day is at most one day either side of the UTC day
+    first_day = int(np.floor(starts.min() / SECONDS_PER_DAY)) - 1
+    last_day = int(np.floor(stops.max() / SECONDS_PER_DAY)) + 1
+    midnights = _local_midnights(first_day, last_day, timezone)
+    first = np.searchsorted(midnights, starts, side='right') - 1
+    # An interval ending exactly at midnight ends on the day before
+    last = np.maximum(np.searchsorted(midnights, stops, side='left') - 1, first)
+    counts = last - first + 1
+    index = np.repeat(np.arange(len(starts)), counts)
+    day = first[index] + np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    piece_starts = np.maximum(starts[index], midnights[day])
+    piece_stops = np.minimum(stops[index], midnights[day + 1])
+    return index, first_day + day, piece_starts, piece_stops
+
+
+class DailyView:
+    """
+    Project x period slice of totals (in seconds) read by the graph builders.
+    Periods are days unless the view was rolled up to weeks or months, in
+    which case `days` holds each period's first day.
+
+    `prefix` has one more column than `seconds`: prefix[:, 0] is the running
+    total before the first period and prefix[:, j + 1] the running total
+    through days[j], so any trailing window sum is a single subtraction.
+    """
+
+    def __init__(self, labels, days, seconds, prefix=None, color_map=None, resolution='day'):
+        self.labels = list(labels)
+        self.days = pd.DatetimeIndex(days)
+        self.seconds = np.asarray(seconds, dtype=np.float64).reshape(len(self.labels), len(self.days))
+        if prefix is None:
+            prefix = np.concatenate([np.zeros((len(self.labels), 1)), np.cumsum(self.seconds, axis=1)], axis=1)
+        self.prefix = prefix
+        self.color_map = dict(color_map or {})
+        self.resolution = resolution
+
+    @property
+    def empty(self):
+        return not self.labels or not len(self.days)
+
+    def rolling_sum(self, window):
+        """
+        Trailing `window`-period sums for every project and period, like
+        rolling_sum(self.seconds, window). A window below 1 yields zeros.
+        """
+        if window < 1:
+            return np.zeros_like(self.seconds)
+        upper = np.arange(1, len(self.days) + 1)
+        return self.prefix[:, upper] - self.prefix[:, np.maximum(upper - window, 0)]
+
+    def rollup(self, resolution):
+        """
+        Return a view of this daily view summed into 'week' (starting Monday)
+        or 'month' periods. The first and last periods only count the days the
+        view covers. Rolling up to 'day' returns the view itself.
+        """
+        if resolution == self.resolution or resolution == 'day':
+            return self
+        if self.resolution != 'day':
+            raise ValueError(f"Cannot roll up a {self.resolution} view to {resolution}")
+        if self.empty:
+            return DailyView([], [], np.zeros((0, 0)), color_map=self.color_map, resolution=resolution)
+        days = self.days.to_numpy().astype('datetime64[D]')
+        starts, first_columns = np.unique(_period_starts(days, resolution), return_index=True)
+        # Running totals through each period's last day, after the baseline
+        edges = np.append(first_columns[1:], len(days))
+        prefix = np.concatenate([self.prefix[:, :1], self.prefix[:, edges]], axis=1)
+        return DailyView(self.labels, pd.DatetimeIndex(starts.astype('datetime64[ns]')), np.diff(prefix, axis=1), prefix,
+                         self.color_map, resolution)
+
+
+class DailyTotals:
+    """
+    Thread-safe project x day totals maintained incrementally from time entries.
+
+    Entries are split at local midnights in `timezone`, so each day only gets
+    the part of an entry that fell on it, DST days included. Each piece's
+    contribution is remembered under its entry id, so re-applying an edited
+    or deleted entry first removes its old pieces. Applying a batch updates
+    only the touched cells and the prefix sums from the earliest touched day
+    onwards; a refresh that only brings in today's entries costs O(projects),
+    whatever the history length. Running entries (no stop yet) are kept aside
+    and counted up to `now` each time a view is taken.
+    Projects are keyed by Toggl project id (None for entries without one) and
+    named when a view is taken.
+    """
+
+    def __init__(self, timezone='UTC'):
+        pd.Timestamp(0, tz=timezone)  # fail fast on an unknown timezone
+        self.timezone = timezone
+        self._lock = threading.Lock()
+        # Entry id -> slot of its first piece; later pieces chain through
+        # _slot_next. Plain ints and typed arrays keep a large history
+        # invisible to the cyclic garbage collector.
+        self._slots = {}
+        self._free = array('q')
+        self._slot_row = array('q')
+        self._slot_day = array('q')
+        self._slot_seconds = array('d')
+        self._slot_next = array('q')
+        self._running = {}
+        self._keys = []
+        self._rows = {}
+        self._origin = None
+        self._seconds = np.zeros((0, 0))
+        self._prefix = np.zeros((0, 0))
+        self._counts = np.zeros(0, dtype=np.int64)
+        # Stopped entries restored from a rollup whose pieces are not split yet
+        self._pending = None
+        self.version = 0
+
+    def __len__(self):
+        with self._lock:
+            self._materialize()
+            return len(self._slots) + len(self._running)
+
+    def _row(self, key):
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = len(self._keys)
+            self._keys.append(key)
+        return row
+
+    def _allocate(self, n):
+        # Reuse freed slots first, then grow the slot arrays with zeros
+        reuse = min(n, len(self._free))
+        slots = np.empty(n, dtype=np.int64)
+        if reuse:
+            slots[:reuse] = np.frombuffer(self._free, dtype=np.int64)[len(self._free) - reuse:]
+            del self._free[len(self._free) - reuse:]
+        size = len(self._slot_row)
+        slots[reuse:] = np.arange(size, size + n - reuse)
+        for values in (self._slot_row, self._slot_day, self._slot_seconds, self._slot_next):
+            values.frombytes(bytes((n - reuse) * values.itemsize))
+        return slots
+
+    def _reserve(self, first_day, last_day):
+        # Grow the matrices (geometrically) to hold every row and the given days
+        if self._origin is None:
+            self._origin = first_day
+        rows, cols = self._seconds.shape
+        shift = max(0, self._origin - first_day)
+        need_rows = len(self._keys)
+        need_cols = last_day - (self._origin - shift) + 1
+        if shift == 0 and need_rows <= rows and need_cols <= cols:
+            return
+        new_rows = rows if need_rows <= rows else max(need_rows, 2 * rows, 8)
+        new_cols = cols + shift
+        if need_cols > new_cols:
+            new_cols = max(need_cols, 2 * new_cols, 64)
+        seconds = np.zeros((new_rows, new_cols))
+        prefix = np.zeros((new_rows, new_cols))
+        counts = np.zeros(new_cols, dtype=np.int64)
+        seconds[:rows, shift:shift + cols] = self._seconds
+        prefix[:rows, shift:shift + cols] = self._prefix
+        if cols:
+            # Running totals carry forward into the new trailing days
+            prefix[:rows, shift + cols:] = self._prefix[:, -1:]
+        counts[shift:shift + cols] = self._counts
+        self._seconds, self._prefix, self._counts = seconds, prefix, counts
+        self._origin -= shift
+
+    def _chain(self, ids, rows, starts, stops):
+        # Split stopped entries into day pieces, store each piece in a slot and
+        # chain an entry's slots from its head. Returns the pieces' (rows, days, seconds).
+        index, piece_days, piece_starts, piece_stops = split_by_day(starts, stops, self.timezone)
+        piece_rows = np.asarray(rows, dtype=np.int64)[index]
+        piece_seconds = piece_stops - piece_starts
+        slots = self._allocate(len(index))
+        # Chain the pieces of each entry; the first piece is the entry's head
+        same_entry = index[1:] == index[:-1]
+        next_slots = np.full(len(index), -1, dtype=np.int64)
+        next_slots[:-1][same_entry] = slots[1:][same_entry]
+        np.frombuffer(self._slot_row, dtype=np.int64)[slots] = piece_rows
+        np.frombuffer(self._slot_day, dtype=np.int64)[slots] = piece_days
+        np.frombuffer(self._slot_seconds)[slots] = piece_seconds
+        np.frombuffer(self._slot_next, dtype=np.int64)[slots] = next_slots
+        heads = slots[np.concatenate([[0], np.flatnonzero(~same_entry) + 1])]
+        self._slots.update(zip(ids, heads.tolist()))
+        return piece_rows, piece_days, piece_seconds
+
+    def restore(self, keys, days, seconds, entries, now):
+        """
+        Fill empty totals from a daily rollup computed in this timezone, e.g.
+        from a snapshot: parallel `keys` (project keys), `days` (days since
+        1970-01-01) and `seconds`, counting running entries up to `now`, plus
+        the `entries` (EntryColumns) it was computed from. Views read the
+        rollup right away; the entries' pieces, needed to replace or remove
+        them later, are only split on the next apply or materialize().
+        Raises ValueError unless the totals are empty.
+        """
+        ids = np.frombuffer(entries.id, dtype=np.int64)
+        starts, stops, project_ids = (np.frombuffer(column) for column in (entries.start, entries.stop, entries.project_id))
+        deleted = np.frombuffer(entries.deleted, dtype=np.int8).astype(bool)
+        valid = ~np.isnan(starts) & ~deleted
+        running = valid & np.isnan(stops)
+        stopped = valid & ~running
+        with self._lock:
+            if self._slots or self._running or self._pending is not None or self._origin is not None:
+                raise ValueError("Only empty totals can be restored")
+            # One row per distinct project, added in entry order as apply would
+            entry_codes, entry_keys = pd.factorize(project_ids[valid], sort=False, use_na_sentinel=False)
+            entry_rows = np.full(len(ids), -1, dtype=np.int64)
+            entry_rows[valid] = np.array([self._row(None if np.isnan(key) else int(key)) for key in entry_keys],
+                                         dtype=np.int64)[entry_codes]
+            codes, uniques = pd.factorize(pd.Series(list(keys), dtype=object), sort=False, use_na_sentinel=False)
+            rows = np.array([self._row(None if pd.isna(key) else int(key)) for key in uniques], dtype=np.int64)[codes]
+            days = np.asarray(days, dtype=np.int64)
+            seconds = np.asarray(seconds, dtype=np.float64)
+            # The rollup counted running entries up to `now`; they are tracked
+            # apart and counted up to the time of each view instead
+            self._running.update(zip(ids[running].tolist(), zip(entry_rows[running].tolist(), starts[running].tolist())))
+            index, running_days, piece_starts, piece_stops = split_by_day(
+                starts[running], np.full(int(running.sum()), float(now)), self.timezone
+            )
+            rows = np.concatenate([rows, entry_rows[running][index]])
+            days = np.concatenate([days, running_days])
+            seconds = np.concatenate([seconds, piece_starts - piece_stops])
+            # Only the days of the stopped entries' pieces, for the piece
+            # counts, which also cover days with only zero-length entries
+            _, piece_days, _, _ = split_by_day(starts[stopped], stops[stopped], self.timezone)
+            if len(days) or len(piece_days):
+                bounds = np.concatenate([days, piece_days])
+                self._reserve(int(bounds.min()), int(bounds.max()))
+                columns = days - self._origin
+                np.add.at(self._seconds, (rows, columns), seconds)
+                self._counts += np.bincount(piece_days - self._origin, minlength=len(self._counts))
+                self._prefix[:] = np.cumsum(self._seconds, axis=1)
+            self._pending = (ids[stopped].tolist(), entry_rows[stopped], starts[stopped], stops[stopped])
+            self.version += 1
+
+    def _materialize(self):
+        # Split the pieces of restored entries (with the lock held); the
+        # totals and piece counts already include them
+        pending, self._pending = self._pending, None
+        if pending is None or not pending[0]:
+            return
+        self._chain(*pending)
+
+    def materialize(self):
+        """Split the pieces of restored entries now, e.g. on a background thread, instead of on the next apply."""
+        with self._lock:
+            self._materialize()
+
+    def apply(self, entries):
+        """
+        Add, replace or remove entries. Accepts EntryColumns or entry dicts;
+        when an id appears more than once, its last occurrence wins.
+        Deleted entries drop any earlier contribution; entries without a stop
+        are tracked as running; entries without a parseable start are ignored.
+        Returns True if any total changed.
+        """
+        if not isinstance(entries, EntryColumns):
+            entries = EntryColumns.from_entries(entries)
+        # An entry listed twice would otherwise be added twice; its last version wins
+        entries = entries.latest()
+        # Pieces being removed, and the stopped entries being added
+        rows, days, deltas = array('q'), array('q'), array('d')
+        added_ids, added_rows, added_starts, added_stops = [], array('q'), array('d'), array('d')
+        with self._lock:
+            self._materialize()
+            running_changed = False
+            for entry_id, start, stop, project_id, deleted in zip(
+                entries.id, entries.start, entries.stop, entries.project_id, entries.deleted
+            ):
+                if math.isnan(start) and not deleted:
+                    continue
+                slot = self._slots.pop(entry_id, -1)
+                while slot >= 0:
+                    rows.append(self._slot_row[slot])
+                    days.append(self._slot_day[slot])
+                    deltas.append(-self._slot_seconds[slot])
+                    self._free.append(slot)
+                    slot = self._slot_next[slot]
+                if self._running.pop(entry_id, None) is not None:
+                    running_changed = True
+                if deleted:
+                    continue
+                row = self._row(None if math.isnan(project_id) else int(project_id))
+                if math.isnan(stop):
+                    self._running[entry_id] = (row, start)
+                    running_changed = True
+                    continue
+                added_ids.append(entry_id)
+                added_rows.append(row)
+                added_starts.append(start)
+                added_stops.append(stop)
+            counts = np.full(len(rows), -1, dtype=np.int64)
+            rows, days, deltas = (np.frombuffer(values, dtype=values.typecode) for values in (rows, days, deltas))
+            if added_ids:
+                piece_rows, piece_days, piece_seconds = self._chain(
+                    added_ids, np.frombuffer(added_rows, dtype=np.int64),
+                    np.frombuffer(added_starts), np.frombuffer(added_stops),
+                )
+                rows = np.concatenate([rows, piece_rows])
+                days = np.concatenate([days, piece_days])
+                deltas = np.concatenate([deltas, piece_seconds])
+                counts = np.concatenate([counts, np.ones(len(piece_days), dtype=np.int64)])
+            if not len(rows):
+                if running_changed:
+                    self.version += 1
+                return running_changed
+            self._reserve(int(days.min()), int(days.max()))
+            columns = days - self._origin
+            np.add.at(self._seconds, (rows, columns), deltas)
+            np.add.at(self._counts, columns, counts)
+            # Only windows ending on or after the earliest touched day change
+            first = int(columns.min())
+            base = self._prefix[:, first - 1:first] if first else 0.0
+            self._prefix[:, first:] = np.cumsum(self._seconds[:, first:], axis=1) + base
+            self.version += 1
+            return True
+
+    def _stored(self, n_rows, first_day, last_day):
+        # Copy stored totals for days first_day..last_day and the running
+        # totals through the day before each, zero-padded to n_rows rows
+        span = last_day - first_day + 1
+        seconds = np.zeros((n_rows, span))
+        prefix = np.zeros((n_rows, span + 1))
+        if self._origin is None:
+            return seconds, prefix
+        stored_rows, capacity = self._seconds.shape
+        rows = min(n_rows, stored_rows)
+        low = max(first_day - self._origin, 0)
+        high = min(last_day + 1 - self._origin, capacity)
+        if low < high:
+            offset = first_day - self._origin
+            seconds[:rows, low - offset:high - offset] = self._seconds[:rows, low:high]
+        columns = np.arange(first_day - 1, last_day + 1) - self._origin
+        if capacity:
+            prefix[:rows] = self._prefix[:rows, np.clip(columns, 0, capacity - 1)]
+            prefix[:, columns < 0] = 0.0
+        return seconds, prefix
+
+    def view(self, days=None, label=None, color_map=None, now=None, resolution='day'):
+        """
+        Return a DailyView from the first to the last day with entries, limited
+        to the last `days` days (all history when None) and rolled up to
+        `resolution` ('day', 'week' or 'month'). Running entries count up to
+        `now`. `label` maps a project key to its display name; projects sharing
+        a name are summed together. Projects are ordered by their first day in
+        the view, then by name.
+        """
+        now = time.time() if now is None else now
+        empty = DailyView([], [], np.zeros((0, 0)), color_map=color_map, resolution=resolution)
+        low = None if days is None else int(local_days([now], self.timezone)[0]) - int(days)
+        with self._lock:
+            keys = list(self._keys)
+            running = list(self._running.values())
+            bounds = []
+            if self._origin is not None:
+                start = 0 if low is None else max(0, low - self._origin)
+                active = np.flatnonzero(self._counts[start:])
+                if active.size:
+                    bounds += [self._origin + start + int(active[0]), self._origin + start + int(active[-1])]
+            if running:
+                running_rows, running_starts = (np.asarray(values) for values in zip(*running))
+                index, running_days, piece_starts, piece_stops = split_by_day(
+                    running_starts, np.full(len(running), now), self.timezone
+                )
+                keep = running_days >= low if low is not None else slice(None)
+                running_rows, running_days = running_rows[index][keep], running_days[keep]
+                running_seconds = (piece_stops - piece_starts)[keep]
+                if len(running_days):
+                    bounds += [int(running_days.min()), int(running_days.max())]
+            if not bounds:
+                return empty
+            first_day, last_day = min(bounds), max(bounds)
+            seconds, prefix = self._stored(len(keys), first_day, last_day)
+        if running and len(running_days):
+            extra = np.zeros_like(seconds)
+            np.add.at(extra, (running_rows, running_days - first_day), running_seconds)
+            seconds += extra
+            prefix[:, 1:] += np.cumsum(extra, axis=1)
+        nonzero = seconds != 0
+        rows = np.flatnonzero(nonzero.any(axis=1))
+        if not rows.size:
+            return empty
+        names = [label(keys[row]) if label else keys[row] for row in rows]
+        # Rows are filled in arrival order (chunks land in any order), so sort
+        # by first day and then by name to keep trace order and colors stable
+        order = sorted(range(len(rows)), key=lambda i: (nonzero[rows[i]].argmax(), str(names[i])))
+        rows = rows[order]
+        names = [names[i] for i in order]
+        # None (entries without a project, when unlabelled) is a project of its own
+        codes, _ = pd.factorize(pd.Series(names, dtype=object), sort=False, use_na_sentinel=False)
+        labels = list(dict.fromkeys(names))
+        seconds, prefix = seconds[rows], prefix[rows]
+        if len(labels) < len(rows):
+            merged = np.zeros((len(labels), seconds.shape[1])), np.zeros((len(labels), prefix.shape[1]))
+            np.add.at(merged[0], codes, seconds)
+            np.add.at(merged[1], codes, prefix)
+            seconds, prefix = merged
+        days_index = pd.date_range(pd.Timestamp(first_day, unit='D'), periods=last_day - first_day + 1, freq='D')
+        return DailyView(labels, days_index, seconds, prefix, color_map).rollup(resolution)
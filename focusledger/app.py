@@ -1,21 +1,156 @@
 import os
+from datetime import datetime, timezone
 import dash
 from dash import dcc, html, Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
+from flask import Response
 from dotenv import load_dotenv
-from focusledger.toggl_api import fetch_time_entries, RateLimitError
-from focusledger.graphing import prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph
-from focusledger.toggl_projects import fetch_projects
+from focusledger.toggl_api import fetch_time_entry_columns
+from focusledger.graphing import RENDER_MODES, prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph
+from focusledger.toggl_projects import ProjectCache
+from focusledger.preprocessing import prepare_daily_view
+from focusledger.fetching import fetch_dataset
+from focusledger.tenants import TenantRegistry, tenant_id
+from focusledger.scheduler import SyncScheduler
+from focusledger.singleflight import SingleFlight
+from focusledger.snapshot import require_pyarrow
+from focusledger import metrics
+from focusledger.metrics import REGISTRY, timed, traced
+from focusledger import toggl_client
+from focusledger.aggregation import PERIOD_DAYS
 
 # Load environment variables from .env if present
 load_dotenv()
 
+# Serve the one Toggl account of TOGGL_API_TOKEN or, with FOCUSLEDGER_MULTI_TENANT set,
+# every account whose token a browser session supplies
+multi_tenant = os.getenv("FOCUSLEDGER_MULTI_TENANT", "").lower() in ("1", "true", "yes")
+# Local time-entry stores; set FOCUSLEDGER_STORE to a file path to keep them across restarts
+# ("{tenant}" in the path is replaced per account) and FOCUSLEDGER_TIMEZONE to the IANA
+# timezone whose midnights separate the days
+store_path = os.getenv("FOCUSLEDGER_STORE", ":memory:")
+if multi_tenant and store_path != ":memory:" and "{tenant}" not in store_path:
+    raise ValueError("FOCUSLEDGER_STORE must contain {tenant} in multi-tenant mode, e.g. stores/{tenant}.sqlite3")
+# Columnar snapshot (see focusledger/snapshot.py) that empty stores are restored from before
+# their first sync; "{tenant}" in the path is replaced per account as for FOCUSLEDGER_STORE
+snapshot_path = os.getenv("FOCUSLEDGER_SNAPSHOT") or None
+if snapshot_path:
+    require_pyarrow()
+    if multi_tenant and "{tenant}" not in snapshot_path:
+        raise ValueError("FOCUSLEDGER_SNAPSHOT must contain {tenant} in multi-tenant mode, e.g. snapshots/{tenant}")
+max_tenants = int(os.getenv("FOCUSLEDGER_MAX_TENANTS", "32")) if multi_tenant else 1
+# Project names and colors rarely change; serve them from a per-token TTL cache revalidated in the background,
+# keeping as many tokens as there are tenants
+project_cache = ProjectCache(ttl=float(os.getenv("FOCUSLEDGER_PROJECTS_TTL", "300")), max_tokens=max_tenants)
+# Each account gets its own store, daily-total views (referenced from the browser by version
+# through the "dataset" store) and built figures (reused until the data or that graph's own
+# inputs change); the least recently used accounts beyond FOCUSLEDGER_MAX_TENANTS are dropped.
+# In multi-tenant mode a session token gets an account only once Toggl accepts it (its projects
+# load), so made-up tokens neither create store files nor push out real accounts
+tenants = TenantRegistry(
+    max_tenants=max_tenants,
+    store_path=store_path,
+    chunk_days=int(os.getenv("FOCUSLEDGER_CHUNK_DAYS", "7")),
+    chunk_workers=int(os.getenv("FOCUSLEDGER_CHUNK_WORKERS", "4")),
+    max_chunks=int(os.getenv("FOCUSLEDGER_MAX_CHUNKS", "4")) or None,
+    timezone=os.getenv("FOCUSLEDGER_TIMEZONE", "UTC"),
+    max_datasets=int(os.getenv("FOCUSLEDGER_DATASETS", "8")),
+    figure_cache_entries=int(os.getenv("FOCUSLEDGER_FIGURE_CACHE_ENTRIES", "128")),
+    figure_cache_bytes=int(float(os.getenv("FOCUSLEDGER_FIGURE_CACHE_MB", "64")) * 1024 * 1024),
+    snapshot_path=snapshot_path,
+    validate=project_cache.get if multi_tenant else None,
+)
+# With FOCUSLEDGER_SYNC_INTERVAL (seconds) set, a background thread syncs every account in use
+# on that schedule and callbacks only read the precomputed totals
+sync_interval = float(os.getenv("FOCUSLEDGER_SYNC_INTERVAL", "0"))
+scheduler = None
+if sync_interval > 0:
+    scheduler = SyncScheduler(tenants, project_cache, interval=sync_interval,
+                              backoff_max=float(os.getenv("FOCUSLEDGER_SYNC_BACKOFF_MAX", "3600")))
+# Point budget per figure; longer ranges are downsampled before they are sent to the browser
+max_points = int(os.getenv("FOCUSLEDGER_MAX_POINTS", "20000"))
+# Trace renderer: "svg", "webgl" (Scattergl), or "auto" to switch to WebGL above FOCUSLEDGER_WEBGL_POINTS points
+render = os.getenv("FOCUSLEDGER_RENDER", "auto").lower()
+if render not in RENDER_MODES:
+    raise ValueError(f"FOCUSLEDGER_RENDER must be one of {', '.join(RENDER_MODES)}, not {render!r}")
+webgl_points = int(os.getenv("FOCUSLEDGER_WEBGL_POINTS", "5000"))
+# Build each graph once when the WSGI entry point is imported (in the gunicorn master with
+# preload, before workers fork) so the first request doesn't load plotly's validators
+warm_up_on_start = os.getenv("FOCUSLEDGER_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+# The window inputs count periods of the selected resolution; their labels name the unit
+PERIOD_UNITS = {"day": "days", "week": "weeks", "month": "months"}
+WINDOW_LABELS = {
+    "days_to_show": "Cumulative: {Unit} to show",
+    "rolling_window": "Cumulative: Rolling window ({unit})",
+    "avg_days_to_show": "Average: {Unit} to show",
+    "avg_rolling_window": "Average: Rolling window ({unit})",
+    "sumavg_days_to_show": "Avg of Sums: {Unit} to show",
+    "sum_window": "Sum Window ({unit})",
+    "avg_window": "Avg Window ({unit})",
+}
+
+
+def _window_label(input_id, resolution="day"):
+    unit = PERIOD_UNITS[resolution or "day"]
+    return WINDOW_LABELS[input_id].format(unit=unit, Unit=unit.capitalize())
 
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = "FocusLedger"
 
 
+@app.server.before_request
+def _start_scheduler():
+    # Started by the first request rather than at import, so a WSGI server that
+    # preloads the app starts one in each forked worker instead of the master
+    if scheduler is not None:
+        scheduler.start()
+
+
+@REGISTRY.collector
+def _collect_metrics():
+    # Cache and coalescing counters kept by the components themselves, summed over tenants
+    caches = [tenant.figure_cache.stats() for tenant in tenants.values()]
+    projects = project_cache.stats()
+    yield "focusledger_tenants", "gauge", "Accounts with stores and caches in this process", [({}, len(caches))]
+    yield "focusledger_figure_cache_lookups_total", "counter", "Figure cache lookups", [
+        ({"result": "hit"}, sum(c["hits"] for c in caches)),
+        ({"result": "miss"}, sum(c["misses"] for c in caches)),
+    ]
+    yield "focusledger_figure_cache_evictions_total", "counter", "Figures evicted from the cache", [
+        ({}, sum(c["evictions"] for c in caches))]
+    yield "focusledger_figure_cache_bytes", "gauge", "Estimated serialized size of the cached figures", [
+        ({}, sum(c["bytes"] for c in caches))]
+    yield "focusledger_project_cache_lookups_total", "counter", "Project cache lookups", [
+        ({"result": "hit"}, projects["hits"]),
+        ({"result": "stale"}, projects["stale_hits"]),
+        ({"result": "miss"}, projects["misses"]),
+    ]
+    yield "focusledger_project_cache_errors_total", "counter", "Failed project fetches", [({}, projects["errors"])]
+    yield "focusledger_project_cache_evictions_total", "counter", "Tokens' projects evicted from the cache", [
+        ({}, projects["evictions"])]
+    yield "focusledger_coalesced_loads_total", "counter", "Refreshes that joined an identical load in flight", [
+        ({}, _loads.shared)]
+    yield "focusledger_budget_exhausted_total", "counter", "Toggl requests refused for lack of request budget", [
+        ({}, toggl_client.get_client().budget.exhausted)]
+    if scheduler is not None:
+        yield "focusledger_background_syncs_total", "counter", "Background syncs", [
+            ({"result": "ok"}, scheduler.syncs), ({"result": "error"}, scheduler.failures)]
+
+
+if os.getenv("FOCUSLEDGER_METRICS", "1").lower() not in ("0", "false", "no"):
+    # Prometheus scrape target; each worker process reports its own metrics
+    @app.server.route("/metrics")
+    def metrics_endpoint():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+# FOCUSLEDGER_TRACE=1 logs the stage timings of every callback to the "focusledger.trace" logger
+metrics.enable_trace(os.getenv("FOCUSLEDGER_TRACE", "").lower() in ("1", "true", "yes"))
+
+
 app.layout = dbc.Container([
     html.H1("FocusLedger: Toggl Time Visualization", style={
         "fontWeight": "bold",
@@ -26,36 +161,50 @@ app.layout = dbc.Container([
     }),
     dbc.Alert(id="rate-limit-banner", color="warning", is_open=False, style={"marginBottom": "10px"}),
     dbc.Alert(id="error-message", color="danger", is_open=False),
+    dcc.Store(id="dataset"),
+    html.Div([
+        dbc.Input(id="api-token", type="password", placeholder="Toggl API token", persistence=True, persistence_type="session",
+                  style={"borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+    ], style={"marginBottom": "1em"} if multi_tenant else {"display": "none"}),
     dbc.Card([
         dbc.CardBody([
             dbc.Row([
                 dbc.Col([
-                    html.Label("Cumulative: Days to show", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="days_to_show", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label(_window_label("days_to_show"), id="days_to_show-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="days_to_show", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                ], width=2),
+                dbc.Col([
+                    html.Label(_window_label("rolling_window"), id="rolling_window-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="rolling_window", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
                 ], width=2),
                 dbc.Col([
-                    html.Label("Cumulative: Rolling window (days)", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="rolling_window", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label(_window_label("avg_days_to_show"), id="avg_days_to_show-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="avg_days_to_show", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
                 ], width=2),
                 dbc.Col([
-                    html.Label("Average: Days to show", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="avg_days_to_show", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label(_window_label("avg_rolling_window"), id="avg_rolling_window-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="avg_rolling_window", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
                 ], width=2),
                 dbc.Col([
-                    html.Label("Average: Rolling window (days)", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="avg_rolling_window", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label(_window_label("sumavg_days_to_show"), id="sumavg_days_to_show-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="sumavg_days_to_show", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
                 ], width=2),
                 dbc.Col([
-                    html.Label("Avg of Sums: Days to show", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="sumavg_days_to_show", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label(_window_label("sum_window"), id="sum_window-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="sum_window", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
                 ], width=2),
                 dbc.Col([
-                    html.Label("Sum Window (days)", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="sum_window", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label(_window_label("avg_window"), id="avg_window-label", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Input(id="avg_window", type="number", value=7, min=1, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
                 ], width=2),
                 dbc.Col([
-                    html.Label("Avg Window (days)", style={"fontWeight": "500", "color": "#4a4e69"}),
-                    dcc.Input(id="avg_window", type="number", value=7, min=1, max=90, style={"width": "100%", "borderRadius": "8px", "border": "1px solid #c9ada7", "padding": "6px"}),
+                    html.Label("Resolution", style={"fontWeight": "500", "color": "#4a4e69"}),
+                    dcc.Dropdown(
+                        id="resolution",
+                        options=[{"label": "Day", "value": "day"}, {"label": "Week", "value": "week"}, {"label": "Month", "value": "month"}],
+                        value="day",
+                        clearable=False,
+                    ),
                 ], width=2),
                 dbc.Col([
                     html.Button("Refresh", id="refresh", n_clicks=0, className="btn btn-primary", style={"width": "100%", "borderRadius": "8px", "backgroundColor": "#22223b", "border": "none", "fontWeight": "bold"})
@@ -83,55 +232,207 @@ app.layout = dbc.Container([
 ], fluid=True, style={"paddingTop": "2em", "paddingBottom": "2em", "backgroundColor": "#f8f8fa", "minHeight": "100vh"})
 
 
-# Callback for both graphs
+_loads = SingleFlight()
+
+RATE_LIMIT_MESSAGE = "⚠️ Could not retrieve all data from Toggl due to API rate limiting."
+
+
+def _stale_message(token):
+    # Rate-limited or out of request budget: say how old the stored data is
+    watermark = tenants.get(token).store.watermark
+    if watermark is None:
+        return RATE_LIMIT_MESSAGE
+    synced = datetime.fromtimestamp(watermark, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    return f"{RATE_LIMIT_MESSAGE} Showing stale data from the last sync at {synced}."
+
+
+def _max_window(days_to_show, rolling_window, avg_days_to_show, avg_rolling_window, sumavg_days_to_show, sum_window, avg_window, resolution="day"):
+    # Enough history (in days) to cover the largest window needed for all graphs;
+    # at week or month resolution the inputs count periods, plus one partial period
+    periods = max(days_to_show + rolling_window - 1, avg_days_to_show + avg_rolling_window - 1, sumavg_days_to_show + sum_window + avg_window - 2)
+    if resolution == "day":
+        return periods
+    return (periods + 1) * PERIOD_DAYS[resolution]
+
+
+def _api_token(session_token=None):
+    # In multi-tenant mode each browser session supplies its own token
+    if multi_tenant:
+        return (session_token or "").strip() or None
+    return os.getenv("TOGGL_API_TOKEN")
+
+
+def _load_view(token, days, resolution="day"):
+    # Concurrent Refreshes of the same account and window share one sync and one view
+    return _loads.do((token, days, resolution), lambda: _build_view(token, days, resolution))
+
+
+def _build_view(token, days, resolution):
+    # Entries and projects are fetched concurrently; the sync folds changed
+    # entries into the store's daily totals, so nothing is re-aggregated here
+    store = tenants.get(token).store
+    if scheduler is not None:
+        scheduler.watch(token, days)
+        if store.covers(days):
+            # Already synced in the background: read the totals without touching Toggl
+            try:
+                projects = project_cache.get(token)
+            except Exception:
+                projects = []
+            status = scheduler.status(token) or {}
+            with timed("view"):
+                view = prepare_daily_view(store.totals, days, projects, resolution)
+            return view, status.get("rate_limited", False)
+    _, projects, rate_limited = fetch_dataset(token, days, store, project_cache, fetch=fetch_time_entry_columns, load=False)
+    with timed("view"):
+        view = prepare_daily_view(store.totals, days, projects, resolution)
+    return view, rate_limited
+
+
+def _dataset_view(token, handle):
+    # Returns (view, version). A dataset that was evicted, or loaded by another
+    # worker process, is rebuilt from this process's stored totals, after
+    # catching up with what other workers synced into a shared store file.
+    # Graph callbacks never sync from Toggl, so without the window in the store
+    # there is nothing to draw yet. The rebuilt view is registered under its own
+    # version, so the figures built from it are cached under what they actually show.
+    tenant = tenants.get(token)
+    view = tenant.datasets.get(handle["version"])
+    if view is not None:
+        return view, handle["version"]
+    if not tenant.store.covers(handle["days"]):
+        tenant.store.refresh()
+        if not tenant.store.covers(handle["days"]):
+            raise PreventUpdate
+    try:
+        projects = project_cache.get(token)
+    except Exception:
+        projects = []
+    with timed("view"):
+        view = prepare_daily_view(tenant.store.totals, handle["days"], projects, handle.get("resolution", "day"))
+    return view, tenant.datasets.put(view)
+
+
+def _graph(handle, key, build, session_token=None):
+    token = _api_token(session_token)
+    if not handle or not token or handle.get("tenant", tenant_id(token)) != tenant_id(token):
+        raise PreventUpdate
+    view, version = _dataset_view(token, handle)
+    def build_figure():
+        with timed(f"build_{key[0]}"):
+            return build(view)
+
+    return tenants.get(token).figure_cache.get_or_build((key[0], version) + key[1:], build_figure)
+
 
 @app.callback(
-    Output("cumulative-graph", "figure"),
-    Output("average-graph", "figure"),
-    Output("sumavg-graph", "figure"),
+    [Output(f"{input_id}-label", "children") for input_id in WINDOW_LABELS],
+    Input("resolution", "value"),
+)
+def update_window_labels(resolution):
+    return [_window_label(input_id, resolution) for input_id in WINDOW_LABELS]
+
+
+# Fetch the dataset once per Refresh; graphs read it through the "dataset" handle
+
+@app.callback(
+    Output("dataset", "data"),
     Output("error-message", "children"),
     Output("error-message", "is_open"),
     Output("rate-limit-banner", "children"),
     Output("rate-limit-banner", "is_open"),
     Input("refresh", "n_clicks"),
-    State("days_to_show", "value"),
-    State("rolling_window", "value"),
-    State("avg_days_to_show", "value"),
-    State("avg_rolling_window", "value"),
-    State("sumavg_days_to_show", "value"),
-    State("sum_window", "value"),
-    State("avg_window", "value")
+    Input("days_to_show", "value"),
+    Input("rolling_window", "value"),
+    Input("avg_days_to_show", "value"),
+    Input("avg_rolling_window", "value"),
+    Input("sumavg_days_to_show", "value"),
+    Input("sum_window", "value"),
+    Input("avg_window", "value"),
+    Input("resolution", "value"),
+    State("dataset", "data"),
+    State("api-token", "value"),
 )
-def update_graphs(n_clicks, days_to_show, rolling_window, avg_days_to_show, avg_rolling_window, sumavg_days_to_show, sum_window, avg_window):
-    token = os.getenv("TOGGL_API_TOKEN")
+@traced("load_dataset")
+def load_dataset(n_clicks, days_to_show, rolling_window, avg_days_to_show, avg_rolling_window, sumavg_days_to_show, sum_window, avg_window, resolution, handle, session_token=None):
+    token = _api_token(session_token)
     if not token:
-        return dash.no_update, dash.no_update, dash.no_update, "Toggl API token not set. Please set TOGGL_API_TOKEN in your environment.", True, "", False
+        if multi_tenant:
+            return dash.no_update, "Enter your Toggl API token and press Refresh.", True, "", False
+        return dash.no_update, "Toggl API token not set. Please set TOGGL_API_TOKEN in your environment.", True, "", False
     try:
-        # Fetch enough data to cover the largest window needed for all graphs
-        max_window = max(days_to_show + rolling_window - 1, avg_days_to_show + avg_rolling_window - 1, sumavg_days_to_show + sum_window + avg_window - 2)
-        entries = fetch_time_entries(token, max_window)
-        try:
-            projects = fetch_projects(token)
-        except Exception:
-            projects = []
-        fig_cum = prepare_cumulative_graph(entries, projects, days_to_show, rolling_window)
-        fig_avg = prepare_rolling_average_graph(entries, projects, avg_days_to_show, avg_rolling_window)
-        fig_sumavg = prepare_rolling_avg_of_sum_graph(entries, projects, sumavg_days_to_show, sum_window, avg_window)
-        return fig_cum, fig_avg, fig_sumavg, "", False, "", False
-    except RateLimitError as e:
-        try:
-            entries = []
-            projects = []
-            fig_cum = prepare_cumulative_graph(entries, projects, days_to_show, rolling_window)
-            fig_avg = prepare_rolling_average_graph(entries, projects, avg_days_to_show, avg_rolling_window)
-            fig_sumavg = prepare_rolling_avg_of_sum_graph(entries, projects, sumavg_days_to_show, sum_window, avg_window)
-        except Exception:
-            fig_cum = dash.no_update
-            fig_avg = dash.no_update
-            fig_sumavg = dash.no_update
-        return fig_cum, fig_avg, fig_sumavg, "", False, "⚠️ Could not retrieve all data from Toggl due to API rate limiting.", True
+        resolution = resolution or "day"
+        max_window = _max_window(days_to_show, rolling_window, avg_days_to_show, avg_rolling_window, sumavg_days_to_show, sum_window, avg_window, resolution)
+        tenant = tenant_id(token)
+        if (handle and handle["n_clicks"] == n_clicks and handle.get("resolution", "day") == resolution
+                and handle.get("tenant", tenant) == tenant and handle["days"] >= max_window):
+            # Only a graph input changed and the loaded history already covers it
+            raise PreventUpdate
+        if scheduler is not None and handle and handle["n_clicks"] != n_clicks:
+            # Refresh asks the background worker for a sync instead of waiting on Toggl
+            scheduler.nudge(token)
+        view, rate_limited = _load_view(token, max_window, resolution)
+        version = tenants.get(token).datasets.put(view)
+        handle = {"version": version, "days": max_window, "resolution": resolution, "n_clicks": n_clicks, "tenant": tenant}
+        if rate_limited:
+            return handle, "", False, _stale_message(token), True
+        return handle, "", False, "", False
+    except PreventUpdate:
+        raise
     except Exception as e:
-        return dash.no_update, dash.no_update, dash.no_update, str(e), True, "", False
+        return dash.no_update, str(e), True, "", False
+
+
+# One callback per graph, firing only on the dataset and that graph's own inputs
+
+@app.callback(
+    Output("cumulative-graph", "figure"),
+    Input("dataset", "data"),
+    Input("days_to_show", "value"),
+    Input("rolling_window", "value"),
+    State("api-token", "value"),
+)
+@traced("update_cumulative_graph")
+def update_cumulative_graph(handle, days_to_show, rolling_window, session_token=None):
+    return _graph(
+        handle, ("cumulative", days_to_show, rolling_window),
+        lambda view: prepare_cumulative_graph(view, days_to_show=days_to_show, rolling_window=rolling_window, max_points=max_points, render=render, webgl_points=webgl_points),
+        session_token,
+    )
+
+
+@app.callback(
+    Output("average-graph", "figure"),
+    Input("dataset", "data"),
+    Input("avg_days_to_show", "value"),
+    Input("avg_rolling_window", "value"),
+    State("api-token", "value"),
+)
+@traced("update_average_graph")
+def update_average_graph(handle, avg_days_to_show, avg_rolling_window, session_token=None):
+    return _graph(
+        handle, ("average", avg_days_to_show, avg_rolling_window),
+        lambda view: prepare_rolling_average_graph(view, days_to_show=avg_days_to_show, rolling_window=avg_rolling_window, max_points=max_points, render=render, webgl_points=webgl_points),
+        session_token,
+    )
+
+
+@app.callback(
+    Output("sumavg-graph", "figure"),
+    Input("dataset", "data"),
+    Input("sumavg_days_to_show", "value"),
+    Input("sum_window", "value"),
+    Input("avg_window", "value"),
+    State("api-token", "value"),
+)
+@traced("update_sumavg_graph")
+def update_sumavg_graph(handle, sumavg_days_to_show, sum_window, avg_window, session_token=None):
+    return _graph(
+        handle, ("sumavg", sumavg_days_to_show, sum_window, avg_window),
+        lambda view: prepare_rolling_avg_of_sum_graph(view, days_to_show=sumavg_days_to_show, sum_window=sum_window, avg_window=avg_window, max_points=max_points, render=render, webgl_points=webgl_points),
+        session_token,
+    )
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8050, debug=True)
+    # Development server; production runs focusledger.wsgi:server under gunicorn
+    app.run(host="0.0.0.0", port=8050, debug=os.getenv("FOCUSLEDGER_DEBUG", "").lower() in ("1", "true", "yes"))
@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+from focusledger.figure_cache import view_version
+
+# Server-side registry of prepared daily-total views.
+# Callbacks pass around a small handle (the dataset's version) in a dcc.Store
+# instead of the data itself.
+
+
+class DatasetRegistry:
+    """
+    Thread-safe LRU registry of prepared DailyViews keyed by content version
+    (see view_version).
+    Holds at most `max_datasets` datasets; a callback that misses (evicted, or
+    loaded by another worker process) is expected to rebuild it.
+    """
+
+    def __init__(self, max_datasets=8):
+        self.max_datasets = max_datasets
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+
+    def put(self, frame):
+        """Register `frame` (a DailyView) and return its version."""
+        version = view_version(frame)
+        with self._lock:
+            self._frames[version] = frame
+            self._frames.move_to_end(version)
+            while len(self._frames) > self.max_datasets:
+                self._frames.popitem(last=False)
+        return version
+
+    def get(self, version):
+        """Return the dataset registered under `version`, or None."""
+        with self._lock:
+            frame = self._frames.get(version)
+            if frame is not None:
+                self._frames.move_to_end(version)
+            return frame
+
+    def __len__(self):
+        with self._lock:
+            return len(self._frames)
@@ -0,0 +1,126 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from focusledger.toggl_api import fetch_time_entry_columns, PartialDataError, RateLimitError
+
+# Fetch layer: issues the time-entry sync and the project lookup concurrently,
+# and splits long history windows into chunks fetched in parallel.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Created on first use so FOCUSLEDGER_FETCH_WORKERS from .env is honored
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("FOCUSLEDGER_FETCH_WORKERS", "8")),
+                thread_name_prefix="focusledger-fetch",
+            )
+        return _executor
+
+
+def chunk_ranges(days, chunk_days, now=None, max_chunks=None):
+    """
+    Split the last `days` days into (start, end) unix-time ranges of at most
+    `chunk_days` days each, newest first. With `max_chunks` set, longer
+    windows get longer chunks so there are never more than that many.
+    """
+    end = int(time.time()) if now is None else int(now)
+    start = end - round(days * 86400)
+    if max_chunks:
+        chunk_days = max(chunk_days, -(-days // max_chunks))
+    step = max(1, int(chunk_days * 86400))
+    ranges = []
+    while end > start:
+        ranges.append((max(start, end - step), end))
+        end -= step
+    return ranges
+
+
+def iter_time_entry_chunks(api_token, days, chunk_days=7, max_workers=4, retries=2,
+                           fetch=fetch_time_entry_columns, now=None, max_chunks=None):
+    """
+    Fetch the last `days` days of time entries as date-range chunks (see
+    chunk_ranges) with at most `max_workers` requests in flight, yielding
+    ((start, end), entries) for each chunk as soon as it arrives.
+    A chunk that fails with anything other than RateLimitError is retried up to
+    `retries` times before the error is raised. Rate-limited chunks are skipped;
+    once every other chunk has been yielded, PartialDataError reports what is missing.
+    """
+    ranges = chunk_ranges(days, chunk_days, now, max_chunks)
+
+    def fetch_chunk(chunk):
+        for attempt in range(retries + 1):
+            try:
+                return fetch(api_token, start=chunk[0], end=chunk[1])
+            except RateLimitError:
+                raise
+            except Exception:
+                if attempt == retries:
+                    raise
+
+    received = 0
+    missing = []
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ranges) or 1)),
+                              thread_name_prefix="focusledger-chunk")
+    try:
+        # Each chunk runs in a copy of the caller's context so its timings reach the callback trace
+        futures = {pool.submit(contextvars.copy_context().run, fetch_chunk, chunk): chunk for chunk in ranges}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                entries = future.result()
+            except RateLimitError:
+                missing.append(chunk)
+                continue
+            received += len(entries)
+            yield chunk, entries
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if missing:
+        raise PartialDataError(
+            "Toggl API rate limit reached. Displaying partial data.",
+            received=received,
+            missing=sorted(missing),
+        )
+
+
+def fetch_dataset(api_token, days, store, project_cache, fetch=fetch_time_entry_columns, load=True):
+    """
+    Sync time entries for the last `days` days into `store` and look up the
+    projects in `project_cache` at the same time, then join both results.
+    Args:
+        api_token (str): Toggl API token.
+        days (int): Size of the history window in days.
+        store (EntryStore): Local time-entry store to sync and read from.
+        project_cache (ProjectCache): Cache of project metadata.
+        fetch (callable): Time-entry fetcher passed to store.sync.
+        load (bool): Read the window's entries back from the store; when False
+            entries is None and callers read store.totals instead.
+    Returns:
+        tuple: (entries, projects, rate_limited). When Toggl rate-limits the
+        sync, entries come from the store as-is (including any chunks that did
+        arrive) and rate_limited is True. A failed project lookup yields an
+        empty project list.
+    Raises any other error from the time-entry sync.
+    """
+    executor = _get_executor()
+    entries_future = executor.submit(contextvars.copy_context().run, store.sync, api_token, days, fetch=fetch, load=load)
+    projects_future = executor.submit(contextvars.copy_context().run, project_cache.get, api_token)
+    rate_limited = False
+    try:
+        entries = entries_future.result()
+    except RateLimitError:
+        # Serve what the local store already holds instead of blank graphs
+        entries = store.load(days) if load else None
+        rate_limited = True
+    try:
+        projects = projects_future.result()
+    except Exception:
+        projects = []
+    return entries, projects, rate_limited
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from focusledger.metrics import FIGURE_ESTIMATED_BYTES
+from focusledger.singleflight import SingleFlight
+
+# Server-side cache of built figures, keyed by dataset version and graph parameters
+
+# Estimated JSON bytes of a figure's layout (mostly its template) and of the
+# non-array attributes of one trace
+LAYOUT_BYTES = 8 * 1024
+TRACE_BYTES = 512
+ARRAY_PROPERTIES = ("x", "y", "customdata", "text")
+
+
+def view_version(view) -> str:
+    """
+    Return a content hash of a DailyView: its projects, days, totals and colors.
+    """
+    digest = hashlib.sha1()
+    digest.update(repr(view.labels).encode())
+    digest.update(view.days.asi8.tobytes())
+    digest.update(view.seconds.tobytes())
+    digest.update(repr(sorted(view.color_map.items())).encode())
+    return digest.hexdigest()
+
+
+def _array_bytes(values):
+    if values is None:
+        return 0
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiub":
+        # Sent as a base64 typed array
+        return 4 * -(-values.nbytes // 3) + 32
+    if len(values) == 0:
+        return 2
+    first = values[0]
+    # Strings are quoted and comma-separated; numbers take about 8 characters
+    return len(values) * (len(first) + 3 if isinstance(first, str) else 9)
+
+
+def figure_bytes(figure) -> int:
+    """
+    Estimate the size of `figure` serialized to JSON from the lengths of its
+    trace arrays, without serializing it.
+    """
+    size = LAYOUT_BYTES
+    for trace in figure.data:
+        size += TRACE_BYTES
+        for name in ARRAY_PROPERTIES:
+            if name in trace:
+                size += _array_bytes(trace[name])
+    return size
+
+
+class FigureCache:
+    """
+    Thread-safe LRU cache of Plotly figures bounded by entry count and by the
+    estimated size of the figures' JSON (see figure_bytes). The least
+    recently used figures are evicted first; a figure larger than the byte
+    bound is never cached.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._figures = OrderedDict()
+        self._builds = SingleFlight()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached figure for `key`, or None."""
+        with self._lock:
+            item = self._figures.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._figures.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, figure):
+        """Cache `figure` under `key`, evicting old figures to stay within bounds."""
+        size = figure_bytes(figure)
+        FIGURE_ESTIMATED_BYTES.observe(size)
+        with self._lock:
+            if key in self._figures:
+                self.total_bytes -= self._figures.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._figures[key] = (figure, size)
+            self.total_bytes += size
+            while len(self._figures) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._figures.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_build(self, key, build):
+        """
+        Return the cached figure for `key`, building and caching it with `build()`
+        on a miss. Concurrent misses for the same key share one build. A
+        fallback figure from a failed build (one with `_build_failed` set) is
+        returned but not cached, so the next lookup builds again.
+        """
+        figure = self.get(key)
+        if figure is None:
+            figure = self._builds.do(key, lambda: self._build(key, build))
+        return figure
+
+    def _build(self, key, build):
+        # Another caller may have finished this build between our miss and now
+        with self._lock:
+            item = self._figures.get(key)
+        if item is not None:
+            return item[0]
+        figure = build()
+        if not getattr(figure, "_build_failed", False):
+            self.put(key, figure)
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._figures),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,321 +1,225 @@
-def prepare_rolling_avg_of_sum_graph(entries, projects=None, days_to_show=7, sum_window=7, avg_window=7):
+import logging
+import time
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+from focusledger.aggregation import DailyView, daily_totals, last_days, lttb_indices, rolling_mean
+from focusledger.metrics import STAGE_ERRORS
+from focusledger.preprocessing import prepare_entries_frame
+
+logger = logging.getLogger(__name__)
+
+# Most points a figure sends to the browser before its dates are downsampled
+MAX_POINTS = 20000
+# 'svg' draws go.Scatter traces, 'webgl' go.Scattergl, and 'auto' switches to
+# WebGL once a figure has more than WEBGL_POINTS points (traces x dates)
+RENDER_MODES = ('auto', 'svg', 'webgl')
+WEBGL_POINTS = 5000
+
+
+def _daily_view(entries, projects, resolution=None):
+    # Graph builders accept raw entries, a frame built by prepare_entries_frame,
+    # or a view of the incrementally maintained daily totals (at any resolution)
+    if isinstance(entries, DailyView):
+        view = entries
+    else:
+        df = entries if isinstance(entries, pd.DataFrame) else prepare_entries_frame(entries or [], projects)
+        if df.empty:
+            view = DailyView([], [], [])
+        else:
+            labels, days, seconds = daily_totals(df['project'], df['date'], df['seconds'])
+            view = DailyView(labels, days, seconds, color_map=df.attrs.get('color_map', {}))
+    return view.rollup(resolution) if resolution else view
+
+
+def _trace_type(render, n_points, webgl_points=WEBGL_POINTS):
+    if render not in RENDER_MODES:
+        raise ValueError(f"render must be one of {', '.join(RENDER_MODES)}, not {render!r}")
+    if render == 'webgl' or (render == 'auto' and n_points > webgl_points):
+        return go.Scattergl
+    return go.Scatter
+
+
+def _no_data(graph, error):
+    # Still an empty chart for the user, but counted and logged so a failure
+    # is told apart from an empty dataset, and flagged so it isn't cached
+    STAGE_ERRORS.inc(stage=f"build_{graph}", error=type(error).__name__)
+    logger.exception("Building the %s graph failed", graph)
+    figure = _empty_figure()
+    figure._build_failed = True
+    return figure
+
+
+def _empty_figure():
+    return go.Figure(layout=dict(title="No data available", margin=dict(t=60)))
+
+
+def _line_figure(labels, days, values, color_map, title, yaxis_title, value_hover, total_hover,
+                 max_points=MAX_POINTS, render='auto', webgl_points=WEBGL_POINTS):
+    """
+    Build one line trace per project from a (projects x days) array of values.
+    Points are numeric arrays (sent to the browser as binary) formatted by the
+    hover templates (`value_hover` for %{y}, `total_hover` for the total in
+    %{customdata}); the per-day total is carried once, as the first trace's
+    custom data, for the top line of the unified hover. Above `max_points`
+    points in total the dates are downsampled with LTTB on that total, so every
+    trace keeps the same dates and the unified hover stays aligned.
+    `render` picks SVG or WebGL (Scattergl) traces; see RENDER_MODES.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    totals = values.sum(axis=0)
+    if max_points and values.size > max_points:
+        keep = lttb_indices(totals, max(3, max_points // len(labels)))
+        days, values, totals = days[keep], values[:, keep], totals[keep]
+    dates = days.strftime('%Y-%m-%d').tolist()
+    trace_type = _trace_type(render, values.size, webgl_points)
+    palette = qualitative.Plotly
+    value_hover = "%{fullData.name}<br>" + value_hover + "<extra></extra>"
+    fig = go.Figure()
+    for i, label in enumerate(labels):
+        trace = dict(
+            x=dates,
+            y=values[i].astype(np.float32),
+            name=label,
+            mode="lines+markers",
+            line=dict(color=color_map.get(label) or palette[i % len(palette)]),
+            hovertemplate=value_hover,
+        )
+        if i == 0:
+            # Add a visible annotation for the total at the top of the unified hover
+            trace['customdata'] = totals.astype(np.float32)
+            trace['hovertemplate'] = "<b>" + total_hover + "</b><br>" + value_hover
+        fig.add_trace(trace_type(**trace))
+    fig.update_layout(
+        title=title,
+        xaxis_title="Date",
+        yaxis_title=yaxis_title,
+        legend_title_text="project",
+        hovermode="x unified",
+        hoverlabel=dict(namelength=0)
+    )
+    return fig
+
+
+def prepare_rolling_avg_of_sum_graph(entries, projects=None, days_to_show=7, sum_window=7, avg_window=7, resolution=None,
+                                     max_points=MAX_POINTS, render='auto', webgl_points=WEBGL_POINTS):
     """
     For each project, for each day, compute the sum of the last sum_window days (rolling sum),
     then compute a rolling average of those sums over the last avg_window days.
     The graph displays the rolling average of the rolling sum for each project, and the sum of these for each day.
+    With resolution 'week' or 'month', days_to_show and both windows count weeks or months instead.
+    Long ranges are downsampled to about max_points points in total, and drawn with
+    WebGL per `render` ('auto' above webgl_points points).
     """
     try:
-        if not entries:
-            return px.line(title="No data available")
-        df = pd.DataFrame(entries)
-        project_map = {}
-        color_map = {}
-        if projects:
-            for proj in projects:
-                project_map[proj.get('id')] = proj.get('name', str(proj.get('id')))
-                if 'color' in proj and proj['color']:
-                    color_map[proj.get('name', str(proj.get('id')))] = proj['color']
-        if 'project_id' in df.columns:
-            df['project'] = df['project_id'].map(lambda pid: project_map.get(pid, str(pid)) or "Unknown Project")
-        elif 'project' in df.columns:
-            df['project'] = df['project'].fillna('Unknown Project')
-            df.loc[df['project'] == '', 'project'] = 'Unknown Project'
-        else:
-            df['project'] = 'Unknown Project'
-        df['project'] = df['project'].fillna('Unknown Project')
-        df['start'] = pd.to_datetime(df['start'], errors='coerce')
-        df['stop'] = pd.to_datetime(df['stop'], errors='coerce')
-        df = df.dropna(subset=['start', 'stop'])
-        if df.empty:
-            return px.line(title="No data available")
-        df['duration'] = (df['stop'] - df['start']).dt.total_seconds() / 3600.0
-        df['date'] = df['start'].dt.date
-        if df['date'].empty:
-            return px.line(title="No data available")
-        all_dates = pd.date_range(df['date'].min(), df['date'].max())
-        result = []
-        for project in df['project'].unique():
-            proj_df = df[df['project'] == project]
-            # Compute rolling sum for each day
-            rolling_sums = []
-            for date in all_dates:
-                window_start = date - pd.Timedelta(days=sum_window-1)
-                date_only = date.date()
-                window_start_only = window_start.date()
-                mask = (proj_df['date'] >= window_start_only) & (proj_df['date'] <= date_only)
-                total = proj_df.loc[mask, 'duration'].sum()
-                rolling_sums.append({'project': project, 'date': date_only, 'rolling_sum': total})
-            # Now compute rolling average of the rolling sums
-            rolling_sums_df = pd.DataFrame(rolling_sums)
-            rolling_sums_df['rolling_avg_of_sum'] = rolling_sums_df['rolling_sum'].rolling(window=avg_window, min_periods=1).mean()
-            result.extend(rolling_sums_df.to_dict('records'))
-        result_df = pd.DataFrame(result)
-        if not result_df.empty:
-            last_date = result_df['date'].max()
-            if isinstance(last_date, datetime):
-                last_date = last_date.date()
-            cutoff = last_date - pd.Timedelta(days=days_to_show-1)
-            if isinstance(cutoff, pd.Timestamp):
-                cutoff = cutoff.date()
-            result_df = result_df[result_df['date'] >= cutoff]
-        result_df['hover_val'] = result_df['rolling_avg_of_sum'].round(2).astype(str) + ' avg of sum hrs'
-        # Compute sum of rolling averages for each date
-        sum_avg_by_date = result_df.groupby('date')['rolling_avg_of_sum'].sum().round(2).astype(str) + ' total avg of sum hrs'
-        sum_map = sum_avg_by_date.to_dict()
-        result_df['sum_avg_for_day'] = result_df['date'].map(sum_map)
-        fig = px.line(
-            result_df,
-            x='date',
-            y='rolling_avg_of_sum',
-            color='project',
-            markers=True,
-            title=f"Rolling Avg of {sum_window}-Day Sums (Avg Window: {avg_window} days)",
-            custom_data=['project', 'hover_val', 'sum_avg_for_day']
+        view = _daily_view(entries, projects, resolution)
+        unit = view.resolution
+        if view.empty:
+            return _empty_figure()
+        # Rolling sums stay in seconds so the second window sees exact totals
+        averages = rolling_mean(view.rolling_sum(sum_window), avg_window) / 3600.0
+        days, averages = last_days(view.days, averages, days_to_show)
+        return _line_figure(
+            view.labels, days, averages, view.color_map,
+            title=f"Rolling Avg of {sum_window}-{unit.title()} Sums (Avg Window: {avg_window} {unit}s)",
+            yaxis_title=f"Avg of {sum_window}-{unit} Sums (over {avg_window} {unit}s)",
+            value_hover="%{y:.2f} avg of sum hrs",
+            total_hover="Sum: %{customdata:.2f} total avg of sum hrs",
+            max_points=max_points, render=render, webgl_points=webgl_points,
         )
-        if color_map:
-            for trace in fig.data:
-                proj_name = trace.name
-                if proj_name in color_map:
-                    trace.line.color = color_map[proj_name]
-        for trace in fig.data:
-            trace.hovertemplate = "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-            trace.mode = "lines+markers"
-        fig.update_layout(
-            xaxis_title="Date",
-            yaxis_title=f"Avg of {sum_window}-day Sums (over {avg_window} days)",
-            hovermode="x unified",
-            hoverlabel=dict(namelength=0)
-        )
-        for i, trace in enumerate(fig.data):
-            if i == 0:
-                trace.hovertemplate = (
-                    "<b>Sum: %{customdata[2]}</b><br>"
-                    "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-                )
-            else:
-                trace.hovertemplate = "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-        return fig
-    except Exception:
-        return px.line(title="No data available")
-def prepare_rolling_average_graph(entries, projects=None, days_to_show=7, rolling_window=7):
+    except Exception as e:
+        return _no_data("sumavg", e)
+def prepare_rolling_average_graph(entries, projects=None, days_to_show=7, rolling_window=7, resolution=None,
+                                  max_points=MAX_POINTS, render='auto', webgl_points=WEBGL_POINTS):
     """
     Prepares a rolling average graph for each project, showing the average hours per day over a rolling window.
     The graph displays the rolling average for each project and the sum of these averages for each day.
+    With resolution 'week' or 'month', the average is per week or month over a window of that many periods.
+    Long ranges are downsampled to about max_points points in total, and drawn with
+    WebGL per `render` ('auto' above webgl_points points).
     """
     try:
-        if not entries:
-            return px.line(title="No data available")
-        df = pd.DataFrame(entries)
-        project_map = {}
-        color_map = {}
-        if projects:
-            for proj in projects:
-                project_map[proj.get('id')] = proj.get('name', str(proj.get('id')))
-                if 'color' in proj and proj['color']:
-                    color_map[proj.get('name', str(proj.get('id')))] = proj['color']
-        if 'project_id' in df.columns:
-            df['project'] = df['project_id'].map(lambda pid: project_map.get(pid, str(pid)) or "Unknown Project")
-        elif 'project' in df.columns:
-            df['project'] = df['project'].fillna('Unknown Project')
-            df.loc[df['project'] == '', 'project'] = 'Unknown Project'
-        else:
-            df['project'] = 'Unknown Project'
-        df['project'] = df['project'].fillna('Unknown Project')
-        df['start'] = pd.to_datetime(df['start'], errors='coerce')
-        df['stop'] = pd.to_datetime(df['stop'], errors='coerce')
-        df = df.dropna(subset=['start', 'stop'])
-        if df.empty:
-            return px.line(title="No data available")
-        df['duration'] = (df['stop'] - df['start']).dt.total_seconds() / 3600.0
-        df['date'] = df['start'].dt.date
-        if df['date'].empty:
-            return px.line(title="No data available")
-        all_dates = pd.date_range(df['date'].min(), df['date'].max())
-        result = []
-        for project in df['project'].unique():
-            proj_df = df[df['project'] == project]
-            for date in all_dates:
-                window_start = date - pd.Timedelta(days=rolling_window-1)
-                date_only = date.date()
-                window_start_only = window_start.date()
-                mask = (proj_df['date'] >= window_start_only) & (proj_df['date'] <= date_only)
-                days_in_window = (date_only - window_start_only).days + 1
-                total = proj_df.loc[mask, 'duration'].sum()
-                avg = total / days_in_window if days_in_window > 0 else 0
-                result.append({'project': project, 'date': date_only, 'rolling_avg': avg})
-        result_df = pd.DataFrame(result)
-        if not result_df.empty:
-            last_date = result_df['date'].max()
-            if isinstance(last_date, datetime):
-                last_date = last_date.date()
-            cutoff = last_date - pd.Timedelta(days=days_to_show-1)
-            if isinstance(cutoff, pd.Timestamp):
-                cutoff = cutoff.date()
-            result_df = result_df[result_df['date'] >= cutoff]
-        result_df['hover_hours'] = result_df['rolling_avg'].round(2).astype(str) + ' avg hrs/day'
-        # Compute sum of averages for each date
-        sum_avg_by_date = result_df.groupby('date')['rolling_avg'].sum().round(2).astype(str) + ' total avg hrs/day'
-        sum_map = sum_avg_by_date.to_dict()
-        result_df['sum_avg_for_day'] = result_df['date'].map(sum_map)
-        fig = px.line(
-            result_df,
-            x='date',
-            y='rolling_avg',
-            color='project',
-            markers=True,
-            title=f"{rolling_window}-Day Rolling Average by Project",
-            custom_data=['project', 'hover_hours', 'sum_avg_for_day']
-        )
-        if color_map:
-            for trace in fig.data:
-                proj_name = trace.name
-                if proj_name in color_map:
-                    trace.line.color = color_map[proj_name]
-        for trace in fig.data:
-            trace.hovertemplate = "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-            trace.mode = "lines+markers"
-        fig.update_layout(
-            xaxis_title="Date",
-            yaxis_title=f"Avg Hours/Day ({rolling_window}-day window)",
-            hovermode="x unified",
-            hoverlabel=dict(namelength=0)
+        view = _daily_view(entries, projects, resolution)
+        unit = view.resolution
+        if view.empty:
+            return _empty_figure()
+        days, totals = last_days(view.days, view.rolling_sum(rolling_window), days_to_show)
+        # Every window spans rolling_window days, even before the first entry
+        averages = totals / (rolling_window * 3600.0) if rolling_window > 0 else totals * 0.0
+        return _line_figure(
+            view.labels, days, averages, view.color_map,
+            title=f"{rolling_window}-{unit.title()} Rolling Average by Project",
+            yaxis_title=f"Avg Hours/{unit.title()} ({rolling_window}-{unit} window)",
+            value_hover=f"%{{y:.2f}} avg hrs/{unit}",
+            total_hover=f"Sum of Avgs: %{{customdata:.2f}} total avg hrs/{unit}",
+            max_points=max_points, render=render, webgl_points=webgl_points,
         )
-        for i, trace in enumerate(fig.data):
-            if i == 0:
-                trace.hovertemplate = (
-                    "<b>Sum of Avgs: %{customdata[2]}</b><br>"
-                    "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-                )
-            else:
-                trace.hovertemplate = "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-        return fig
-    except Exception:
-        return px.line(title="No data available")
-import pandas as pd
-import plotly.express as px
-from datetime import datetime
+    except Exception as e:
+        return _no_data("average", e)
 
 def prepare_cumulative_graph(
     entries: list,
     projects: list = None,
     days_to_show: int = 7,
-    rolling_window: int = 7
+    rolling_window: int = 7,
+    resolution: str = None,
+    max_points: int = MAX_POINTS,
+    render: str = 'auto',
+    webgl_points: int = WEBGL_POINTS
 ) -> 'plotly.graph_objs._figure.Figure':
     """
     Prepare a cumulative time graph grouped by project and date.
     Args:
-        entries (list): List of time entry dicts, each with 'start', 'stop', 'project'.
+        entries (list | pd.DataFrame | DailyView): List of time entry dicts, each with 'start', 'stop',
+            'project', a frame built by prepare_entries_frame, or a view of daily totals.
         projects (list): List of project dicts from Toggl API.
         days_to_show (int): Number of days to show on the graph.
         rolling_window (int): Window size for rolling sum.
+        resolution (str): 'day', 'week' or 'month'; the period days_to_show and rolling_window
+            count. Defaults to the resolution of `entries` (days for raw entries).
+        max_points (int): Point budget for the whole figure; longer ranges are
+            downsampled with LTTB. 0 or None keeps every point.
+        render (str): 'svg', 'webgl' (Scattergl traces), or 'auto' to use WebGL
+            once the figure has more than webgl_points points.
+        webgl_points (int): Point count above which 'auto' switches to WebGL.
     Returns:
         plotly.graph_objs._figure.Figure: Cumulative time line graph.
     """
     try:
-        if not entries:
-            return px.line(title="No data available")
-        df = pd.DataFrame(entries)
-        # Map project_id to project name if possible
-        project_map = {}
-        color_map = {}
-        if projects:
-            for proj in projects:
-                project_map[proj.get('id')] = proj.get('name', str(proj.get('id')))
-                # Toggl color is a hex string in 'color' field, e.g. '#ff0000'
-                if 'color' in proj and proj['color']:
-                    color_map[proj.get('name', str(proj.get('id')))] = proj['color']
-        if 'project_id' in df.columns:
-            df['project'] = df['project_id'].map(lambda pid: project_map.get(pid, str(pid)) or "Unknown Project")
-        elif 'project' in df.columns:
-            # Use the project field directly if present
-            df['project'] = df['project'].fillna('Unknown Project')
-            df.loc[df['project'] == '', 'project'] = 'Unknown Project'
-        else:
-            df['project'] = 'Unknown Project'
-        df['project'] = df['project'].fillna('Unknown Project')
-        # Parse start/stop times
-        df['start'] = pd.to_datetime(df['start'], errors='coerce')
-        df['stop'] = pd.to_datetime(df['stop'], errors='coerce')
-        # Remove rows with invalid dates
-        df = df.dropna(subset=['start', 'stop'])
-        if df.empty:
-            return px.line(title="No data available")
-        df['duration'] = (df['stop'] - df['start']).dt.total_seconds() / 3600.0
-        df['date'] = df['start'].dt.date
-        # Build a date range for the graph (last N days)
-        if df['date'].empty:
-            return px.line(title="No data available")
-        all_dates = pd.date_range(df['date'].min(), df['date'].max())
-        # For each project, calculate rolling sum for each day
-        result = []
-        for project in df['project'].unique():
-            proj_df = df[df['project'] == project]
-            for date in all_dates:
-                window_start = date - pd.Timedelta(days=rolling_window-1)
-                date_only = date.date()
-                window_start_only = window_start.date()
-                mask = (proj_df['date'] >= window_start_only) & (proj_df['date'] <= date_only)
-                total = proj_df.loc[mask, 'duration'].sum()
-                result.append({'project': project, 'date': date_only, 'rolling_sum': total})
-        result_df = pd.DataFrame(result)
-        # Only show the last N days on the graph
-        if not result_df.empty:
-            last_date = result_df['date'].max()
-            if isinstance(last_date, datetime):
-                last_date = last_date.date()
-            cutoff = last_date - pd.Timedelta(days=days_to_show-1)
-            if isinstance(cutoff, pd.Timestamp):
-                cutoff = cutoff.date()
-            result_df = result_df[result_df['date'] >= cutoff]
-        # Format rolling_sum to 1 decimal and add units
-        result_df['hover_hours'] = result_df['rolling_sum'].round(1).astype(str) + ' hours'
-
-        # Compute total for each date for unified hover
-        total_by_date = result_df.groupby('date')['rolling_sum'].sum().round(1).astype(str) + ' hours'
-        total_map = total_by_date.to_dict()
-        result_df['total_for_day'] = result_df['date'].map(total_map)
-
-        fig = px.line(
-            result_df,
-            x='date',
-            y='rolling_sum',
-            color='project',
-            markers=True,
-            title=f"{rolling_window}-Day Running Total by Project",
-            custom_data=['project', 'hover_hours', 'total_for_day']
+        view = _daily_view(entries, projects, resolution)
+        unit = view.resolution
+        if view.empty:
+            return _empty_figure()
+        # Rolling sums are differences of the view's running totals
+        days, totals = last_days(view.days, view.rolling_sum(rolling_window), days_to_show)
+        return _line_figure(
+            view.labels, days, totals / 3600.0, view.color_map,
+            title=f"{rolling_window}-{unit.title()} Running Total by Project",
+            yaxis_title=f"Hours ({rolling_window}-{unit} running total)",
+            value_hover="%{y:.1f} hours",
+            total_hover="Total: %{customdata:.1f} hours",
+            max_points=max_points, render=render, webgl_points=webgl_points,
         )
+    except Exception as e:
+        return _no_data("cumulative", e)
 
-        # Set project colors from Toggl
-        if color_map:
-            for trace in fig.data:
-                proj_name = trace.name
-                if proj_name in color_map:
-                    trace.line.color = color_map[proj_name]
-
-        # Custom hover for single points: just project and value, no labels
-        for trace in fig.data:
-            trace.hovertemplate = "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-            trace.mode = "lines+markers"
-
-        # Custom hover for x unified: show total and all projects for that day
-        fig.update_layout(
-            xaxis_title="Date",
-            yaxis_title=f"Hours ({rolling_window}-day running total)",
-            hovermode="x unified",
-            hoverlabel=dict(namelength=0)
-        )
-
-        # Add a visible annotation for the total at the top of the unified hover
-        for i, trace in enumerate(fig.data):
-            if i == 0:
-                trace.hovertemplate = (
-                    "<b>Total: %{customdata[2]}</b><br>"
-                    "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-                )
-            else:
-                trace.hovertemplate = "%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
-
-        return fig
-    except Exception:
-        return px.line(title="No data available")
 
+def warm_up():
+    """
+    Build and serialize each graph once from a two-entry dataset, so plotly's
+    lazily loaded trace and layout validators and the figure JSON encoder are
+    imported before the first real request (in a preloading parent, once for
+    every forked worker). Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    projects = [{'id': 1, 'name': 'warm-up', 'color': '#000000'}]
+    entries = [
+        {'start': '2024-01-01T09:00:00+00:00', 'stop': '2024-01-01T10:00:00+00:00', 'duration': 3600, 'project_id': 1},
+        {'start': '2024-01-02T09:00:00+00:00', 'stop': '2024-01-02T11:00:00+00:00', 'duration': 7200, 'project_id': 1},
+    ]
+    for render in ('svg', 'webgl'):
+        for build in (prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph):
+            build(entries, projects, days_to_show=2, render=render).to_json()
+    _empty_figure().to_json()
+    return time.perf_counter() - started
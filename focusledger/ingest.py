@@ -0,0 +1,161 @@
+import codecs
+import json
+from array import array
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# Streaming ingestion of Toggl time entries into compact columnar arrays.
+# Only the fields the graphs use are kept; everything else in the JSON is
+# dropped as soon as each entry has been parsed.
+
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally parse a top-level JSON array from an iterable of str or bytes
+    chunks, yielding each element as soon as it is complete.
+    Raises ValueError if the stream is not a JSON array or ends early.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    started = False
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("Expected a JSON array of time entries.")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ',':
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if end >= len(buffer):
+                break  # a trailing number could still be growing
+            yield value
+            pos = end
+    raise ValueError("Truncated JSON array of time entries.")
+
+
+def _timestamp(value):
+    """Parse a Toggl ISO 8601 timestamp into unix seconds, or NaN."""
+    if not value:
+        return np.nan
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class EntryColumns:
+    """
+    Time entries stored column by column in typed arrays.
+
+    Columns: id (int64), start and stop (unix seconds, NaN when missing),
+    project_id (NaN when the entry has no project), duration (seconds, negative
+    while running) and deleted (1 when Toggl reports server_deleted_at).
+    """
+
+    FIELDS = ('id', 'start', 'stop', 'project_id', 'duration', 'deleted')
+
+    def __init__(self):
+        self.id = array('q')
+        self.start = array('d')
+        self.stop = array('d')
+        self.project_id = array('d')
+        self.duration = array('d')
+        self.deleted = array('b')
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build columns from an iterable of entry dicts; entries without an id are skipped."""
+        columns = cls()
+        for entry in entries:
+            columns.append(entry)
+        return columns
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build columns from (id, start, stop, project_id, duration) rows, None for missing values."""
+        columns = cls()
+        table = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        columns.id = array('q', table[:, 0].astype(np.int64).tobytes())
+        for index, name in enumerate(('start', 'stop', 'project_id', 'duration'), start=1):
+            setattr(columns, name, array('d', table[:, index].tobytes()))
+        columns.deleted = array('b', bytes(len(table)))
+        return columns
+
+    def append(self, entry):
+        entry_id = entry.get('id')
+        if entry_id is None:
+            return
+        project_id = entry.get('project_id')
+        duration = entry.get('duration')
+        self.id.append(int(entry_id))
+        self.start.append(_timestamp(entry.get('start')))
+        self.stop.append(_timestamp(entry.get('stop')))
+        self.project_id.append(np.nan if project_id is None else float(project_id))
+        self.duration.append(np.nan if duration is None else float(duration))
+        self.deleted.append(1 if entry.get('server_deleted_at') else 0)
+
+    def latest(self):
+        """
+        Return the columns with only the last occurrence of each id (the
+        newest version when a batch repeats an entry), or self when no id
+        repeats.
+        """
+        last = {entry_id: index for index, entry_id in enumerate(self.id)}
+        if len(last) == len(self.id):
+            return self
+        keep = sorted(last.values())
+        columns = type(self)()
+        for name in self.FIELDS:
+            values = getattr(self, name)
+            setattr(columns, name, array(values.typecode, [values[index] for index in keep]))
+        return columns
+
+    def __len__(self):
+        return len(self.id)
+
+    def __iter__(self):
+        """Yield each entry as a dict of the kept fields (for inspection and tests)."""
+        for row in zip(*(getattr(self, name) for name in self.FIELDS)):
+            entry = {name: (None if isinstance(value, float) and np.isnan(value) else value)
+                     for name, value in zip(self.FIELDS, row)}
+            if entry['project_id'] is not None:
+                entry['project_id'] = int(entry['project_id'])
+            entry['deleted'] = bool(entry['deleted'])
+            yield entry
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the columns as a DataFrame, built from the arrays' buffers."""
+        return pd.DataFrame({
+            name: np.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+            for name in self.FIELDS
+        })
+
+
+def read_entry_columns(chunks):
+    """Stream a JSON array of time entries from `chunks` straight into EntryColumns."""
+    return EntryColumns.from_entries(iter_json_array(chunks))
@@ -0,0 +1,218 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide metrics in the Prometheus text format, plus an optional trace
+# log with the stage timings of each Dash callback.
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+trace_logger = logging.getLogger("focusledger.trace")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, optionally split by label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts["buckets"][i] += 1
+            counts["sum"] += value
+            counts["count"] += 1
+
+    def count(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            return counts["count"] if counts else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, {"buckets": list(c["buckets"]), "sum": c["sum"], "count": c["count"]})
+                           for key, c in self._values.items())
+        for key, counts in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, value in zip(self.buckets, counts["buckets"]):
+                yield self.name + "_bucket", {**labels, "le": _number(bound)}, value
+            yield self.name + "_bucket", {**labels, "le": "+Inf"}, counts["count"]
+            yield self.name + "_sum", labels, counts["sum"]
+            yield self.name + "_count", labels, counts["count"]
+
+
+class Registry:
+    """
+    Metrics of one process. Counters and histograms are updated as work
+    happens; collectors are called at scrape time and return
+    (name, kind, help, [(labels, value), ...]) tuples for state kept elsewhere
+    (e.g. cache counters).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """Register `collect()` to be called on every scrape."""
+        with self._lock:
+            self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_label_text(labels)} {_number(value)}" for name, labels, value in metric.samples())
+        for collect in collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_label_text(labels)} {_number(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "focusledger_stage_seconds", "Time spent in each stage of a refresh", ["stage"])
+STAGE_ERRORS = REGISTRY.counter(
+    "focusledger_stage_errors_total", "Stages that ended with an exception", ["stage", "error"])
+ENTRIES_FETCHED = REGISTRY.counter(
+    "focusledger_entries_fetched_total", "Time entries received from Toggl")
+PROJECTS_FETCHED = REGISTRY.counter(
+    "focusledger_projects_fetched_total", "Projects received from Toggl")
+FIGURE_ESTIMATED_BYTES = REGISTRY.histogram(
+    "focusledger_figure_estimated_bytes", "Estimated serialized size of built figures", buckets=BYTES_BUCKETS)
+
+_trace = contextvars.ContextVar("focusledger_trace", default=None)
+_trace_enabled = False
+
+
+def enable_trace(enabled=True):
+    """Log the stage timings of every traced callback to the 'focusledger.trace' logger."""
+    global _trace_enabled
+    _trace_enabled = enabled
+    if enabled and trace_logger.level == logging.NOTSET:
+        trace_logger.setLevel(logging.INFO)
+    if enabled and not logging.getLogger().handlers and not trace_logger.handlers:
+        trace_logger.addHandler(logging.StreamHandler())
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as `stage`; exceptions are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        stages = _trace.get()
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+
+def traced(name):
+    """
+    Decorate a callback so that, with tracing enabled, one log line lists the
+    stages it ran (including those on worker threads started with a copy of
+    its context) and their durations.
+    """
+    def decorate(callback):
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            if not _trace_enabled:
+                return callback(*args, **kwargs)
+            stages = []
+            token = _trace.set(stages)
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                return callback(*args, **kwargs)
+            except Exception as e:
+                outcome = type(e).__name__
+                raise
+            finally:
+                _trace.reset(token)
+                timings = " ".join(f"{stage}={elapsed * 1000:.1f}ms" for stage, elapsed in stages)
+                trace_logger.info("callback=%s outcome=%s total=%.1fms %s", name, outcome,
+                                  (time.perf_counter() - started) * 1000, timings)
+        return wrapper
+    return decorate
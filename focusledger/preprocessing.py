@@ -0,0 +1,132 @@
+import time
+import numpy as np
+import pandas as pd
+from focusledger.aggregation import DailyView, split_by_day
+from focusledger.ingest import EntryColumns
+
+# Normalize raw Toggl entries into one typed frame shared by every graph.
+
+UNKNOWN_PROJECT = 'Unknown Project'
+FRAME_COLUMNS = ['project', 'start', 'stop', 'date', 'seconds']
+
+
+def project_lookups(projects):
+    """
+    Build the project id -> name and project name -> color maps.
+    Args:
+        projects (list): List of project dicts from Toggl API.
+    Returns:
+        tuple: (project_map, color_map)
+    """
+    project_map = {}
+    color_map = {}
+    for proj in projects or []:
+        name = proj.get('name', str(proj.get('id')))
+        project_map[proj.get('id')] = name
+        # Toggl color is a hex string in 'color' field, e.g. '#ff0000'
+        if proj.get('color'):
+            color_map[name] = proj['color']
+    return project_map, color_map
+
+
+def project_label(project_map):
+    """
+    Return a function naming a project id the same way prepare_entries_frame
+    does: its Toggl name, the id itself when unknown, or 'Unknown Project'.
+    """
+    def label(project_id):
+        if project_id is None:
+            return UNKNOWN_PROJECT
+        if project_id in project_map:
+            return project_map[project_id] or UNKNOWN_PROJECT
+        return str(project_id)
+    return label
+
+
+def _project_names(df, project_map):
+    if 'project_id' in df.columns:
+        ids = df['project_id']
+        names = ids.map(project_map)
+        unmapped = names.isna() & ids.notna()
+        if unmapped.any():
+            try:
+                fallback = ids[unmapped].astype('Int64').astype(str)
+            except (TypeError, ValueError):
+                fallback = ids[unmapped].astype(str)
+            names = names.where(~unmapped, fallback)
+        return names.where(names != '', None).fillna(UNKNOWN_PROJECT)
+    if 'project' in df.columns:
+        return df['project'].where(df['project'] != '', None).fillna(UNKNOWN_PROJECT)
+    return pd.Series(UNKNOWN_PROJECT, index=df.index)
+
+
+def _unix_seconds(values):
+    # ISO strings (or anything to_datetime accepts) -> unix seconds, NaN when unparseable
+    parsed = pd.to_datetime(values, errors='coerce', utc=True)
+    return ((parsed - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+
+def prepare_entries_frame(entries, projects=None, timezone='UTC', now=None) -> pd.DataFrame:
+    """
+    Turn raw time entries into the normalized frame the graph builders consume.
+    Args:
+        entries (list | EntryColumns): List of time entry dicts, each with 'start',
+            'stop' and 'project_id' or 'project', or columns from the streaming ingest.
+        projects (list): List of project dicts from Toggl API.
+        timezone (str): IANA timezone whose midnights split entries into days.
+        now (float): Unix time a running entry (no 'stop') counts up to;
+            defaults to the current time.
+    Returns:
+        pd.DataFrame: One row per entry and local day it covers, for entries with
+        a valid start and a valid (or missing, when running) stop. Columns are
+        'project' (categorical, in order of first appearance), 'start' and 'stop'
+        (datetime64, UTC, clipped to the day), 'date' (datetime64, the local day)
+        and 'seconds' (float32 duration within that day). The name -> color map
+        for the projects is stored in frame.attrs['color_map'].
+    """
+    project_map, color_map = project_lookups(projects)
+    if isinstance(entries, EntryColumns):
+        # Columnar input already holds unix seconds; no string parsing needed
+        raw = entries.to_frame()
+        starts = raw['start'].to_numpy()
+        stops = raw['stop'].to_numpy().copy()
+        running = np.isnan(stops)
+    else:
+        raw = pd.DataFrame(entries)
+        missing = pd.Series(None, index=raw.index, dtype=object)
+        starts = _unix_seconds(raw['start'] if 'start' in raw.columns else missing)
+        stop_values = raw['stop'] if 'stop' in raw.columns else missing
+        stops = _unix_seconds(stop_values)
+        # A missing stop means the timer is still running; an unparseable one is dropped
+        running = stop_values.isna().to_numpy()
+    stops[running] = time.time() if now is None else now
+    valid = ~np.isnan(starts) & ~np.isnan(stops)
+    names = _project_names(raw, project_map).to_numpy()[valid]
+    index, days, piece_starts, piece_stops = split_by_day(starts[valid], stops[valid], timezone)
+    names = names[index]
+    frame = pd.DataFrame({
+        'project': pd.Categorical(names, categories=pd.unique(names)),
+        'start': pd.to_datetime(piece_starts, unit='s', utc=True),
+        'stop': pd.to_datetime(piece_stops, unit='s', utc=True),
+        'date': days.astype('datetime64[D]').astype('datetime64[ns]'),
+        'seconds': (piece_stops - piece_starts).astype('float32'),
+    }, columns=FRAME_COLUMNS)
+    frame.attrs['color_map'] = color_map
+    return frame
+
+
+def prepare_daily_view(totals, days, projects=None, resolution='day') -> DailyView:
+    """
+    Take the last `days` days of incrementally maintained totals as the view
+    the graph builders consume, with project names and colors from `projects`.
+    Args:
+        totals (DailyTotals): Per-project daily totals, keyed by project id.
+        days (int): Size of the history window in days.
+        projects (list): List of project dicts from Toggl API.
+        resolution (str): 'day', 'week' or 'month' periods.
+    Returns:
+        DailyView: Projects in order of their first day, then by name; entries of projects
+        that share a name are added together.
+    """
+    project_map, color_map = project_lookups(projects)
+    return totals.view(days, label=project_label(project_map), color_map=color_map, resolution=resolution)
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from focusledger.toggl_api import RateLimitError, fetch_time_entry_columns
+
+# Background sync: keeps each watched account's store and project list up to
+# date on a schedule, so dashboard callbacks only read precomputed totals.
+
+
+class SyncScheduler:
+    """
+    Thread that re-syncs watched API tokens every `interval` seconds.
+
+    Each sync runs EntryStore.sync for the widest window requested for the
+    token (folding changed entries into its daily totals) and revalidates the
+    token's projects in `project_cache`. A failed sync is retried after
+    full-jitter exponential backoff: up to interval * 2**failures seconds,
+    capped at `backoff_max`. Tokens nobody has asked for in `forget_after`
+    seconds are no longer synced, nor are tokens whose tenant the registry
+    dropped; the next request for one watches it again.
+    """
+
+    def __init__(self, tenants, project_cache, interval=300, backoff_max=3600, forget_after=86400,
+                 fetch=fetch_time_entry_columns, clock=time.monotonic):
+        self.tenants = tenants
+        self.project_cache = project_cache
+        self.interval = interval
+        self.backoff_max = backoff_max
+        self.forget_after = forget_after
+        self._fetch = fetch
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._watched = {}
+        self.syncs = 0
+        self.failures = 0
+
+    def watch(self, api_token, days):
+        """
+        Keep the last `days` days of `api_token` synced. A token seen for the
+        first time, or a wider window, is synced on the next pass.
+        """
+        now = self._clock()
+        with self._lock:
+            state = self._watched.get(api_token)
+            if state is None:
+                state = self._watched[api_token] = {
+                    "days": days, "next_run": now, "failures": 0,
+                    "last_sync": None, "last_error": None, "rate_limited": False,
+                }
+                self._wake.set()
+            elif days > state["days"]:
+                state["days"] = days
+                state["next_run"] = now
+                self._wake.set()
+            state["seen"] = now
+
+    def nudge(self, api_token):
+        """Sync `api_token` on the next pass without waiting for its schedule."""
+        with self._lock:
+            state = self._watched.get(api_token)
+            if state is not None and not state["failures"]:
+                state["next_run"] = self._clock()
+                self._wake.set()
+
+    def status(self, api_token):
+        """Return a copy of the sync state of `api_token`, or None when not watched."""
+        with self._lock:
+            state = self._watched.get(api_token)
+            return dict(state) if state is not None else None
+
+    def sync_once(self, api_token):
+        """Sync `api_token` now and reschedule it; returns True on success."""
+        with self._lock:
+            state = self._watched.get(api_token)
+            if state is None:
+                return False
+            days = state["days"]
+        # Recreating an evicted tenant here would evict another in turn
+        tenant = self.tenants.peek(api_token)
+        if tenant is None:
+            with self._lock:
+                self._watched.pop(api_token, None)
+            return False
+        try:
+            tenant.store.sync(api_token, days, fetch=self._fetch, load=False)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                state["failures"] += 1
+                state["last_error"] = str(e)
+                state["rate_limited"] = isinstance(e, RateLimitError)
+                backoff = min(self.backoff_max, self.interval * 2 ** state["failures"])
+                state["next_run"] = self._clock() + random.uniform(self.interval, max(self.interval, backoff))
+            return False
+        try:
+            self.project_cache.refresh(api_token)
+        except Exception:
+            # Entries are synced; the cached projects are served until the next pass
+            pass
+        with self._lock:
+            self.syncs += 1
+            state.update(failures=0, last_error=None, rate_limited=False, last_sync=time.time(),
+                         next_run=self._clock() + self.interval)
+        return True
+
+    def run_pending(self):
+        """
+        Sync every watched token that is due and forget idle ones.
+        Returns the seconds until the next token is due.
+        """
+        now = self._clock()
+        with self._lock:
+            for token in [t for t, s in self._watched.items() if now - s["seen"] > self.forget_after]:
+                del self._watched[token]
+            due = [t for t, s in self._watched.items() if s["next_run"] <= now]
+        for token in due:
+            if self._stopping.is_set():
+                break
+            self.sync_once(token)
+        with self._lock:
+            next_runs = [s["next_run"] for s in self._watched.values()]
+        return max(0.0, min(next_runs) - self._clock()) if next_runs else self.interval
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            wait = self.run_pending()
+            self._wake.wait(wait)
+
+    def start(self):
+        """Start the background thread (once)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="focusledger-sync", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread after the sync in progress."""
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
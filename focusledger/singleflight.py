@@ -0,0 +1,56 @@
+import threading
+
+# Request coalescing: concurrent calls for the same key share one execution.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time. Callers that arrive while a call
+    for their key is in flight wait for it and get its result (or its
+    exception) instead of running their own. Nothing is cached afterwards:
+    the next call for the key runs again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.runs = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the call already running for `key`."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.runs += 1
+                leader = True
+        return self._run(key, call, fn) if leader else self._wait(call)
+
+    def _wait(self, call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
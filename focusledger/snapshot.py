@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from array import array
+from focusledger.ingest import EntryColumns
+from focusledger.metrics import timed
+from focusledger.store import EntryStore
+
+# Columnar snapshots of an entry store: the normalized time entries and their
+# per-project daily totals as Parquet or Arrow IPC files. A fresh process can
+# restore a store from them instead of backfilling the history from Toggl,
+# and the same files can be read by pandas, DuckDB or Polars for offline
+# analysis. pyarrow is optional and only imported when snapshots are used.
+
+FORMATS = ("parquet", "arrow")
+SNAPSHOT_VERSION = 1
+METADATA_KEY = b"focusledger.snapshot"
+
+
+def require_pyarrow():
+    """Return the pyarrow module, or raise ImportError explaining that snapshots need it."""
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Snapshots need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _paths(directory, format):
+    extension = "parquet" if format == "parquet" else "arrow"
+    return {name: os.path.join(directory, f"{name}.{extension}") for name in ("entries", "daily")}
+
+
+def _detect_format(directory):
+    for format in FORMATS:
+        if os.path.exists(_paths(directory, format)["entries"]):
+            return format
+    raise FileNotFoundError(f"No snapshot in {directory}")
+
+
+def _nullable(values, pa, type):
+    # NaN marks a missing value in EntryColumns; Arrow has real nulls
+    values = np.frombuffer(values, dtype=np.float64)
+    missing = np.isnan(values)
+    return pa.array(np.where(missing, 0, values).astype(np.int64), type=type, mask=missing)
+
+
+def _entries_table(entries, pa):
+    timestamp = pa.timestamp("s", tz="UTC")
+    return pa.table({
+        "id": pa.array(np.frombuffer(entries.id, dtype=np.int64)),
+        "start": _nullable(entries.start, pa, pa.int64()).cast(timestamp),
+        "stop": _nullable(entries.stop, pa, pa.int64()).cast(timestamp),
+        "project_id": _nullable(entries.project_id, pa, pa.int64()),
+        "duration": _nullable(entries.duration, pa, pa.int64()),
+    })
+
+
+def _daily_table(totals, now, pa):
+    # Long format, one row per project and day with time on it
+    view = totals.view(now=now)
+    rows, columns = np.nonzero(view.seconds)
+    keys = [view.labels[row] for row in rows]
+    return pa.table({
+        "project_id": pa.array(keys, type=pa.int64()),
+        "day": pa.array(view.days.to_numpy().astype("datetime64[D]")[columns], type=pa.date32()),
+        "seconds": pa.array(view.seconds[rows, columns]),
+    })
+
+
+def _write(table, path, format, pa):
+    # Write next to the target and rename, so readers never see a partial file
+    partial = path + ".partial"
+    if format == "parquet":
+        pa.parquet.write_table(table, partial)
+    else:
+        with pa.OSFile(partial, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, path)
+
+
+def export_snapshot(store, directory, format="parquet", now=None):
+    """
+    Write the entries and daily totals of `store` (an EntryStore) to
+    `directory` as entries.<ext> and daily.<ext>, in Parquet ('parquet') or
+    uncompressed Arrow IPC ('arrow', memory-mapped without decoding on read).
+    Running entries count towards the daily totals up to `now`. The store's
+    sync state and timezone are kept in the files' schema metadata.
+    Returns a dict of the paths written.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}, not {format!r}")
+    pa = require_pyarrow()
+    now = time.time() if now is None else now
+    metadata = {METADATA_KEY: json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "coverage": store.coverage,
+        "watermark": store.watermark,
+        "timezone": store.totals.timezone,
+        "exported_at": now,
+    })}
+    os.makedirs(directory, exist_ok=True)
+    paths = _paths(directory, format)
+    with timed("snapshot_export"):
+        tables = {"entries": _entries_table(store.load(), pa), "daily": _daily_table(store.totals, now, pa)}
+        for name, table in tables.items():
+            _write(table.replace_schema_metadata(metadata), paths[name], format, pa)
+    return paths
+
+
+def _read_table(path, format, pa):
+    if format == "parquet":
+        return pa.parquet.read_table(path, memory_map=True)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _float_column(table, name, pa):
+    # Parquet keeps timestamps in milliseconds; nulls come back as NaN, the
+    # EntryColumns marker for a missing value
+    column = table.column(name)
+    if pa.types.is_timestamp(column.type):
+        column = column.cast(pa.timestamp("s", tz="UTC"))
+    return array("d", column.cast(pa.int64()).cast(pa.float64()).to_numpy().tobytes())
+
+
+def read_snapshot(directory):
+    """
+    Read the entries of the snapshot in `directory` (either format).
+    Returns (EntryColumns, metadata dict with coverage, watermark, timezone
+    and exported_at).
+    """
+    pa = require_pyarrow()
+    format = _detect_format(directory)
+    table = _read_table(_paths(directory, format)["entries"], format, pa)
+    metadata = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+    if metadata.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {metadata.get('version')!r} in {directory}")
+    entries = EntryColumns()
+    entries.id = array("q", table.column("id").to_numpy().astype(np.int64).tobytes())
+    for name in ("start", "stop", "project_id", "duration"):
+        setattr(entries, name, _float_column(table, name, pa))
+    entries.deleted = array("b", bytes(len(entries.id)))
+    return entries, metadata
+
+
+def read_daily(directory):
+    """Return the daily totals of the snapshot in `directory` as a DataFrame (project_id, day, seconds)."""
+    pa = require_pyarrow()
+    format = _detect_format(directory)
+    return _read_table(_paths(directory, format)["daily"], format, pa).to_pandas()
+
+
+def _daily_rollup(directory, exported_at):
+    # The daily totals as DailyTotals.restore takes them: project keys (None
+    # for no project), days since 1970-01-01 and seconds. The two files are
+    # replaced one after the other, so a reader can catch a daily file from
+    # another export than the entries; None then (exported_at differs)
+    pa = require_pyarrow()
+    format = _detect_format(directory)
+    table = _read_table(_paths(directory, format)["daily"], format, pa)
+    metadata = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+    if metadata.get("exported_at") != exported_at:
+        return None
+    days = table.column("day").cast(pa.int32()).to_numpy().astype(np.int64)
+    seconds = table.column("seconds").to_numpy()
+    return table.column("project_id").to_pylist(), days, seconds, exported_at
+
+
+def import_snapshot(store, directory):
+    """
+    Restore an empty `store` from the snapshot in `directory`: its entries,
+    daily totals and sync state, so the next sync only fetches changes made
+    since the snapshot. The totals are seeded from the daily file when it was
+    written in the store's timezone by the same export as the entries, and
+    recomputed from the entries otherwise; the entries reach the store's
+    SQLite file in the background (see EntryStore.restore). Returns the number of entries restored.
+    """
+    with timed("snapshot_import"):
+        entries, metadata = read_snapshot(directory)
+        daily = None
+        if metadata.get("timezone") == store.totals.timezone and metadata.get("exported_at") is not None:
+            daily = _daily_rollup(directory, metadata["exported_at"])
+        store.restore(entries, metadata.get("coverage"), metadata.get("watermark"), daily)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import columnar snapshots of a FocusLedger entry store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a store file's entries and daily totals to a snapshot")
+    export.add_argument("store", help="SQLite store file (FOCUSLEDGER_STORE)")
+    export.add_argument("directory")
+    export.add_argument("--format", choices=FORMATS, default="parquet")
+    export.add_argument("--timezone", default=os.getenv("FOCUSLEDGER_TIMEZONE", "UTC"))
+    restore = commands.add_parser("import", help="restore a snapshot into a new store file")
+    restore.add_argument("directory")
+    restore.add_argument("store")
+    restore.add_argument("--timezone", default=os.getenv("FOCUSLEDGER_TIMEZONE", "UTC"))
+    args = parser.parse_args(argv)
+
+    if args.command == "export" and not os.path.exists(args.store):
+        parser.error(f"{args.store} does not exist")
+    store = EntryStore(args.store, timezone=args.timezone)
+    try:
+        if args.command == "export":
+            paths = export_snapshot(store, args.directory, args.format)
+            print(f"Wrote {len(store.totals)} entries to {', '.join(paths.values())}")
+        else:
+            print(f"Restored {import_snapshot(store, args.directory)} entries into {args.store}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
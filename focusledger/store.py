@@ -0,0 +1,307 @@
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+from focusledger.aggregation import DailyTotals
+from focusledger.fetching import iter_time_entry_chunks
+from focusledger.ingest import EntryColumns
+from focusledger.metrics import timed
+from focusledger.singleflight import SingleFlight
+from focusledger.toggl_api import fetch_time_entry_columns
+
+logger = logging.getLogger(__name__)
+
+# Local persistent store of Toggl time entries with incremental sync
+
+# Re-fetch a few minutes before the last sync to absorb clock skew with Toggl
+SYNC_OVERLAP_SECONDS = 300
+
+# Bump when the entries table changes; older stores are dropped and resynced
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    start_ts INTEGER NOT NULL,
+    stop_ts INTEGER,
+    project_id INTEGER,
+    duration INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_start_ts ON entries (start_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _optional_int(value):
+    return None if np.isnan(value) else int(value)
+
+
+def _optional_ints(values):
+    # A float column (NaN when missing) as Python ints and Nones, as SQLite binds them
+    values = np.frombuffer(values)
+    missing = np.isnan(values)
+    ints = np.where(missing, 0, values).astype(np.int64).astype(object)
+    ints[missing] = None
+    return ints.tolist()
+
+
+class EntryStore:
+    """
+    SQLite-backed store of time entries keyed by Toggl entry id.
+
+    The store remembers how far back it holds complete data (coverage) and when
+    it last synced (watermark), so each sync only asks Toggl for entries
+    modified since the previous one. Full-window fetches are split into
+    `chunk_days`-day chunks (longer ones for long windows, so there are at
+    most `max_chunks`) fetched `chunk_workers` at a time and merged as they
+    arrive. Use ':memory:' for a process-local store.
+
+    `totals` holds per-project daily totals of the stored entries, split at
+    midnight in `timezone` and kept up to date by every merge, so graphs never
+    need to re-aggregate the history.
+
+    Several processes (e.g. WSGI workers) may open the same file. Each keeps
+    the coverage and watermark it read at open time and advances them by its
+    own syncs, so entries another process wrote after that are fetched again
+    and reach this process's totals too. refresh() instead catches up with
+    what the other processes synced without asking Toggl.
+    """
+
+    def __init__(self, path=':memory:', chunk_days=7, chunk_workers=4, timezone='UTC', max_chunks=None):
+        self.path = path
+        self.chunk_days = chunk_days
+        self.chunk_workers = chunk_workers
+        self.max_chunks = max_chunks
+        self._lock = threading.Lock()
+        self._syncs = SingleFlight()
+        self._restoring = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if path != ':memory:':
+            # Readers in other processes do not block on a writer
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # The store is only a cache of Toggl: drop stale layouts and sync from scratch
+            self._conn.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS meta;")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.executescript(_SCHEMA)
+        self.totals = DailyTotals(timezone)
+        with self._conn:
+            # Read before the rows, so a commit in between is caught by the next refresh()
+            self._data_version = self._data_version_now()
+            rows = self._conn.execute("SELECT id, start_ts, stop_ts, project_id, duration FROM entries").fetchall()
+            self._sync_state = {key: self._meta(key) for key in ('coverage', 'watermark')}
+        if rows:
+            self.totals.apply(EntryColumns.from_rows(rows))
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _data_version_now(self):
+        # Changes whenever another connection commits to the file
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _set_meta(self, key, value):
+        self._sync_state[key] = value
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    @property
+    def watermark(self):
+        """Unix time of the last successful sync, or None."""
+        # Read without the store lock, which a restore holds while it writes its rows
+        return self._sync_state['watermark']
+
+    @property
+    def coverage(self):
+        """Unix time from which the store holds every entry, or None."""
+        return self._sync_state['coverage']
+
+    def covers(self, days, now=None):
+        """True when the store holds every entry of the last `days` days, as of its last sync."""
+        coverage = self.coverage
+        now = time.time() if now is None else now
+        return coverage is not None and coverage <= now - days * 86400
+
+    def merge(self, entries):
+        """
+        Upsert changed entries and drop the ones Toggl reports as deleted.
+        Accepts EntryColumns or an iterable of entry dicts. Entries without an
+        id or a parseable start are ignored.
+        Returns the number of rows written or deleted.
+        """
+        if not isinstance(entries, EntryColumns):
+            entries = EntryColumns.from_entries(entries)
+        entries = entries.latest()
+        self._wait_for_restore()
+        upserts = []
+        deletes = []
+        for entry_id, start, stop, project_id, duration, deleted in zip(
+            entries.id, entries.start, entries.stop, entries.project_id, entries.duration, entries.deleted
+        ):
+            if deleted:
+                deletes.append((entry_id,))
+            elif not np.isnan(start):
+                upserts.append((entry_id, int(start), _optional_int(stop), _optional_int(project_id), _optional_int(duration)))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO entries (id, start_ts, stop_ts, project_id, duration) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET start_ts = excluded.start_ts, stop_ts = excluded.stop_ts, "
+                "project_id = excluded.project_id, duration = excluded.duration",
+                upserts,
+            )
+            self._conn.executemany("DELETE FROM entries WHERE id = ?", deletes)
+            self.totals.apply(entries)
+        return len(upserts) + len(deletes)
+
+    def load(self, days=None):
+        """
+        Return stored entries that started within the last `days` days (all
+        of them when None) as EntryColumns, oldest first.
+        """
+        since = int(time.time()) - days * 86400 if days is not None else -2 ** 63
+        self._wait_for_restore()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, start_ts, stop_ts, project_id, duration FROM entries "
+                "WHERE start_ts >= ? ORDER BY start_ts, id", (since,)
+            ).fetchall()
+        return EntryColumns.from_rows(rows)
+
+    def refresh(self):
+        """
+        Catch up with syncs other processes made to the same file: when
+        another connection has written to it since this one last read it,
+        re-read every stored entry into new totals and take over the file's
+        coverage and watermark. Returns True if the store was re-read.
+        """
+        if self.path == ':memory:':
+            return False
+        self._wait_for_restore()
+        with self._lock:
+            version = self._data_version_now()
+            if version == self._data_version:
+                return False
+            # The sync state before the rows: a sync committing in between
+            # then only adds rows, never claims ones that were not read
+            state = {key: self._meta(key) for key in ('coverage', 'watermark')}
+            rows = self._conn.execute("SELECT id, start_ts, stop_ts, project_id, duration FROM entries").fetchall()
+            totals = DailyTotals(self.totals.timezone)
+            if rows:
+                totals.apply(EntryColumns.from_rows(rows))
+            self.totals = totals
+            self._sync_state.update(state)
+            self._data_version = version
+        return True
+
+    def restore(self, entries, coverage, watermark, daily=None):
+        """
+        Fill an empty store with `entries` (EntryColumns) and the sync state
+        they were saved with, e.g. from a snapshot; the next sync then only
+        fetches what changed since `watermark`. With `daily`, a (keys, days,
+        seconds, now) rollup of the entries in the store's timezone (see
+        DailyTotals.restore), the totals are seeded from it instead of
+        splitting every entry.
+        Returns once the totals can be viewed. The rows are written to SQLite,
+        and the entries split into pieces, on a background thread; merges,
+        loads and close wait for it. Raises ValueError if the store already
+        holds entries or has synced, since older copies would overwrite newer
+        edits.
+        """
+        self._wait_for_restore()
+        with self._lock:
+            if self._sync_state['watermark'] is not None or self._conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+                raise ValueError("Snapshots can only be restored into an empty store")
+            if daily is None:
+                self.totals.apply(entries)
+            else:
+                keys, days, seconds, now = daily
+                self.totals.restore(keys, days, seconds, entries, now)
+            state = {key: int(value) for key, value in (('coverage', coverage), ('watermark', watermark))
+                     if value is not None}
+            self._sync_state.update(state)
+            # Starts waiting on the lock; merges and loads join it before taking the lock themselves
+            self._restoring = threading.Thread(target=self._write_restored, args=(entries, state),
+                                               name="focusledger-restore", daemon=True)
+            self._restoring.start()
+
+    def _write_restored(self, entries, state):
+        # Nothing to upsert into: one plain bulk insert of all rows, committed
+        # together with the sync state so a failed write leaves an empty store
+        rows = zip(
+            np.frombuffer(entries.id, dtype=np.int64).tolist(),
+            np.frombuffer(entries.start).astype(np.int64).tolist(),
+            *(_optional_ints(column) for column in (entries.stop, entries.project_id, entries.duration)),
+        )
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO entries (id, start_ts, stop_ts, project_id, duration) VALUES (?, ?, ?, ?, ?)", rows)
+                for key, value in state.items():
+                    self._set_meta(key, value)
+            self.totals.materialize()
+        except Exception:
+            logger.exception("Writing restored entries to %s failed", self.path)
+
+    def _wait_for_restore(self):
+        thread = self._restoring
+        if thread is not None:
+            thread.join()
+
+    def sync(self, api_token, days, fetch=fetch_time_entry_columns, load=True):
+        """
+        Bring the store up to date for the last `days` days and return those
+        entries, or None when `load` is False (callers reading `totals` instead).
+        The first sync backfills the whole window in parallel chunks, and one
+        asking for more history than the store covers backfills only the days
+        before its coverage; every later sync fetches the entries modified
+        since the previous one. Raises whatever `fetch` raises
+        (e.g. RateLimitError), leaving the sync state untouched; chunks that
+        arrived before a PartialDataError are kept.
+        Concurrent syncs of the same token and window share one run and its result.
+        """
+        return self._syncs.do((api_token, days, fetch, load), lambda: self._sync(api_token, days, fetch, load))
+
+    def _sync(self, api_token, days, fetch, load):
+        with timed("sync"):
+            return self._sync_window(api_token, days, fetch, load)
+
+    def _sync_window(self, api_token, days, fetch, load):
+        started = int(time.time())
+        window_start = started - days * 86400
+        coverage = self.coverage
+        watermark = self.watermark
+        if coverage is None or watermark is None or window_start < coverage:
+            # A wider window only lacks the days before the current coverage;
+            # the incremental pass below brings the rest up to date
+            end = started if coverage is None or watermark is None else coverage
+            chunks = iter_time_entry_chunks(
+                api_token, (end - window_start) / 86400, chunk_days=self.chunk_days,
+                max_workers=self.chunk_workers, fetch=fetch, now=end, max_chunks=self.max_chunks,
+            )
+            for _, entries in chunks:
+                self.merge(entries)
+            if watermark is not None:
+                # Date-range fetches never return deleted entries; only the
+                # incremental feed reports what was deleted since the last sync
+                self.merge(fetch(api_token, since=watermark - SYNC_OVERLAP_SECONDS))
+            coverage = window_start if coverage is None else min(coverage, window_start)
+        else:
+            self.merge(fetch(api_token, since=max(watermark - SYNC_OVERLAP_SECONDS, window_start)))
+        self._wait_for_restore()
+        with self._lock, self._conn:
+            self._set_meta('coverage', coverage)
+            self._set_meta('watermark', started)
+        return self.load(days) if load else None
+
+    def close(self):
+        self._wait_for_restore()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from focusledger.datasets import DatasetRegistry
+from focusledger.figure_cache import FigureCache
+from focusledger.singleflight import SingleFlight
+from focusledger.snapshot import import_snapshot
+from focusledger.store import EntryStore
+
+logger = logging.getLogger(__name__)
+
+# Per-tenant state for serving several Toggl accounts from one process.
+# A tenant is identified by its API token; each gets its own entry store,
+# dataset registry and figure cache.
+
+
+def tenant_id(api_token):
+    """Return a stable, non-reversible id for `api_token`, safe for file names and logs."""
+    return hashlib.sha256(api_token.encode()).hexdigest()[:16]
+
+
+class Tenant:
+    """The entry store and caches of one Toggl account."""
+
+    def __init__(self, api_token, store, datasets, figure_cache):
+        self.id = tenant_id(api_token)
+        self.store = store
+        self.datasets = datasets
+        self.figure_cache = figure_cache
+
+    def close(self):
+        self.store.close()
+
+
+class TenantRegistry:
+    """
+    Thread-safe LRU registry of tenants keyed by API token.
+
+    Tenants are created on first use: an EntryStore at `store_path` with
+    '{tenant}' replaced by the tenant id (':memory:' keeps it in memory), plus
+    a DatasetRegistry and FigureCache bounded by `max_datasets`,
+    `figure_cache_entries` and `figure_cache_bytes`. At most `max_tenants`
+    tenants are kept; the least recently used one is dropped to make room
+    (requests still using it finish first) and rebuilt from its store file, or
+    by a full sync, when it comes back.
+
+    With `snapshot_path` set ('{tenant}' replaced as above), a tenant whose
+    store is empty is first restored from the snapshot there, if one exists,
+    so only changes made since the snapshot are fetched from Toggl.
+
+    With `validate` set, validate(api_token) runs before a token without a
+    store file gets a tenant; whatever it raises is raised by get, and no
+    tenant (or store file) is created. Tenants are built outside the
+    registry lock, once per token, so opening or restoring one store never
+    holds up lookups of the others.
+    """
+
+    def __init__(self, max_tenants=32, store_path=':memory:', chunk_days=7, chunk_workers=4, timezone='UTC',
+                 max_datasets=8, figure_cache_entries=128, figure_cache_bytes=64 * 1024 * 1024, snapshot_path=None,
+                 max_chunks=None, validate=None):
+        self.max_tenants = max_tenants
+        self.store_path = store_path
+        self.chunk_days = chunk_days
+        self.chunk_workers = chunk_workers
+        self.max_chunks = max_chunks
+        self.timezone = timezone
+        self.max_datasets = max_datasets
+        self.figure_cache_entries = figure_cache_entries
+        self.figure_cache_bytes = figure_cache_bytes
+        self.snapshot_path = snapshot_path
+        self.validate = validate
+        self._lock = threading.Lock()
+        self._tenants = OrderedDict()
+        self._creating = SingleFlight()
+        self.evictions = 0
+
+    def _store_path(self, api_token):
+        if self.store_path == ':memory:':
+            return self.store_path
+        return self.store_path.replace('{tenant}', tenant_id(api_token))
+
+    def _restore(self, store, api_token):
+        path = self.snapshot_path.replace('{tenant}', tenant_id(api_token))
+        if store.watermark is not None or not os.path.isdir(path):
+            return
+        try:
+            import_snapshot(store, path)
+        except Exception:
+            # The snapshot is only a head start: sync from Toggl instead
+            logger.exception("Restoring the snapshot in %s failed", path)
+
+    def _create(self, api_token):
+        path = self._store_path(api_token)
+        if self.validate is not None and (path == ':memory:' or not os.path.exists(path)):
+            # A token that once had a store file was accepted then; skipping
+            # the check keeps its stored data servable while Toggl is down
+            self.validate(api_token)
+        store = EntryStore(path, chunk_days=self.chunk_days,
+                           chunk_workers=self.chunk_workers, timezone=self.timezone, max_chunks=self.max_chunks)
+        if self.snapshot_path:
+            self._restore(store, api_token)
+        return Tenant(
+            api_token,
+            store,
+            DatasetRegistry(max_datasets=self.max_datasets),
+            FigureCache(max_entries=self.figure_cache_entries, max_bytes=self.figure_cache_bytes),
+        )
+
+    def get(self, api_token):
+        """
+        Return the tenant for `api_token`, creating it on first use.
+        Raises whatever `validate` raises for a token it refuses.
+        """
+        tenant = self._lookup(api_token)
+        if tenant is None:
+            tenant = self._creating.do(api_token, lambda: self._add(api_token))
+        return tenant
+
+    def peek(self, api_token):
+        """Return the tenant for `api_token` if it is kept, or None, without creating it or marking it as used."""
+        with self._lock:
+            return self._tenants.get(api_token)
+
+    def _lookup(self, api_token):
+        with self._lock:
+            tenant = self._tenants.get(api_token)
+            if tenant is not None:
+                self._tenants.move_to_end(api_token)
+            return tenant
+
+    def _add(self, api_token):
+        # Another caller may have added this tenant between our miss and now
+        tenant = self._lookup(api_token)
+        if tenant is not None:
+            return tenant
+        tenant = self._create(api_token)
+        with self._lock:
+            self._tenants[api_token] = tenant
+            while len(self._tenants) > self.max_tenants:
+                # Not closed here: a request may still be syncing it; the
+                # connection closes once the last reference is gone
+                self._tenants.popitem(last=False)
+                self.evictions += 1
+            return tenant
+
+    def values(self):
+        """Return the tenants currently kept, least recently used first."""
+        with self._lock:
+            return list(self._tenants.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tenants)
+
+    def close(self):
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for tenant in tenants:
+            tenant.close()
@@ -0,0 +1,299 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date
+from focusledger.aggregation import DailyTotals, DailyView, daily_totals, last_days, lttb_indices, rolling_mean, rolling_sum, split_by_day
+from focusledger.graphing import prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph
+
+def _legacy_rolling_sums(entries, window):
+    # Reference: the per-project, per-date mask loop the engine replaced
+    df = pd.DataFrame(entries)
+    df['start'] = pd.to_datetime(df['start'])
+    df['stop'] = pd.to_datetime(df['stop'])
+    df['duration'] = (df['stop'] - df['start']).dt.total_seconds() / 3600.0
+    df['date'] = df['start'].dt.date
+    all_dates = pd.date_range(df['date'].min(), df['date'].max())
+    result = {}
+    for project in df['project'].unique():
+        proj_df = df[df['project'] == project]
+        sums = []
+        for day in all_dates:
+            window_start = (day - pd.Timedelta(days=window - 1)).date()
+            mask = (proj_df['date'] >= window_start) & (proj_df['date'] <= day.date())
+            sums.append(proj_df.loc[mask, 'duration'].sum())
+        result[project] = sums
+    return result
+
+def _random_entries(n=200, seed=1):
+    rng = np.random.default_rng(seed)
+    entries = []
+    for _ in range(n):
+        start = pd.Timestamp('2023-01-01T00:00:00+00:00') + pd.Timedelta(days=int(rng.integers(0, 30)), seconds=int(rng.integers(0, 60000)))
+        stop = start + pd.Timedelta(seconds=int(rng.integers(60, 14400)))
+        entries.append({"start": start.isoformat(), "stop": stop.isoformat(), "project": f"P{rng.integers(0, 5)}"})
+    return entries
+
+def test_daily_totals_pivots_by_project_and_day():
+    labels, days, matrix = daily_totals(
+        ['B', 'A', 'B'],
+        [date(2023, 1, 3), date(2023, 1, 1), date(2023, 1, 3)],
+        [1.0, 2.0, 3.0],
+    )
+    assert labels == ['B', 'A']
+    assert list(days.date) == [date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 3)]
+    assert matrix.tolist() == [[0.0, 0.0, 4.0], [2.0, 0.0, 0.0]]
+
+def test_rolling_sum_matches_pandas_rolling():
+    matrix = np.arange(20, dtype=float).reshape(2, 10)
+    expected = pd.DataFrame(matrix.T).rolling(3, min_periods=1).sum().to_numpy().T
+    assert np.allclose(rolling_sum(matrix, 3), expected)
+
+def test_rolling_sum_zero_window_is_empty():
+    assert not rolling_sum(np.ones((1, 4)), 0).any()
+
+def test_rolling_mean_matches_pandas_rolling():
+    matrix = np.arange(20, dtype=float).reshape(2, 10)
+    expected = pd.DataFrame(matrix.T).rolling(4, min_periods=1).mean().to_numpy().T
+    assert np.allclose(rolling_mean(matrix, 4), expected)
+
+def test_rolling_mean_rejects_empty_window():
+    with pytest.raises(ValueError):
+        rolling_mean(np.ones((1, 4)), 0)
+
+def test_last_days():
+    days = pd.date_range('2023-01-01', periods=4)
+    matrix = np.arange(8, dtype=float).reshape(2, 4)
+    days, matrix = last_days(days, matrix, 2)
+    assert list(days.date) == [date(2023, 1, 3), date(2023, 1, 4)]
+    assert matrix.tolist() == [[2.0, 3.0], [6.0, 7.0]]
+    assert last_days(days, matrix, 0)[1].shape == (2, 0)
+
+@pytest.mark.parametrize("window", [1, 3, 7])
+def test_graphs_match_legacy_loops(window):
+    entries = _random_entries()
+    legacy = _legacy_rolling_sums(entries, window)
+    fig_cum = prepare_cumulative_graph(entries, days_to_show=30, rolling_window=window)
+    fig_avg = prepare_rolling_average_graph(entries, days_to_show=30, rolling_window=window)
+    fig_sumavg = prepare_rolling_avg_of_sum_graph(entries, days_to_show=30, sum_window=window, avg_window=3)
+    for trace in fig_cum.data:
+        assert np.allclose(trace.y, legacy[trace.name])
+    for trace in fig_avg.data:
+        assert np.allclose(trace.y, np.array(legacy[trace.name]) / window)
+    for trace in fig_sumavg.data:
+        expected = pd.Series(legacy[trace.name]).rolling(window=3, min_periods=1).mean()
+        assert np.allclose(trace.y, expected)
+
+def _entry(entry_id, day, hours, project_id=1, **extra):
+    start = pd.Timestamp('2023-01-01T08:00:00+00:00') + pd.Timedelta(days=day)
+    stop = start + pd.Timedelta(hours=hours)
+    return {"id": entry_id, "start": start.isoformat(), "stop": stop.isoformat(), "project_id": project_id, **extra}
+
+def _view(totals, **kwargs):
+    return totals.view(label=lambda key: f"P{key}", **kwargs)
+
+def test_daily_view_rolling_sum_matches_matrix_rolling_sum():
+    matrix = np.arange(20, dtype=float).reshape(2, 10)
+    view = DailyView(['A', 'B'], pd.date_range('2023-01-01', periods=10), matrix)
+    for window in (0, 1, 3, 12):
+        assert np.allclose(view.rolling_sum(window), rolling_sum(matrix, window))
+
+def test_daily_totals_apply_matches_full_pivot():
+    rng = np.random.default_rng(3)
+    entries = [_entry(i, int(rng.integers(0, 60)), float(rng.integers(1, 8)), int(rng.integers(0, 4))) for i in range(300)]
+    totals = DailyTotals()
+    # Chunks arrive newest first during a backfill
+    for chunk in (entries[200:], entries[:100], entries[100:200]):
+        totals.apply(chunk)
+    view = _view(totals)
+    frame = pd.DataFrame(entries).sort_values(['start', 'project_id'])
+    labels, days, matrix = daily_totals(
+        frame['project_id'].map(lambda key: f"P{key}"),
+        pd.to_datetime(frame['start']).dt.tz_localize(None).dt.normalize(),
+        (pd.to_datetime(frame['stop']) - pd.to_datetime(frame['start'])).dt.total_seconds(),
+    )
+    assert view.labels == labels
+    assert view.days.equals(days)
+    assert np.array_equal(view.seconds, matrix)
+    assert np.allclose(view.rolling_sum(7), rolling_sum(matrix, 7))
+
+def test_daily_totals_edits_and_deletes_replace_contributions():
+    totals = DailyTotals()
+    totals.apply([_entry(1, 0, 2), _entry(2, 1, 3), _entry(3, 2, 1)])
+    version = totals.version
+    # Move entry 1 to day 2 and another project, delete entry 2
+    assert totals.apply([_entry(1, 2, 4, project_id=2), _entry(2, 1, 3, server_deleted_at="2023-01-05T00:00:00Z")])
+    assert totals.version == version + 1
+    view = _view(totals)
+    assert view.labels == ['P1', 'P2']
+    assert list(view.days.date) == [date(2023, 1, 3)]
+    assert view.seconds.tolist() == [[3600.0], [4 * 3600.0]]
+    assert len(totals) == 2
+    assert not totals.apply([])
+
+def test_daily_totals_repeated_id_in_one_batch_counts_once():
+    totals = DailyTotals()
+    # Overlapping fetch chunks can list the same entry twice; the last version wins
+    totals.apply([_entry(1, 0, 2), _entry(2, 0, 1), _entry(1, 0, 3)])
+    view = _view(totals)
+    assert view.seconds.tolist() == [[4 * 3600.0]]
+    assert len(totals) == 2
+    totals.apply([_entry(1, 0, 3), _entry(1, 0, 3, server_deleted_at="2023-01-05T00:00:00Z")])
+    assert _view(totals).seconds.tolist() == [[3600.0]]
+
+def test_daily_totals_running_entries_and_history_growth():
+    totals = DailyTotals()
+    totals.apply([_entry(1, 100, 1)])
+    # A backfill before the first day and a long stretch after it
+    totals.apply([_entry(2, 0, 2), _entry(3, 400, 3)])
+    assert len(_view(totals).days) == 401
+    # Entry 3 is restarted: it now runs from 08:00 and counts up to `now`
+    totals.apply([{"id": 3, "start": "2024-02-05T08:00:00+00:00", "stop": None, "project_id": 1}])
+    now = pd.Timestamp('2024-02-05T10:00:00+00:00').timestamp()
+    view = _view(totals, now=now)
+    assert len(view.days) == 401
+    assert view.prefix[0, -1] == 3 * 3600.0 + 2 * 3600.0
+    assert view.rolling_sum(1000)[0, -1] == 5 * 3600.0
+    assert view.seconds[0, -1] == 2 * 3600.0
+    assert len(totals) == 3
+
+def test_daily_totals_view_window_and_shared_names():
+    totals = DailyTotals()
+    totals.apply([_entry(1, 0, 1, project_id=1), _entry(2, 5, 2, project_id=2), _entry(3, 6, 3, project_id=3)])
+    now = pd.Timestamp('2023-01-08T12:00:00+00:00').timestamp()
+    view = totals.view(3, label=lambda key: 'Same' if key in (2, 3) else 'One', now=now)
+    assert view.labels == ['Same']
+    assert list(view.days.date) == [date(2023, 1, 6), date(2023, 1, 7)]
+    assert view.seconds.tolist() == [[7200.0, 10800.0]]
+    assert view.rolling_sum(2).tolist() == [[7200.0, 18000.0]]
+    assert totals.view(0, now=now).empty
+    assert DailyTotals().view(7).empty
+
+@pytest.mark.parametrize("resolution, freq", [("week", "W-SUN"), ("month", "MS")])
+def test_daily_view_rollup_matches_resample(resolution, freq):
+    days = pd.date_range('2023-01-04', periods=95)
+    matrix = np.random.default_rng(5).integers(0, 3600, (3, 95)).astype(float)
+    rolled = DailyView(['A', 'B', 'C'], days, matrix).rollup(resolution)
+    expected = pd.DataFrame(matrix.T, index=days).resample(freq).sum()
+    assert rolled.resolution == resolution
+    assert np.array_equal(rolled.seconds, expected.to_numpy().T)
+    starts = expected.index - pd.Timedelta(days=6) if resolution == "week" else expected.index
+    assert list(rolled.days) == list(starts)
+    assert np.allclose(rolled.rolling_sum(2), rolling_sum(rolled.seconds, 2))
+
+def test_daily_totals_month_view_spans_years():
+    totals = DailyTotals()
+    totals.apply([_entry(i, i * 30, 1) for i in range(40)])
+    view = totals.view(label=str, resolution='month')
+    assert len(view.days) == 39  # 2023-01 through 2026-03
+    assert view.days[0] == pd.Timestamp('2023-01-01')
+    assert view.seconds.sum() == 40 * 3600.0
+    assert totals.view(0, now=0, resolution='week').resolution == 'week'
+    with pytest.raises(ValueError):
+        view.rollup('week')
+
+def test_graphs_label_periods_by_resolution():
+    entries = _random_entries()
+    fig = prepare_cumulative_graph(entries, days_to_show=4, rolling_window=2, resolution='week')
+    assert fig.layout.title.text == "2-Week Running Total by Project"
+    assert len(fig.data[0].x) == 4
+    assert prepare_rolling_average_graph(entries, rolling_window=3, resolution='month').layout.yaxis.title.text == "Avg Hours/Month (3-month window)"
+    assert prepare_cumulative_graph(entries).layout.title.text == "7-Day Running Total by Project"
+
+def _reference_split(start, stop, timezone):
+    # One interval at a time, walking local midnights with pandas
+    start = pd.Timestamp(start, unit='s', tz='UTC').tz_convert(timezone)
+    stop = pd.Timestamp(max(stop, start.timestamp()), unit='s', tz='UTC').tz_convert(timezone)
+    pieces = []
+    day = start.normalize()
+    while True:
+        next_day = (day.tz_localize(None) + pd.Timedelta(days=1)).tz_localize(timezone)
+        pieces.append((day.date(), (min(stop, next_day) - max(start, day)).total_seconds()))
+        if stop <= next_day:
+            return pieces
+        day = next_day
+
+@pytest.mark.parametrize("timezone", ["UTC", "America/New_York", "Australia/Lord_Howe"])
+def test_split_by_day_matches_reference(timezone):
+    rng = np.random.default_rng(7)
+    starts = pd.Timestamp('2023-03-01', tz='UTC').timestamp() + rng.integers(0, 300 * 86400, 300)
+    stops = starts + rng.integers(-3600, 4 * 86400, 300)
+    index, days, piece_starts, piece_stops = split_by_day(starts, stops, timezone)
+    got = {}
+    for i, day, seconds in zip(index, days, piece_stops - piece_starts):
+        got.setdefault(int(i), []).append((pd.Timestamp(int(day), unit='D').date(), seconds))
+    for i in range(len(starts)):
+        assert got[i] == _reference_split(starts[i], stops[i], timezone)
+
+def test_lttb_keeps_endpoints_and_extremes():
+    values = np.zeros(1000)
+    values[321] = 50.0
+    values[654] = -20.0
+    picked = lttb_indices(values, 40)
+    assert len(picked) == 40
+    assert picked[0] == 0 and picked[-1] == 999
+    assert np.all(np.diff(picked) > 0)
+    # A lone spike or dip is the largest triangle in its bucket
+    assert 321 in picked and 654 in picked
+    # Series that already fit are returned whole
+    assert np.array_equal(lttb_indices(values[:10], 40), np.arange(10))
+
+def test_unlabelled_view_keeps_entries_without_project_apart():
+    totals = DailyTotals()
+    totals.apply([
+        {"id": 1, "start": "2024-01-01T10:00:00+00:00", "stop": "2024-01-01T11:00:00+00:00", "project_id": 5},
+        {"id": 2, "start": "2024-01-01T12:00:00+00:00", "stop": "2024-01-01T14:00:00+00:00", "project_id": None},
+    ])
+    view = totals.view(now=1704153600)
+    assert view.labels == [5, None]
+    assert view.seconds[:, 0].tolist() == [3600.0, 7200.0]
+
+def _rollup(totals, now):
+    # Long-format daily rollup of `totals`, as a snapshot stores it
+    view = totals.view(now=now)
+    rows, columns = np.nonzero(view.seconds)
+    days = view.days.to_numpy().astype('datetime64[D]').astype(np.int64)
+    return [view.labels[row] for row in rows], days[columns], view.seconds[rows, columns]
+
+@pytest.mark.parametrize("timezone", ["UTC", "Europe/Berlin"])
+def test_daily_totals_restored_from_rollup_match_and_accept_edits(timezone):
+    from focusledger.ingest import EntryColumns
+    entries = [_entry(i, i % 40, 1 + i % 5, project_id=i % 3 or None) for i in range(120)]
+    entries.append({"id": 500, "start": "2023-02-09T20:00:00+00:00", "stop": None, "project_id": 1})
+    exported = pd.Timestamp('2023-02-10T02:00:00+00:00').timestamp()
+    source = DailyTotals(timezone)
+    source.apply(entries)
+    restored = DailyTotals(timezone)
+    restored.restore(*_rollup(source, exported), EntryColumns.from_entries(entries), now=exported)
+    # Running entries count up to the time of the view, not of the rollup
+    later = exported + 3600
+    for totals in (source, restored):
+        assert totals.view(now=later).seconds.sum() == source.view(now=later).seconds.sum()
+    assert np.array_equal(_view(restored, now=later).seconds, _view(source, now=later).seconds)
+    # Edits and deletes of restored entries replace their contributions
+    edits = [_entry(3, 39, 2, project_id=2), _entry(4, 4, 1, server_deleted_at="2023-02-01T00:00:00Z"),
+             {"id": 500, "start": "2023-02-09T20:00:00+00:00", "stop": "2023-02-09T22:00:00+00:00", "project_id": 1}]
+    for totals in (source, restored):
+        totals.apply(edits)
+    assert np.array_equal(_view(restored, now=later).seconds, _view(source, now=later).seconds)
+    assert _view(restored, now=later).days.equals(_view(source, now=later).days)
+    assert len(restored) == len(source) == 120
+    with pytest.raises(ValueError):
+        restored.restore([], [], [], EntryColumns(), now=later)
+
+def test_daily_totals_restored_from_rollup_keep_project_order_and_empty_days():
+    from focusledger.ingest import EntryColumns
+    entries = [_entry(1, 0, 2, project_id=1), _entry(2, 0, 1, project_id=None), _entry(3, 1, 3, project_id=2),
+               # Only a zero-length entry on the last day
+               {"id": 4, "start": "2023-01-04T09:00:00+00:00", "stop": "2023-01-04T09:00:00+00:00", "project_id": 1}]
+    now = pd.Timestamp('2023-01-05T00:00:00+00:00').timestamp()
+    source = DailyTotals()
+    source.apply(entries)
+    restored = DailyTotals()
+    keys, days, seconds = _rollup(source, now)
+    # The rollup lists projects in view order, not in the order they were added
+    order = np.argsort([str(key) for key in keys], kind='stable')[::-1]
+    restored.restore([keys[i] for i in order], days[order], seconds[order], EntryColumns.from_entries(entries), now=now)
+    assert restored._keys == source._keys == [1, None, 2]
+    for totals in (restored, source):
+        assert list(totals.view(now=now).days.date) == [date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 3), date(2023, 1, 4)]
+    assert restored.view(now=now).labels == source.view(now=now).labels
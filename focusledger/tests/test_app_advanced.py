@@ -1,38 +1,227 @@
 import pytest
 import dash
 import os
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
-from focusledger.app import update_graphs
+from dash.exceptions import PreventUpdate
+from focusledger.app import load_dataset, update_cumulative_graph, update_average_graph, update_sumavg_graph
+from focusledger.datasets import DatasetRegistry
+from focusledger.tenants import TenantRegistry
 from focusledger.toggl_api import RateLimitError
 
+def _recent_entry():
+    now = datetime.now(timezone.utc)
+    return {"id": 1, "start": (now - timedelta(hours=3)).isoformat(), "stop": (now - timedelta(hours=1)).isoformat(), "project_id": 1}
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    # Isolate each test from the module-level stores and caches
+    monkeypatch.setattr("focusledger.app.tenants", TenantRegistry(max_tenants=4))
+
 def test_update_graph_success(monkeypatch):
     # Patch environment variable to simulate token
     with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
-        # Patch fetch_time_entries and fetch_projects to return fake data
-        with patch("focusledger.app.fetch_time_entries", return_value=[{"start": "2023-01-01T10:00:00+00:00", "stop": "2023-01-01T12:00:00+00:00", "project": "A"}]), \
-             patch("focusledger.app.fetch_projects", return_value=[{"id": 1, "name": "A", "color": "#ff0000"}]):
-            # Provide all required arguments for update_graphs
-            fig_cum, fig_avg, fig_sumavg, err_msg, err_open, banner_msg, banner_open = update_graphs(0, 7, 7, 7, 7, 7, 7, 7)
-            assert hasattr(fig_cum, "data")
-            assert hasattr(fig_avg, "data")
+        # Patch fetch_time_entries and the project cache to return fake data
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A", "color": "#ff0000"}]):
+            handle, err_msg, err_open, banner_msg, banner_open = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)
             assert err_open is False
             assert banner_open is False
+            fig_cum = update_cumulative_graph(handle, 7, 7)
+            fig_avg = update_average_graph(handle, 7, 7)
+            fig_sumavg = update_sumavg_graph(handle, 7, 7, 7)
+            assert [t.name for t in fig_cum.data] == ["A"]
+            assert hasattr(fig_avg, "data") and hasattr(fig_sumavg, "data")
 
 def test_update_graph_rate_limit(monkeypatch):
     with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
         # Patch fetch_time_entries to raise RateLimitError
-        with patch("focusledger.app.fetch_time_entries", side_effect=RateLimitError("Toggl API rate limit reached. Displaying partial data.")), \
-             patch("focusledger.app.fetch_projects", return_value=[]):
-            fig_cum, fig_avg, fig_sumavg, err_msg, err_open, banner_msg, banner_open = update_graphs(0, 7, 7, 7, 7, 7, 7, 7)
+        with patch("focusledger.app.fetch_time_entry_columns", side_effect=RateLimitError("Toggl API rate limit reached. Displaying partial data.")), \
+             patch("focusledger.app.project_cache.get", return_value=[]):
+            handle, err_msg, err_open, banner_msg, banner_open = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)
             assert banner_open is True
             assert "rate limit" in banner_msg.lower()
-
+            assert update_cumulative_graph(handle, 7, 7).layout.title.text == "No data available"
 
 def test_update_graph_general_error(monkeypatch):
     with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
         # Patch fetch_time_entries to raise a generic error
-        with patch("focusledger.app.fetch_time_entries", side_effect=Exception("Some error")), \
-             patch("focusledger.app.fetch_projects", return_value=[]):
-            fig_cum, fig_avg, fig_sumavg, err_msg, err_open, banner_msg, banner_open = update_graphs(0, 7, 7, 7, 7, 7, 7, 7)
+        with patch("focusledger.app.fetch_time_entry_columns", side_effect=Exception("Some error")), \
+             patch("focusledger.app.project_cache.get", return_value=[]):
+            handle, err_msg, err_open, banner_msg, banner_open = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)
+            assert handle is dash.no_update
             assert err_open is True
             assert "some error" in err_msg.lower()
+
+def test_update_graph_missing_token(monkeypatch):
+    monkeypatch.delenv("TOGGL_API_TOKEN", raising=False)
+    handle, err_msg, err_open, banner_msg, banner_open = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)
+    assert err_open is True
+    assert "TOGGL_API_TOKEN" in err_msg
+
+def test_update_graph_rate_limit_serves_stored_entries(monkeypatch):
+    from focusledger import app as app_module
+    app_module.tenants.get("dummy_token").store.merge([_recent_entry()])
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", side_effect=RateLimitError("rate limit")), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            handle, err_msg, err_open, banner_msg, banner_open = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)
+            assert banner_open is True
+            assert [t.name for t in update_cumulative_graph(handle, 7, 7).data] == ["A"]
+
+def test_exhausted_budget_serves_stale_data_with_its_age(monkeypatch):
+    from focusledger import app as app_module
+    from focusledger.toggl_client import BudgetExhaustedError
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]):
+                handle = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+            with patch("focusledger.app.fetch_time_entry_columns", side_effect=BudgetExhaustedError("budget", retry_in=60)):
+                handle, err_msg, err_open, banner_msg, banner_open = load_dataset(1, 7, 7, 7, 7, 7, 7, 7, "day", handle)
+            assert banner_open is True and err_open is False
+            assert "stale data from the last sync" in banner_msg
+            assert [t.name for t in update_cumulative_graph(handle, 7, 7).data] == ["A"]
+
+def test_graph_input_change_does_not_refetch(monkeypatch):
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]) as fetch, \
+             patch("focusledger.app.project_cache.get", return_value=[]):
+            handle = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+            calls = fetch.call_count
+            # A narrower window is already covered by the loaded history
+            with pytest.raises(PreventUpdate):
+                load_dataset(0, 3, 3, 7, 7, 7, 7, 7, "day", handle)
+            assert fetch.call_count == calls
+            # A wider window, or a Refresh click, loads again
+            assert load_dataset(0, 30, 7, 7, 7, 7, 7, 7, "day", handle)[0]["days"] == 36
+            assert load_dataset(1, 7, 7, 7, 7, 7, 7, 7, "day", handle)[0]["n_clicks"] == 1
+
+def test_graph_callbacks_wait_for_dataset():
+    with pytest.raises(PreventUpdate):
+        update_cumulative_graph(None, 7, 7)
+
+def test_graph_rebuilds_evicted_dataset(monkeypatch):
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            handle = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+            from focusledger import app as app_module
+            monkeypatch.setattr(app_module.tenants.get("dummy_token"), "datasets", DatasetRegistry())
+            assert [t.name for t in update_average_graph(handle, 7, 7).data] == ["A"]
+
+def test_graph_callbacks_never_backfill(monkeypatch):
+    from focusledger import app as app_module
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            handle = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+        # Another worker process: its own empty store and caches
+        monkeypatch.setattr(app_module, "tenants", TenantRegistry())
+        with patch("focusledger.app.fetch_time_entry_columns", side_effect=AssertionError("backfilled")), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            with pytest.raises(PreventUpdate):
+                update_average_graph(handle, 7, 7)
+    assert app_module.tenants.get("dummy_token").store.watermark is None
+
+def test_workers_sharing_a_store_file_draw_each_others_datasets(monkeypatch, tmp_path):
+    from focusledger import app as app_module
+    path = str(tmp_path / "{tenant}.sqlite3")
+    first, second = TenantRegistry(store_path=path), TenantRegistry(store_path=path)
+    second.get("dummy_token")
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}), \
+         patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+        monkeypatch.setattr(app_module, "tenants", first)
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]):
+            handle = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+        # The graph request lands on the other worker, which opened the file before the sync
+        monkeypatch.setattr(app_module, "tenants", second)
+        with patch("focusledger.app.fetch_time_entry_columns", side_effect=AssertionError("backfilled")):
+            assert [t.name for t in update_cumulative_graph(handle, 7, 7).data] == ["A"]
+    assert second.get("dummy_token").store.watermark == first.get("dummy_token").store.watermark
+    first.close()
+    second.close()
+
+def test_resolution_change_reloads_longer_history(monkeypatch):
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            daily = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+            # The same inputs now count months: 19 for the avg-of-sums graph, plus a partial one
+            monthly = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "month", daily)[0]
+            assert monthly["days"] == 20 * 31 and monthly["resolution"] == "month"
+            assert monthly["version"] != daily["version"]
+            fig = update_cumulative_graph(monthly, 7, 7)
+            assert fig.layout.title.text == "7-Month Running Total by Project"
+
+def test_window_labels_follow_resolution():
+    from focusledger.app import update_window_labels
+    assert update_window_labels("day")[:2] == ["Cumulative: Days to show", "Cumulative: Rolling window (days)"]
+    weekly = update_window_labels("week")
+    assert weekly[0] == "Cumulative: Weeks to show" and weekly[-1] == "Avg Window (weeks)"
+    assert all("month" in label.lower() for label in update_window_labels("month"))
+
+def test_multi_tenant_sessions_are_isolated(monkeypatch):
+    from focusledger import app as app_module
+    monkeypatch.setattr(app_module, "multi_tenant", True)
+    monkeypatch.delenv("TOGGL_API_TOKEN", raising=False)
+    projects = {"token-a": [{"id": 1, "name": "A"}], "token-b": [{"id": 1, "name": "B"}]}
+    with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]), \
+         patch("focusledger.app.project_cache.get", side_effect=projects.get):
+        # Without a session token nothing is loaded
+        assert load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None, None)[2] is True
+        handle_a = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None, "token-a")[0]
+        handle_b = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None, "token-b")[0]
+        assert handle_a["tenant"] != handle_b["tenant"]
+        assert [t.name for t in update_cumulative_graph(handle_a, 7, 7, "token-a").data] == ["A"]
+        assert [t.name for t in update_cumulative_graph(handle_b, 7, 7, "token-b").data] == ["B"]
+        # A session cannot read another tenant's dataset through its handle
+        with pytest.raises(PreventUpdate):
+            update_cumulative_graph(handle_a, 7, 7, "token-b")
+        assert app_module.tenants.get("token-a").store is not app_module.tenants.get("token-b").store
+
+def test_background_sync_serves_precomputed_totals(monkeypatch):
+    from focusledger import app as app_module
+    from focusledger.scheduler import SyncScheduler
+    scheduler = SyncScheduler(app_module.tenants, app_module.project_cache, interval=300)
+    monkeypatch.setattr(app_module, "scheduler", scheduler)
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", return_value=[_recent_entry()]) as fetch, \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            # The first load has nothing precomputed and syncs in the callback
+            handle = load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+            assert scheduler.status("dummy_token")["days"] == 19
+            calls = fetch.call_count
+            # Refresh then reads the synced totals and only nudges the worker
+            handle = load_dataset(1, 7, 7, 7, 7, 7, 7, 7, "day", handle)[0]
+            assert fetch.call_count == calls
+            assert [t.name for t in update_cumulative_graph(handle, 7, 7).data] == ["A"]
+
+def test_concurrent_refreshes_share_one_load(monkeypatch):
+    import threading
+    import time
+    from focusledger import app as app_module
+    release = threading.Event()
+    calls = []
+    def fetch(api_token, **kwargs):
+        calls.append(kwargs)
+        release.wait(5)
+        return [_recent_entry()]
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}):
+        with patch("focusledger.app.fetch_time_entry_columns", side_effect=fetch), \
+             patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+            shared = app_module._loads.shared
+            handles = []
+            threads = [threading.Thread(target=lambda: handles.append(load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while app_module._loads.shared < shared + 3:
+                assert time.monotonic() < deadline, "waiters never joined the in-flight loads"
+                time.sleep(0.001)
+            release.set()
+            for thread in threads:
+                thread.join()
+    # One chunked backfill (3 chunks of 7 days for the 19-day window) served all four
+    assert len(calls) == 3
+    assert len({h["version"] for h in handles}) == 1
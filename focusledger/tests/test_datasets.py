@@ -0,0 +1,25 @@
+import pandas as pd
+from focusledger.aggregation import DailyView
+from focusledger.datasets import DatasetRegistry
+from focusledger.figure_cache import view_version
+
+def _frame(day):
+    return DailyView(["A"], pd.date_range(f"2023-01-0{day}", periods=1), [[3600.0]])
+
+def test_put_returns_view_version():
+    registry = DatasetRegistry()
+    frame = _frame(1)
+    version = registry.put(frame)
+    assert version == view_version(frame)
+    assert registry.get(version) is frame
+    assert registry.get("missing") is None
+
+def test_registry_evicts_least_recently_used():
+    registry = DatasetRegistry(max_datasets=2)
+    first = registry.put(_frame(1))
+    second = registry.put(_frame(2))
+    registry.get(first)
+    registry.put(_frame(3))
+    assert len(registry) == 2
+    assert registry.get(second) is None
+    assert registry.get(first) is not None
@@ -0,0 +1,102 @@
+import threading
+import time
+from datetime import datetime, timezone
+import pytest
+from focusledger.fetching import chunk_ranges, fetch_dataset, iter_time_entry_chunks
+from focusledger.store import EntryStore
+from focusledger.toggl_api import PartialDataError, RateLimitError
+
+class FakeProjectCache:
+    def __init__(self, result=None, error=None, barrier=None):
+        self.result = result or []
+        self.error = error
+        self.barrier = barrier
+    def get(self, api_token):
+        if self.barrier:
+            self.barrier.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+def test_fetches_entries_and_projects_concurrently():
+    # Both calls must be in flight at once for the barrier to release
+    barrier = threading.Barrier(2, timeout=5)
+    def fetch(api_token, days=7, since=None, start=None, end=None):
+        barrier.wait()
+        return []
+    entries, projects, rate_limited = fetch_dataset("token", 7, EntryStore(), FakeProjectCache([{"id": 1}], barrier=barrier), fetch=fetch)
+    assert len(entries) == 0 and projects == [{"id": 1}] and rate_limited is False
+
+def test_rate_limit_serves_stored_entries():
+    store = EntryStore()
+    def fetch(api_token, days=7, since=None, start=None, end=None):
+        raise RateLimitError("rate limit")
+    entries, projects, rate_limited = fetch_dataset("token", 7, store, FakeProjectCache([{"id": 1}]), fetch=fetch)
+    assert rate_limited is True
+    assert projects == [{"id": 1}]
+
+def test_project_failure_falls_back_to_empty_list():
+    fetch = lambda api_token, days=7, since=None, start=None, end=None: []
+    _, projects, _ = fetch_dataset("token", 7, EntryStore(), FakeProjectCache(error=Exception("boom")), fetch=fetch)
+    assert projects == []
+
+def test_entry_errors_propagate():
+    def fetch(api_token, days=7, since=None, start=None, end=None):
+        raise Exception("Unauthorized: Invalid Toggl API token.")
+    with pytest.raises(Exception, match="Unauthorized"):
+        fetch_dataset("token", 7, EntryStore(), FakeProjectCache(), fetch=fetch)
+
+def test_chunk_ranges_cover_window_newest_first():
+    ranges = chunk_ranges(10, 4, now=1_000_000)
+    assert ranges == [(1_000_000 - 4 * 86400, 1_000_000), (1_000_000 - 8 * 86400, 1_000_000 - 4 * 86400), (1_000_000 - 10 * 86400, 1_000_000 - 8 * 86400)]
+
+def test_long_windows_get_longer_chunks():
+    assert len(chunk_ranges(21, 7, now=1_000_000, max_chunks=4)) == 3
+    ranges = chunk_ranges(365, 7, now=1_000_000, max_chunks=4)
+    assert len(ranges) == 4
+    assert ranges[0] == (1_000_000 - 92 * 86400, 1_000_000)
+    assert ranges[-1][0] == 1_000_000 - 365 * 86400
+
+def test_chunks_stream_as_they_arrive():
+    def fetch(api_token, start=None, end=None, **kwargs):
+        return [{"id": start}]
+    chunks = list(iter_time_entry_chunks("token", 21, chunk_days=7, fetch=fetch, now=1_000_000))
+    assert len(chunks) == 3
+    assert sorted(entries[0]["id"] for _, entries in chunks) == sorted(start for start, _ in chunk_ranges(21, 7, now=1_000_000))
+
+def test_rate_limited_chunk_reports_partial_data():
+    ranges = chunk_ranges(21, 7, now=1_000_000)
+    def fetch(api_token, start=None, end=None, **kwargs):
+        if start == ranges[1][0]:
+            raise RateLimitError("rate limit")
+        return [{"id": start}]
+    received = []
+    with pytest.raises(PartialDataError) as exc:
+        for _, entries in iter_time_entry_chunks("token", 21, chunk_days=7, fetch=fetch, now=1_000_000):
+            received.extend(entries)
+    assert len(received) == 2
+    assert exc.value.received == 2
+    assert exc.value.missing == [ranges[1]]
+
+def test_failed_chunk_is_retried():
+    attempts = []
+    def fetch(api_token, start=None, end=None, **kwargs):
+        attempts.append(start)
+        if len(attempts) < 3:
+            raise Exception("connection reset")
+        return [{"id": 1}]
+    chunks = list(iter_time_entry_chunks("token", 7, chunk_days=7, retries=2, fetch=fetch))
+    assert len(attempts) == 3
+    assert chunks[0][1] == [{"id": 1}]
+
+def test_partial_backfill_keeps_arrived_chunks():
+    store = EntryStore(chunk_days=1)
+    now = time.time()
+    def fetch(api_token, start=None, end=None, **kwargs):
+        if start < now - 1.5 * 86400:
+            raise RateLimitError("rate limit")
+        return [{"id": 1, "start": datetime.fromtimestamp(end - 60, timezone.utc).isoformat(), "stop": None}]
+    entries, _, rate_limited = fetch_dataset("token", 3, store, FakeProjectCache(), fetch=fetch)
+    assert rate_limited is True
+    assert [e["id"] for e in entries] == [1]
+    assert store.watermark is None
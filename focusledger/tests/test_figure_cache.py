@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from unittest.mock import patch
+from focusledger.aggregation import DailyView
+from focusledger.figure_cache import FigureCache, figure_bytes, view_version
+
+def _view(seconds, color_map=None):
+    return DailyView(["A"], pd.date_range("2023-01-01", periods=len(seconds)), [seconds], color_map=color_map)
+
+def test_view_version_tracks_content_and_colors():
+    base = view_version(_view([7200.0]))
+    assert base == view_version(_view([7200.0]))
+    assert base != view_version(_view([7200.0], {"A": "#ff0000"}))
+    assert base != view_version(_view([7200.0, 3600.0]))
+
+def test_get_or_build_reuses_figures():
+    cache = FigureCache()
+    builds = []
+    def build():
+        builds.append(1)
+        return px.line(title="graph")
+    first = cache.get_or_build(("cumulative", "v1", 7, 7), build)
+    assert cache.get_or_build(("cumulative", "v1", 7, 7), build) is first
+    cache.get_or_build(("cumulative", "v1", 14, 7), build)
+    assert len(builds) == 2
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+def test_lru_eviction_by_count():
+    cache = FigureCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, px.line(title=key))
+    cache.get("a")
+    cache.put("c", px.line(title="c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_memory_bound():
+    size = figure_bytes(px.line(title="x"))
+    cache = FigureCache(max_bytes=size * 2)
+    for key in ("a", "b", "c"):
+        cache.put(key, px.line(title="x"))
+    assert cache.stats()["entries"] == 2
+    assert cache.total_bytes <= size * 2
+    tiny = FigureCache(max_bytes=10)
+    tiny.put("a", px.line(title="x"))
+    assert tiny.get("a") is None
+
+def test_figure_size_is_estimated_without_serializing():
+    from focusledger.graphing import _line_figure
+    days = pd.date_range("2023-01-01", periods=365)
+    values = np.random.default_rng(0).random((8, 365)) * 3600
+    figure = _line_figure([f"p{i}" for i in range(8)], days, values, {}, "t", "y", "%{y}", "%{customdata}",
+                          max_points=0)
+    actual = len(figure.to_json())
+    cache = FigureCache()
+    with patch.object(type(figure), "to_json", side_effect=AssertionError("serialized")):
+        cache.put("a", figure)
+    assert abs(cache.total_bytes - actual) / actual < 0.1
+
+def test_concurrent_misses_build_the_figure_once():
+    import threading
+    import time
+    cache = FigureCache()
+    release = threading.Event()
+    builds = []
+    def build():
+        builds.append(1)
+        release.wait(5)
+        return px.line(title="built")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_build(("cumulative", "v1"), build))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache._builds.shared < 3:
+        assert time.monotonic() < deadline, "waiters never joined the in-flight build"
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert all(fig is results[0] for fig in results)
+
+def test_failed_builds_are_not_cached():
+    from focusledger.aggregation import DailyView
+    from focusledger.graphing import prepare_cumulative_graph
+    cache = FigureCache()
+    view = DailyView(["A"], pd.date_range("2023-01-01", periods=2), [[1.0, 2.0]])
+    with patch("focusledger.graphing._line_figure", side_effect=ValueError("bad")):
+        fallback = cache.get_or_build(("cumulative", "v1"), lambda: prepare_cumulative_graph(view))
+    assert fallback.layout.title.text == "No data available"
+    assert cache.stats()["entries"] == 0
+    figure = cache.get_or_build(("cumulative", "v1"), lambda: prepare_cumulative_graph(view))
+    assert figure.layout.title.text != "No data available"
+    assert cache.get(("cumulative", "v1")) is figure
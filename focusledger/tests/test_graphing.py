@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from focusledger.graphing import prepare_cumulative_graph, prepare_rolling_average_graph
 
@@ -179,3 +180,52 @@ def test_prepare_rolling_average_graph_handles_large_number_of_projects():
     fig = prepare_rolling_average_graph(entries, projects)
     assert len(fig.data) == 20
 
+def _long_view(n_projects=12, n_days=2000):
+    from focusledger.aggregation import DailyView
+    seconds = np.random.default_rng(3).random((n_projects, n_days)) * 7200
+    return DailyView([f"P{i}" for i in range(n_projects)], pd.date_range("2020-01-01", periods=n_days), seconds)
+
+def test_graph_carries_numeric_total_on_first_trace_only():
+    fig = prepare_cumulative_graph(_long_view(3, 10), days_to_show=10, rolling_window=1)
+    totals = np.asarray(fig.data[0].customdata)
+    assert np.allclose(totals, sum(np.asarray(t.y) for t in fig.data))
+    assert all(t.customdata is None for t in fig.data[1:])
+    assert "%{customdata:.1f}" in fig.data[0].hovertemplate
+
+def test_graph_downsamples_long_ranges_to_point_budget():
+    view = _long_view()
+    full = prepare_rolling_average_graph(view, days_to_show=2000, rolling_window=7, max_points=0)
+    lean = prepare_rolling_average_graph(view, days_to_show=2000, rolling_window=7, max_points=3000)
+    assert len(full.data[0].x) == 2000
+    assert sum(len(t.y) for t in lean.data) <= 3000
+    # Every trace keeps the same dates, including the first and last
+    assert all(list(t.x) == list(lean.data[0].x) for t in lean.data)
+    assert lean.data[0].x[0] == full.data[0].x[0] and lean.data[0].x[-1] == full.data[0].x[-1]
+    assert len(lean.to_json()) < len(full.to_json()) / 4
+
+def test_graph_switches_to_webgl_above_point_threshold():
+    from focusledger.graphing import prepare_rolling_avg_of_sum_graph
+    projects = [{"id": 1, "name": "Alpha", "color": "#ff0000"}]
+    entries = [{"start": "2023-01-01T10:00:00+00:00", "stop": "2023-01-01T12:00:00+00:00", "project_id": 1}]
+    assert prepare_cumulative_graph(entries, projects).data[0].type == "scatter"
+    fig = prepare_cumulative_graph(entries, projects, render="webgl")
+    assert fig.data[0].type == "scattergl"
+    # Colors and hover templates carry over to the WebGL traces
+    assert fig.data[0].line.color == "#ff0000"
+    assert fig.data[0].hovertemplate.startswith("<b>Total: %{customdata:.1f} hours</b>")
+    view = _long_view(12, 600)
+    assert prepare_rolling_avg_of_sum_graph(view, days_to_show=600, webgl_points=5000).data[0].type == "scattergl"
+    assert prepare_rolling_avg_of_sum_graph(view, days_to_show=600, render="svg").data[0].type == "scatter"
+
+def test_warm_up_builds_every_graph_without_errors():
+    from focusledger.graphing import warm_up
+    from focusledger.metrics import STAGE_ERRORS
+    before = sum(value for _, _, value in STAGE_ERRORS.samples())
+    assert warm_up() > 0
+    assert sum(value for _, _, value in STAGE_ERRORS.samples()) == before
+
+def test_graphing_does_not_import_plotly_express():
+    import subprocess, sys
+    from pathlib import Path
+    code = "import sys, focusledger.graphing; sys.exit('plotly.express' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parents[2]).returncode == 0
@@ -0,0 +1,61 @@
+import json
+import math
+import pytest
+from focusledger.ingest import EntryColumns, iter_json_array, read_entry_columns
+from focusledger.preprocessing import prepare_entries_frame
+
+ENTRIES = [
+    {"id": 1, "start": "2023-01-01T10:00:00Z", "stop": "2023-01-01T12:00:00Z", "project_id": 7, "duration": 7200, "description": "é ✓", "tags": ["a", "b"]},
+    {"id": 2, "start": "2023-01-02T10:00:00+00:00", "stop": None, "project_id": None, "duration": -1672653600},
+    {"id": 3, "start": "2023-01-03T10:00:00Z", "stop": "2023-01-03T11:00:00Z", "server_deleted_at": "2023-01-04T00:00:00Z"},
+]
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+@pytest.mark.parametrize("size", [1, 3, 17, 4096])
+def test_iter_json_array_across_chunk_boundaries(size):
+    body = json.dumps(ENTRIES, indent=2).encode("utf-8")
+    assert list(iter_json_array(_chunks(body, size))) == ENTRIES
+
+def test_iter_json_array_empty_and_invalid():
+    assert list(iter_json_array([b"[", b" ]"])) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"id": 1}']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"id": 1},']))
+
+def test_read_entry_columns_keeps_graph_fields():
+    columns = read_entry_columns(_chunks(json.dumps(ENTRIES).encode(), 10))
+    assert len(columns) == 3
+    frame = columns.to_frame()
+    assert list(frame.columns) == ["id", "start", "stop", "project_id", "duration", "deleted"]
+    assert frame["id"].tolist() == [1, 2, 3]
+    assert frame["start"][0] == 1672567200.0
+    assert math.isnan(frame["stop"][1]) and math.isnan(frame["project_id"][1])
+    assert frame["deleted"].tolist() == [0, 0, 1]
+
+def test_from_rows_round_trip():
+    columns = EntryColumns.from_rows([(5, 100, None, 3, 60), (6, 200, 260, None, None)])
+    assert list(columns) == [
+        {"id": 5, "start": 100.0, "stop": None, "project_id": 3, "duration": 60.0, "deleted": False},
+        {"id": 6, "start": 200.0, "stop": 260.0, "project_id": None, "duration": None, "deleted": False},
+    ]
+    assert len(EntryColumns.from_rows([])) == 0
+
+def test_latest_keeps_last_occurrence_of_each_id():
+    columns = EntryColumns.from_rows([(5, 100, 160, 3, 60), (6, 200, 260, None, 60), (5, 100, 220, 3, 120)])
+    assert [(entry["id"], entry["stop"]) for entry in columns.latest()] == [(6, 260.0), (5, 220.0)]
+    unique = EntryColumns.from_rows([(5, 100, 160, 3, 60)])
+    assert unique.latest() is unique
+
+def test_prepare_entries_frame_from_columns_matches_dicts():
+    columns = EntryColumns.from_entries(ENTRIES[:2])
+    projects = [{"id": 7, "name": "Seven", "color": "#123456"}]
+    # Entry 2 is still running an hour after it started
+    now = 1672657200.0
+    from_columns = prepare_entries_frame(columns, projects, now=now)
+    from_dicts = prepare_entries_frame(ENTRIES[:2], projects, now=now)
+    assert from_columns["project"].tolist() == from_dicts["project"].tolist() == ["Seven", "Unknown Project"]
+    assert from_columns["seconds"].tolist() == from_dicts["seconds"].tolist() == [7200.0, 3600.0]
+    assert (from_columns["start"] == from_dicts["start"]).all()
@@ -0,0 +1,86 @@
+import logging
+import os
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from focusledger import metrics
+from focusledger.metrics import Registry, STAGE_ERRORS, STAGE_SECONDS, timed, traced
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("demo_requests_total", "Requests", ["path"])
+    latency = registry.histogram("demo_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(path="/a")
+    requests.inc(2, path='/"b"')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    registry.collector(lambda: [("demo_items", "gauge", "Items", [({}, 3)])])
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter" in text
+    assert 'demo_requests_total{path="/a"} 1' in text
+    assert 'demo_requests_total{path="/\\"b\\""} 2' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert "demo_seconds_count 2" in text
+    assert "# TYPE demo_items gauge" in text and "demo_items 3" in text
+
+
+def test_timed_records_duration_and_errors():
+    before = STAGE_SECONDS.count(stage="test_stage")
+    with timed("test_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with timed("test_stage"):
+            raise ValueError("boom")
+    assert STAGE_SECONDS.count(stage="test_stage") == before + 2
+    assert STAGE_ERRORS.value(stage="test_stage", error="ValueError") >= 1
+
+
+def test_traced_callback_logs_its_stages(caplog):
+    @traced("demo_callback")
+    def callback(x):
+        with timed("first"):
+            pass
+        with timed("second"):
+            return x * 2
+
+    metrics.enable_trace()
+    try:
+        with caplog.at_level(logging.INFO, logger="focusledger.trace"):
+            assert callback(21) == 42
+    finally:
+        metrics.enable_trace(False)
+    message = caplog.records[-1].getMessage()
+    assert "callback=demo_callback outcome=ok" in message
+    assert "first=" in message and "second=" in message
+
+
+def test_graph_failures_are_counted_not_hidden():
+    from focusledger.aggregation import DailyView
+    from focusledger.graphing import prepare_cumulative_graph
+    before = STAGE_ERRORS.value(stage="build_cumulative", error="ValueError")
+    with patch("focusledger.graphing._line_figure", side_effect=ValueError("bad")):
+        fig = prepare_cumulative_graph(DailyView(["A"], pd.date_range("2023-01-01", periods=2), [[1.0, 2.0]]))
+    assert fig.layout.title.text == "No data available"
+    assert STAGE_ERRORS.value(stage="build_cumulative", error="ValueError") == before + 1
+
+
+def test_metrics_endpoint_reports_refresh_stages(monkeypatch):
+    from focusledger import app as app_module
+    from focusledger.tenants import TenantRegistry
+    monkeypatch.setattr(app_module, "tenants", TenantRegistry())
+    entry = {"id": 1, "start": "2023-01-01T10:00:00+00:00", "stop": "2023-01-01T12:00:00+00:00", "project_id": 1}
+    with patch.dict(os.environ, {"TOGGL_API_TOKEN": "dummy_token"}), \
+         patch("focusledger.app.fetch_time_entry_columns", return_value=[entry]), \
+         patch("focusledger.app.project_cache.get", return_value=[{"id": 1, "name": "A"}]):
+        handle = app_module.load_dataset(0, 7, 7, 7, 7, 7, 7, 7, "day", None)[0]
+        app_module.update_cumulative_graph(handle, 7, 7)
+        app_module.update_cumulative_graph(handle, 7, 7)
+    body = app_module.app.server.test_client().get("/metrics").get_data(as_text=True)
+    for stage in ("sync", "view", "build_cumulative"):
+        assert f'focusledger_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'focusledger_figure_cache_lookups_total{result="hit"} 1' in body
+    assert "focusledger_figure_estimated_bytes_count" in body
+    assert "focusledger_tenants 1" in body
@@ -0,0 +1,76 @@
+import pandas as pd
+from focusledger.preprocessing import prepare_entries_frame, project_lookups
+from focusledger.graphing import prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph
+
+ENTRIES = [
+    {"start": "2023-01-01T10:00:00+00:00", "stop": "2023-01-01T12:00:00+00:00", "project_id": 2},
+    {"start": "2023-01-02T10:00:00+00:00", "stop": "2023-01-02T10:30:00+00:00", "project_id": 1},
+    {"start": "2023-01-02T11:00:00+00:00", "stop": None, "project_id": 1},
+    {"start": "2023-01-03T10:00:00+00:00", "stop": "2023-01-03T11:00:00+00:00", "project_id": 99},
+    {"start": "2023-01-03T12:00:00+00:00", "stop": "2023-01-03T13:00:00+00:00", "project_id": None},
+]
+NOW = pd.Timestamp("2023-01-02T12:00:00+00:00").timestamp()
+PROJECTS = [
+    {"id": 1, "name": "Alpha", "color": "#ff0000"},
+    {"id": 2, "name": "Beta"},
+]
+
+def test_project_lookups():
+    project_map, color_map = project_lookups(PROJECTS)
+    assert project_map == {1: "Alpha", 2: "Beta"}
+    assert color_map == {"Alpha": "#ff0000"}
+
+def test_prepare_entries_frame_types():
+    frame = prepare_entries_frame(ENTRIES, PROJECTS)
+    assert list(frame.columns) == ["project", "start", "stop", "date", "seconds"]
+    assert isinstance(frame["project"].dtype, pd.CategoricalDtype)
+    assert str(frame["start"].dtype) == "datetime64[ns, UTC]"
+    assert str(frame["date"].dtype) == "datetime64[ns]"
+    assert frame["seconds"].dtype == "float32"
+    assert frame.attrs["color_map"] == {"Alpha": "#ff0000"}
+
+def test_prepare_entries_frame_values():
+    frame = prepare_entries_frame(ENTRIES, PROJECTS, now=NOW)
+    # The entry without a stop is running until NOW; categories keep first-appearance order
+    assert frame["project"].tolist() == ["Beta", "Alpha", "Alpha", "99", "Unknown Project"]
+    assert list(frame["project"].cat.categories) == ["Beta", "Alpha", "99", "Unknown Project"]
+    assert frame["seconds"].tolist() == [7200.0, 1800.0, 3600.0, 3600.0, 3600.0]
+    assert frame["date"].dt.day.tolist() == [1, 2, 2, 3, 3]
+
+def test_prepare_entries_frame_splits_at_midnight():
+    entries = [
+        {"start": "2023-01-01T22:00:00+00:00", "stop": "2023-01-03T01:00:00+00:00", "project": "A"},
+        {"start": "2023-01-03T23:30:00+00:00", "stop": None, "project": "B"},
+    ]
+    frame = prepare_entries_frame(entries, now=pd.Timestamp("2023-01-04T00:30:00+00:00").timestamp())
+    assert frame["project"].tolist() == ["A", "A", "A", "B", "B"]
+    assert frame["date"].dt.day.tolist() == [1, 2, 3, 3, 4]
+    assert frame["seconds"].tolist() == [7200.0, 86400.0, 3600.0, 1800.0, 1800.0]
+    assert frame["stop"].iloc[0] == pd.Timestamp("2023-01-02T00:00:00+00:00")
+
+def test_prepare_entries_frame_uses_local_days_across_dst():
+    entries = [
+        # 23:00 EST to noon EDT: the 12th is a 23-hour day in New York
+        {"start": "2023-03-12T04:00:00+00:00", "stop": "2023-03-12T16:00:00+00:00", "project": "A"},
+        # The whole 25-hour 5th of November, ending exactly at local midnight
+        {"start": "2023-11-05T04:00:00+00:00", "stop": "2023-11-06T05:00:00+00:00", "project": "A"},
+    ]
+    frame = prepare_entries_frame(entries, timezone="America/New_York")
+    assert frame["date"].dt.strftime("%m-%d").tolist() == ["03-11", "03-12", "11-05"]
+    assert frame["seconds"].tolist() == [3600.0, 11 * 3600.0, 25 * 3600.0]
+
+def test_prepare_entries_frame_empty_and_invalid():
+    assert prepare_entries_frame([]).empty
+    assert prepare_entries_frame([{"start": "not-a-date", "stop": None}]).empty
+
+def test_graphs_accept_shared_frame():
+    # Leave out the running entry, which keeps growing between the two builds
+    entries = [entry for entry in ENTRIES if entry["stop"]]
+    frame = prepare_entries_frame(entries, PROJECTS)
+    for build in (prepare_cumulative_graph, prepare_rolling_average_graph, prepare_rolling_avg_of_sum_graph):
+        from_frame = build(frame, days_to_show=3)
+        from_entries = build(entries, PROJECTS, days_to_show=3)
+        assert [t.name for t in from_frame.data] == [t.name for t in from_entries.data]
+        assert [list(t.y) for t in from_frame.data] == [list(t.y) for t in from_entries.data]
+    colors = {t.name: t.line.color for t in prepare_cumulative_graph(frame).data}
+    assert colors["Alpha"] == "#ff0000"
@@ -0,0 +1,128 @@
+import time
+from datetime import datetime, timedelta, timezone
+from focusledger.scheduler import SyncScheduler
+from focusledger.tenants import TenantRegistry
+from focusledger.toggl_api import RateLimitError
+
+
+def _entry(entry_id, hours_ago):
+    stop = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+    return {"id": entry_id, "start": (stop - timedelta(hours=1)).isoformat(), "stop": stop.isoformat(), "project_id": 1}
+
+
+class FakeProjects:
+    def __init__(self):
+        self.refreshed = []
+    def refresh(self, api_token):
+        self.refreshed.append(api_token)
+        return []
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(fetch, **kwargs):
+    clock = FakeClock()
+    tenants = TenantRegistry()
+    projects = FakeProjects()
+    return SyncScheduler(tenants, projects, fetch=fetch, clock=clock, **kwargs), tenants, projects, clock
+
+
+def test_watched_tokens_are_synced_on_schedule():
+    calls = []
+    def fetch(api_token, start=None, end=None, since=None):
+        calls.append((api_token, since))
+        return [_entry(len(calls), 2)] if since is None else []
+    scheduler, tenants, projects, clock = _scheduler(fetch, interval=60)
+    tenants.get("token")
+    scheduler.watch("token", 3)
+    assert scheduler.run_pending() == 60
+    assert tenants.get("token").store.covers(3)
+    assert len(tenants.get("token").store.totals) == 1
+    assert projects.refreshed == ["token"]
+    # Nothing is due until the interval has passed, then only changes are fetched
+    backfill_calls = len(calls)
+    scheduler.run_pending()
+    assert len(calls) == backfill_calls
+    clock.now += 60
+    scheduler.run_pending()
+    assert calls[-1][1] is not None and scheduler.syncs == 2
+
+
+def test_failed_sync_backs_off_and_recovers():
+    outcomes = [RateLimitError("rate limit"), RateLimitError("rate limit")]
+    def fetch(api_token, start=None, end=None, since=None):
+        if outcomes:
+            raise outcomes.pop(0)
+        return []
+    scheduler, tenants, projects, clock = _scheduler(fetch, interval=10, backoff_max=25)
+    tenants.get("token")
+    scheduler.watch("token", 1)
+    first_wait = scheduler.run_pending()
+    status = scheduler.status("token")
+    assert status["failures"] == 1 and status["rate_limited"]
+    assert 10 <= first_wait <= 20
+    # The backoff grows with each failure but stays under backoff_max
+    clock.now += first_wait
+    assert 10 <= scheduler.run_pending() <= 25
+    clock.now += 25
+    scheduler.run_pending()
+    assert scheduler.status("token")["failures"] == 0
+    assert not scheduler.status("token")["rate_limited"]
+
+
+def test_nudge_and_idle_tokens():
+    synced = []
+    def fetch(api_token, start=None, end=None, since=None):
+        synced.append(api_token)
+        return []
+    scheduler, tenants, projects, clock = _scheduler(fetch, interval=300, forget_after=600)
+    tenants.get("token")
+    scheduler.watch("token", 1)
+    scheduler.run_pending()
+    count = len(synced)
+    scheduler.nudge("token")
+    scheduler.run_pending()
+    assert len(synced) == count + 1
+    clock.now += 601
+    scheduler.run_pending()
+    assert scheduler.status("token") is None
+
+
+def test_background_thread_syncs_and_stops():
+    def fetch(api_token, start=None, end=None, since=None):
+        return [_entry(1, 2)]
+    tenants = TenantRegistry()
+    scheduler = SyncScheduler(tenants, FakeProjects(), interval=60, fetch=fetch)
+    scheduler.start()
+    tenants.get("token")
+    scheduler.watch("token", 1)
+    for _ in range(200):
+        if scheduler.syncs:
+            break
+        time.sleep(0.01)
+    scheduler.stop(timeout=5)
+    assert scheduler.syncs == 1
+    assert len(tenants.get("token").store.totals) == 1
+
+
+def test_tokens_of_evicted_tenants_are_forgotten():
+    synced = []
+    def fetch(api_token, start=None, end=None, since=None):
+        synced.append(api_token)
+        return []
+    clock = FakeClock()
+    tenants = TenantRegistry(max_tenants=1)
+    scheduler = SyncScheduler(tenants, FakeProjects(), interval=60, fetch=fetch, clock=clock)
+    for token in ("token-a", "token-b"):
+        tenants.get(token)
+        scheduler.watch(token, 1)
+    # token-a was dropped to make room for token-b: syncing it would bring it back and drop token-b
+    scheduler.run_pending()
+    assert set(synced) == {"token-b"}
+    assert scheduler.status("token-a") is None and tenants.peek("token-a") is None
+    assert tenants.evictions == 1
@@ -0,0 +1,61 @@
+import threading
+import time
+from focusledger.singleflight import SingleFlight
+
+
+def _concurrently(flight, key, fn, n=5):
+    started = threading.Event()
+    release = threading.Event()
+    results, errors = [], []
+
+    def leader():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(first):
+        try:
+            results.append(flight.do(key, leader if first else fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(True,))]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=call, args=(False,)) for _ in range(n - 1)]
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.shared < n - 1:
+        assert time.monotonic() < deadline, "waiters never joined the in-flight call"
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    calls = []
+    results, errors = _concurrently(flight, "key", lambda: calls.append(1) or len(calls))
+    assert results == [1] * 5 and not errors
+    assert flight.runs == 1 and flight.shared == 4
+    # Nothing is cached once the call has finished
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_errors_reach_every_waiting_caller():
+    flight = SingleFlight()
+    def fail():
+        raise ValueError("boom")
+    results, errors = _concurrently(flight, "key", fail, n=3)
+    assert not results and len(errors) == 3
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.runs == 2 and flight.shared == 0
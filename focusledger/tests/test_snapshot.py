@@ -0,0 +1,139 @@
+import sys
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from focusledger import snapshot
+from focusledger.snapshot import export_snapshot, import_snapshot, read_daily, read_snapshot
+from focusledger.store import EntryStore
+from focusledger.tenants import TenantRegistry, tenant_id
+
+NOW = datetime(2024, 3, 31, 12, tzinfo=timezone.utc)
+
+
+def _iso(hours_ago):
+    return (NOW - timedelta(hours=hours_ago)).isoformat()
+
+
+def _store(timezone="Europe/Berlin"):
+    store = EntryStore(timezone=timezone)
+    store.merge([
+        {"id": 1, "start": _iso(50), "stop": _iso(48), "project_id": 5, "duration": 7200},
+        # Crosses midnight (and the DST switch) in Berlin
+        {"id": 2, "start": _iso(14), "stop": _iso(9), "project_id": 6, "duration": 18000},
+        {"id": 3, "start": _iso(3), "stop": _iso(2), "project_id": None, "duration": 3600},
+        {"id": 4, "start": _iso(1), "stop": None, "project_id": 5, "duration": -1},
+    ])
+    return store
+
+
+def test_missing_pyarrow_is_explained(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pip install pyarrow"):
+        snapshot.require_pyarrow()
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_snapshot_round_trip_restores_entries_totals_and_sync_state(tmp_path, format):
+    pytest.importorskip("pyarrow")
+    source = _store()
+    with source._lock, source._conn:
+        source._set_meta("coverage", 1000)
+        source._set_meta("watermark", 2000)
+    paths = export_snapshot(source, str(tmp_path), format, now=NOW.timestamp())
+    assert sorted(paths) == ["daily", "entries"]
+
+    entries, metadata = read_snapshot(str(tmp_path))
+    assert list(entries) == list(source.load())
+    assert metadata["coverage"] == 1000 and metadata["timezone"] == "Europe/Berlin"
+
+    restored = EntryStore(timezone="Europe/Berlin")
+    assert import_snapshot(restored, str(tmp_path)) == 4
+    assert (restored.coverage, restored.watermark) == (1000, 2000)
+    before, after = source.totals.view(now=NOW.timestamp()), restored.totals.view(now=NOW.timestamp())
+    assert before.labels == after.labels and before.days.equals(after.days)
+    np.testing.assert_allclose(before.seconds, after.seconds)
+
+    daily = read_daily(str(tmp_path))
+    assert list(daily.columns) == ["project_id", "day", "seconds"]
+    assert daily["seconds"].sum() == pytest.approx(before.seconds.sum())
+    assert daily["project_id"].isna().any()
+
+
+def test_import_seeds_totals_from_the_daily_file(tmp_path):
+    pytest.importorskip("pyarrow")
+    source = _store()
+    with source._lock, source._conn:
+        source._set_meta("watermark", 2000)
+    export_snapshot(source, str(tmp_path / "snap"), "arrow", now=NOW.timestamp())
+    path = str(tmp_path / "copy.sqlite3")
+    restored = EntryStore(path, timezone="Europe/Berlin")
+    with patch.object(restored.totals, "apply", side_effect=AssertionError("entries were split on import")):
+        import_snapshot(restored, str(tmp_path / "snap"))
+    # Editing a restored entry replaces its contribution
+    edit = {"id": 2, "start": _iso(14), "stop": _iso(13), "project_id": 6, "duration": 3600}
+    for store in (source, restored):
+        store.merge([edit])
+    later = NOW.timestamp() + 600
+    before, after = source.totals.view(now=later), restored.totals.view(now=later)
+    assert before.labels == after.labels and before.days.equals(after.days)
+    np.testing.assert_allclose(before.seconds, after.seconds)
+    restored.close()
+    reopened = EntryStore(path, timezone="Europe/Berlin")
+    assert list(reopened.load()) == list(source.load())
+    assert reopened.watermark == 2000
+
+
+def test_import_ignores_a_daily_file_from_another_export(tmp_path):
+    pytest.importorskip("pyarrow")
+    import shutil
+    source = _store()
+    export_snapshot(source, str(tmp_path / "old"), "arrow", now=NOW.timestamp())
+    source.merge([{"id": 5, "start": _iso(30), "stop": _iso(29), "project_id": 7, "duration": 3600}])
+    export_snapshot(source, str(tmp_path / "new"), "arrow", now=NOW.timestamp() + 60)
+    # A reader that caught the new daily file next to the old entries
+    shutil.copy(tmp_path / "new" / "daily.arrow", tmp_path / "old" / "daily.arrow")
+    restored = EntryStore(timezone="Europe/Berlin")
+    import_snapshot(restored, str(tmp_path / "old"))
+    expected = _store().totals.view(now=NOW.timestamp())
+    view = restored.totals.view(now=NOW.timestamp())
+    assert view.labels == expected.labels
+    np.testing.assert_allclose(view.seconds, expected.seconds)
+
+
+def test_import_into_another_timezone_recomputes_the_totals(tmp_path):
+    pytest.importorskip("pyarrow")
+    export_snapshot(_store("Europe/Berlin"), str(tmp_path), now=NOW.timestamp())
+    restored = EntryStore(timezone="UTC")
+    import_snapshot(restored, str(tmp_path))
+    expected = _store("UTC").totals.view(now=NOW.timestamp())
+    np.testing.assert_allclose(restored.totals.view(now=NOW.timestamp()).seconds, expected.seconds)
+
+
+def test_snapshot_can_only_be_restored_into_an_empty_store(tmp_path):
+    pytest.importorskip("pyarrow")
+    export_snapshot(_store(), str(tmp_path))
+    with pytest.raises(ValueError):
+        import_snapshot(_store(), str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        read_snapshot(str(tmp_path / "missing"))
+
+
+def test_new_tenants_start_from_their_snapshot(tmp_path):
+    pytest.importorskip("pyarrow")
+    export_snapshot(_store(), str(tmp_path / tenant_id("token-a")))
+    tenants = TenantRegistry(timezone="Europe/Berlin", snapshot_path=str(tmp_path / "{tenant}"))
+    assert len(tenants.get("token-a").store.load()) == 4
+    # No snapshot for this account: it syncs from scratch
+    assert len(tenants.get("token-b").store.load()) == 0
+
+
+def test_command_line_export_and_import(tmp_path, capsys):
+    pytest.importorskip("pyarrow")
+    store = EntryStore(str(tmp_path / "source.sqlite3"))
+    store.merge([{"id": 1, "start": _iso(5), "stop": _iso(4), "project_id": 5}])
+    store.close()
+    snapshot.main(["export", str(tmp_path / "source.sqlite3"), str(tmp_path / "snap"), "--format", "arrow"])
+    snapshot.main(["import", str(tmp_path / "snap"), str(tmp_path / "copy.sqlite3")])
+    assert "Restored 1 entries" in capsys.readouterr().out
+    assert [e["id"] for e in EntryStore(str(tmp_path / "copy.sqlite3")).load()] == [1]
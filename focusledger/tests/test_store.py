@@ -0,0 +1,213 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from focusledger.store import EntryStore, SYNC_OVERLAP_SECONDS
+from focusledger.toggl_api import RateLimitError
+
+def _iso(days_ago):
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+
+class FakeToggl:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+    def __call__(self, api_token, days=7, since=None, start=None, end=None):
+        self.calls.append({"since": since, "range": None if start is None else (start, end)})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+def test_first_sync_fetches_window_and_persists(tmp_path):
+    path = str(tmp_path / "entries.sqlite3")
+    fetch = FakeToggl([[
+        {"id": 1, "start": _iso(1), "stop": _iso(1), "project_id": 5},
+        {"id": 2, "start": _iso(20), "stop": _iso(20), "project_id": 5},
+    ]])
+    store = EntryStore(path)
+    entries = store.sync("token", 7, fetch=fetch)
+    assert len(fetch.calls) == 1
+    start, end = fetch.calls[0]["range"]
+    assert end - start == 7 * 86400
+    assert [e["id"] for e in entries] == [1]
+    store.close()
+    reopened = EntryStore(path)
+    assert [e["id"] for e in reopened.load(30)] == [2, 1]
+    assert reopened.watermark is not None
+
+def test_incremental_sync_merges_edits_and_deletes():
+    store = EntryStore()
+    fetch = FakeToggl([
+        [{"id": 1, "start": _iso(2), "stop": _iso(2), "project_id": 10},
+         {"id": 2, "start": _iso(1), "stop": _iso(1)}],
+        [{"id": 1, "start": _iso(2), "stop": _iso(2), "project_id": 11},
+         {"id": 2, "start": _iso(1), "stop": _iso(1), "server_deleted_at": _iso(0)},
+         {"id": 3, "start": _iso(0), "stop": None}],
+    ])
+    store.sync("token", 7, fetch=fetch)
+    watermark = store.watermark
+    entries = store.sync("token", 7, fetch=fetch)
+    assert fetch.calls[1]["since"] == watermark - SYNC_OVERLAP_SECONDS
+    assert {e["id"]: e["project_id"] for e in entries} == {1: 11, 3: None}
+    assert [e["stop"] is None for e in entries] == [False, True]
+
+def test_wider_window_triggers_backfill():
+    store = EntryStore()
+    fetch = FakeToggl([[]] * 8)
+    store.sync("token", 7, fetch=fetch)
+    store.sync("token", 5, fetch=fetch)
+    assert fetch.calls[1]["since"] is not None
+    watermark = store.watermark
+    coverage = store.coverage
+    store.sync("token", 30, fetch=fetch)
+    # Only the 23 days before the old coverage, in 7-day chunks, then the changes since the last sync
+    ranges = [call["range"] for call in fetch.calls[2:6]]
+    assert len(fetch.calls) == 7
+    assert ranges[0][1] == coverage and ranges[-1][0] == store.coverage
+    assert all(newer[0] == older[1] for newer, older in zip(ranges, ranges[1:]))
+    assert fetch.calls[6] == {"since": watermark - SYNC_OVERLAP_SECONDS, "range": None}
+
+def test_wider_window_drops_entries_deleted_upstream():
+    store = EntryStore()
+    fetch = FakeToggl([
+        [{"id": 1, "start": _iso(1), "stop": _iso(1)}, {"id": 2, "start": _iso(2), "stop": _iso(2)}],
+        # Backfilling the 7 days before the coverage finds nothing; entry 2
+        # was deleted, which only the incremental feed reports
+        [],
+        [{"id": 2, "start": _iso(2), "stop": _iso(2), "server_deleted_at": _iso(0)}],
+    ])
+    store.sync("token", 7, fetch=fetch)
+    entries = store.sync("token", 14, fetch=fetch)
+    assert [e["id"] for e in entries] == [1]
+    assert len(store.totals) == 1
+
+def test_failed_sync_keeps_stored_data():
+    store = EntryStore()
+    fetch = FakeToggl([[{"id": 1, "start": _iso(1), "stop": _iso(1)}], RateLimitError("rate limit")])
+    store.sync("token", 7, fetch=fetch)
+    watermark = store.watermark
+    with pytest.raises(RateLimitError):
+        store.sync("token", 7, fetch=fetch)
+    assert store.watermark == watermark
+    assert [e["id"] for e in store.load(7)] == [1]
+
+def test_merge_ignores_entries_without_id_or_start():
+    store = EntryStore()
+    assert store.merge([{"start": _iso(1)}, {"id": 4, "start": "garbage"}]) == 0
+    assert len(store.load(7)) == 0
+
+def test_store_keeps_only_graph_fields():
+    store = EntryStore()
+    store.merge([{"id": 9, "start": _iso(1), "stop": None, "duration": -1700000000, "project_id": 3, "description": "dropped", "tags": ["x"]}])
+    [entry] = list(store.load(7))
+    assert set(entry) == {"id", "start", "stop", "project_id", "duration", "deleted"}
+    assert entry["project_id"] == 3 and entry["stop"] is None and entry["duration"] == -1700000000
+
+def test_old_schema_is_dropped_and_resynced(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("CREATE TABLE entries (id INTEGER PRIMARY KEY, start_ts INTEGER, payload TEXT);"
+                       "CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER);"
+                       "INSERT INTO meta VALUES ('watermark', 1);")
+    conn.commit()
+    conn.close()
+    store = EntryStore(path)
+    assert store.watermark is None
+    store.merge([{"id": 1, "start": _iso(1), "stop": _iso(1)}])
+    assert len(store.load(7)) == 1
+
+def test_merge_keeps_daily_totals_in_step(tmp_path):
+    path = str(tmp_path / "entries.sqlite3")
+    store = EntryStore(path)
+    store.merge([
+        {"id": 1, "start": "2023-01-01T10:00:00Z", "stop": "2023-01-01T11:00:00Z", "project_id": 5},
+        {"id": 2, "start": "2023-01-02T10:00:00Z", "stop": "2023-01-02T12:00:00Z", "project_id": 5},
+    ])
+    store.merge([{"id": 1, "start": "2023-01-01T10:00:00Z", "server_deleted_at": "2023-01-03T00:00:00Z"}])
+    assert store.totals.view().seconds.tolist() == [[7200.0]]
+    store.close()
+    # Reopening a persistent store rebuilds the totals from its rows
+    assert EntryStore(path).totals.view().seconds.tolist() == [[7200.0]]
+
+def test_sync_without_load_returns_none():
+    store = EntryStore()
+    fetch = FakeToggl([[{"id": 1, "start": _iso(1), "stop": _iso(1), "project_id": 5}]])
+    assert store.sync("token", 7, fetch=fetch, load=False) is None
+    assert len(store.totals) == 1
+
+def test_totals_split_days_in_store_timezone():
+    store = EntryStore(timezone="Europe/Berlin")
+    # 23:30 UTC is already the next day in Berlin
+    store.merge([
+        {"id": 1, "start": "2023-01-01T22:30:00Z", "stop": "2023-01-01T23:30:00Z", "project_id": 5},
+        {"id": 2, "start": "2023-01-02T08:00:00Z", "stop": None, "project_id": 5},
+    ])
+    view = store.totals.view(now=datetime(2023, 1, 2, 9, tzinfo=timezone.utc).timestamp())
+    assert [d.day for d in view.days] == [1, 2]
+    assert view.seconds.tolist() == [[1800.0, 1800.0 + 3600.0]]
+
+def test_processes_sharing_a_file_keep_their_own_sync_state(tmp_path):
+    path = str(tmp_path / "entries.sqlite3")
+    first = EntryStore(path)
+    second = EntryStore(path)
+    first.sync("token", 7, fetch=FakeToggl([[{"id": 1, "start": _iso(1), "stop": _iso(1), "project_id": 5}]]))
+    # The second process has not synced yet: it backfills and its totals include the entry
+    fetch = FakeToggl([[{"id": 1, "start": _iso(1), "stop": _iso(1), "project_id": 5}]])
+    second.sync("token", 7, fetch=fetch)
+    assert fetch.calls[0]["range"] is not None
+    assert len(second.totals) == 1
+
+def test_refresh_catches_up_with_another_process(tmp_path):
+    path = str(tmp_path / "entries.sqlite3")
+    first = EntryStore(path)
+    second = EntryStore(path)
+    assert not second.refresh()
+    first.sync("token", 7, fetch=FakeToggl([[{"id": 1, "start": _iso(1), "stop": _iso(1), "project_id": 5},
+                                             {"id": 2, "start": _iso(2), "stop": _iso(2), "project_id": 5}]]))
+    assert second.refresh()
+    assert second.covers(7) and second.watermark == first.watermark
+    assert len(second.totals) == 2
+    # Deletions another process synced drop out of the totals too
+    first.sync("token", 7, fetch=FakeToggl([[{"id": 2, "start": _iso(2), "stop": _iso(2), "server_deleted_at": _iso(0)}]]))
+    assert second.refresh() and len(second.totals) == 1
+    assert not second.refresh()
+    first.close()
+    second.close()
+
+def test_concurrent_identical_syncs_share_one_fetch():
+    import threading
+    import time
+    store = EntryStore()
+    release = threading.Event()
+    calls = []
+    def fetch(api_token, start=None, end=None, since=None):
+        calls.append((start, end, since))
+        release.wait(5)
+        return [{"id": 1, "start": _iso(1), "stop": _iso(1), "project_id": 5}]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.sync("token", 7, fetch=fetch))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while store._syncs.shared < 3:
+        assert time.monotonic() < deadline, "waiters never joined the in-flight sync"
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 4 and all(r is results[0] for r in results)
+
+def test_restore_fills_an_empty_store_with_sync_state():
+    source = EntryStore()
+    source.merge([
+        {"id": 1, "start": _iso(3), "stop": _iso(3), "project_id": 5, "duration": 60},
+        {"id": 2, "start": _iso(1), "stop": None, "project_id": None, "duration": -1},
+    ])
+    store = EntryStore()
+    store.restore(source.load(), coverage=100, watermark=200)
+    assert list(store.load()) == list(source.load())
+    assert len(store.totals) == 2
+    assert (store.coverage, store.watermark) == (100, 200)
+    with pytest.raises(ValueError):
+        store.restore(source.load(), coverage=100, watermark=200)
@@ -0,0 +1,80 @@
+import threading
+import pytest
+from focusledger.tenants import TenantRegistry, tenant_id
+
+
+def _entry(entry_id):
+    return {"id": entry_id, "start": "2023-01-01T10:00:00+00:00", "stop": "2023-01-01T12:00:00+00:00", "project_id": 1}
+
+
+def test_tenant_id_is_stable_and_hides_the_token():
+    assert tenant_id("secret-token") == tenant_id("secret-token")
+    assert tenant_id("secret-token") != tenant_id("other-token")
+    assert "secret" not in tenant_id("secret-token")
+
+
+def test_tenants_get_separate_stores_and_caches():
+    tenants = TenantRegistry()
+    a, b = tenants.get("token-a"), tenants.get("token-b")
+    assert tenants.get("token-a") is a
+    a.store.merge([_entry(1)])
+    assert len(a.store.totals) == 1 and len(b.store.totals) == 0
+    assert a.datasets is not b.datasets and a.figure_cache is not b.figure_cache
+
+
+def test_least_recently_used_tenant_is_dropped():
+    tenants = TenantRegistry(max_tenants=2)
+    a = tenants.get("token-a")
+    tenants.get("token-b")
+    tenants.get("token-a")
+    tenants.get("token-c")
+    assert len(tenants) == 2 and tenants.evictions == 1
+    assert tenants.get("token-a") is a
+
+
+def test_tenant_stores_reopen_from_their_own_files(tmp_path):
+    path = str(tmp_path / "{tenant}.sqlite3")
+    tenants = TenantRegistry(max_tenants=1, store_path=path)
+    tenants.get("token-a").store.merge([_entry(1), _entry(2)])
+    tenants.get("token-b").store.merge([_entry(3)])
+    assert (tmp_path / f"{tenant_id('token-a')}.sqlite3").exists()
+    # token-a was dropped; it comes back with its own entries only
+    assert len(tenants.get("token-a").store.totals) == 2
+    tenants.close()
+
+
+def test_refused_tokens_get_no_tenant_or_store_file(tmp_path):
+    def validate(api_token):
+        if api_token != "good-token":
+            raise Exception("Unauthorized: Invalid Toggl API token.")
+    tenants = TenantRegistry(max_tenants=1, store_path=str(tmp_path / "{tenant}.sqlite3"), validate=validate)
+    good = tenants.get("good-token")
+    with pytest.raises(Exception, match="Unauthorized"):
+        tenants.get("bogus-token")
+    assert not (tmp_path / f"{tenant_id('bogus-token')}.sqlite3").exists()
+    assert tenants.get("good-token") is good and tenants.evictions == 0
+    tenants.close()
+
+
+def test_tenants_are_created_outside_the_registry_lock():
+    started, release = threading.Event(), threading.Event()
+    validated = []
+    def validate(api_token):
+        validated.append(api_token)
+        if api_token == "slow-token":
+            started.set()
+            release.wait(5)
+    tenants = TenantRegistry(validate=validate)
+    ready = tenants.get("ready-token")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tenants.get("slow-token"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    # Lookups of other tenants do not wait for the slow one
+    assert tenants.get("ready-token") is ready
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 3 and all(tenant is results[0] for tenant in results)
+    assert validated.count("slow-token") == 1
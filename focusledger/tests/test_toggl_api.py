@@ -1,5 +1,6 @@
 import os
 import pytest
+from focusledger.toggl_client import TogglClient
 from focusledger.toggl_api import fetch_time_entries
 
 class MockResponse:
@@ -8,29 +9,61 @@ class MockResponse:
         self._json = json_data or []
         self.text = text
         self.ok = status_code == 200
+        self.headers = {}
     def json(self):
         return self._json
 
+@pytest.fixture(autouse=True)
+def no_retry_client(monkeypatch):
+    # Fail fast: error responses are returned without backoff sleeps
+    monkeypatch.setattr("focusledger.toggl_client._default_client", TogglClient(max_retries=0))
+
 def test_fetch_time_entries_success(monkeypatch):
-    def mock_get(url, params, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(200, json_data=[{"id": 1, "start": "2023-01-01T10:00:00+00:00", "stop": "2023-01-01T12:00:00+00:00", "project": "Test Project"}])
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     entries = fetch_time_entries("dummy_token", days=1)
     assert len(entries) == 1
     assert entries[0]["project"] == "Test Project"
 
 def test_fetch_time_entries_unauthorized(monkeypatch):
-    def mock_get(url, params, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(401, text="Unauthorized")
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     with pytest.raises(Exception) as exc:
         fetch_time_entries("bad_token", days=1)
     assert "Unauthorized" in str(exc.value)
 
 def test_fetch_time_entries_api_error(monkeypatch):
-    def mock_get(url, params, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(500, text="Internal Server Error")
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     with pytest.raises(Exception) as exc:
         fetch_time_entries("token", days=1)
     assert "Toggl API error" in str(exc.value)
+
+def test_fetch_time_entry_columns_streams_response(monkeypatch):
+    from focusledger.toggl_api import fetch_time_entry_columns
+    body = b'[{"id": 1, "start": "2023-01-01T10:00:00Z", "stop": "2023-01-01T12:00:00Z", "project_id": 4, "description": "x"}]'
+    class StreamingResponse(MockResponse):
+        closed = False
+        def iter_content(self, chunk_size=None):
+            return [body[i:i + 7] for i in range(0, len(body), 7)]
+        def close(self):
+            StreamingResponse.closed = True
+    def mock_get(session, url, params=None, auth=None, stream=False, **kwargs):
+        assert stream is True
+        return StreamingResponse(200)
+    monkeypatch.setattr("requests.Session.get", mock_get)
+    columns = fetch_time_entry_columns("dummy_token", days=1)
+    assert [e["project_id"] for e in columns] == [4]
+    assert StreamingResponse.closed
+
+def test_fetch_time_entry_columns_rate_limit(monkeypatch):
+    from focusledger.toggl_api import fetch_time_entry_columns, RateLimitError
+    class ClosingResponse(MockResponse):
+        def close(self):
+            pass
+    monkeypatch.setattr("requests.Session.get", lambda session, url, **kwargs: ClosingResponse(429))
+    with pytest.raises(RateLimitError):
+        fetch_time_entry_columns("token", days=1)
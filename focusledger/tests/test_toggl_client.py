@@ -0,0 +1,151 @@
+import pytest
+import requests
+import threading
+import time
+from focusledger.toggl_client import BudgetExhaustedError, TogglClient, _retry_after_seconds, get_client
+
+class MockResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.ok = status_code == 200
+
+class FakeSession(requests.Session):
+    def __init__(self, outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.calls = []
+    def get(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def make_client(outcomes, **kwargs):
+    sleeps = []
+    client = TogglClient(session=FakeSession(outcomes), sleep=sleeps.append, **kwargs)
+    return client, sleeps
+
+def test_get_passes_auth_timeouts_and_params():
+    client, _ = make_client([MockResponse(200)], base_url="http://toggl.test/api/v9/", connect_timeout=1, read_timeout=5)
+    resp = client.get("/me/time_entries", "token", params={"since": 1})
+    assert resp.status_code == 200
+    url, kwargs = client.session.calls[0]
+    assert url == "http://toggl.test/api/v9/me/time_entries"
+    assert kwargs["auth"] == ("token", "api_token")
+    assert kwargs["timeout"] == (1, 5)
+    assert kwargs["params"] == {"since": 1}
+
+def test_session_mounts_pooled_adapter():
+    client = TogglClient(pool_size=4)
+    adapter = client.session.get_adapter("https://api.track.toggl.com")
+    assert adapter._pool_maxsize == 4
+
+def test_retries_server_errors_with_bounded_backoff():
+    client, sleeps = make_client([MockResponse(503), MockResponse(502), MockResponse(200)], backoff_base=1, backoff_max=1.5)
+    assert client.get("/me/projects", "token").status_code == 200
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 1.5
+
+def test_honors_retry_after():
+    client, sleeps = make_client([MockResponse(429, {"Retry-After": "2"}), MockResponse(200)])
+    assert client.get("/me/projects", "token").status_code == 200
+    assert sleeps == [2.0]
+
+def test_long_retry_after_returns_rate_limit_immediately():
+    client, sleeps = make_client([MockResponse(429, {"Retry-After": "3600"})], backoff_max=10)
+    assert client.get("/me/projects", "token").status_code == 429
+    assert sleeps == []
+
+def test_gives_up_after_max_retries():
+    client, sleeps = make_client([MockResponse(500)] * 3, max_retries=2)
+    assert client.get("/me/projects", "token").status_code == 500
+    assert len(sleeps) == 2
+
+def test_retries_connection_errors_then_raises():
+    client, sleeps = make_client([requests.ConnectionError("reset"), requests.Timeout("slow")], max_retries=1)
+    with pytest.raises(requests.Timeout):
+        client.get("/me/projects", "token")
+    assert len(sleeps) == 1
+
+def test_client_errors_are_not_retried():
+    client, sleeps = make_client([MockResponse(401)])
+    assert client.get("/me/projects", "token").status_code == 401
+    assert sleeps == []
+
+def test_retry_after_http_date():
+    assert _retry_after_seconds(MockResponse(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert _retry_after_seconds(MockResponse(429, {"Retry-After": "soon"})) is None
+    assert _retry_after_seconds(MockResponse(429)) is None
+
+def test_get_client_is_shared(monkeypatch):
+    monkeypatch.setattr("focusledger.toggl_client._default_client", None)
+    monkeypatch.setenv("TOGGL_READ_TIMEOUT", "12")
+    monkeypatch.delenv("TOGGL_API_BASE_URL", raising=False)
+    client = get_client()
+    assert get_client() is client
+    assert client.timeout[1] == 12.0
+    assert client.base_url == "https://api.track.toggl.com/api/v9"
+
+def test_get_client_base_url_from_env(monkeypatch):
+    monkeypatch.setattr("focusledger.toggl_client._default_client", None)
+    monkeypatch.setenv("TOGGL_API_BASE_URL", "http://127.0.0.1:8099/api/v9/")
+    assert get_client().base_url == "http://127.0.0.1:8099/api/v9"
+
+def test_requests_are_rate_limited_per_token():
+    now = [0.0]
+    client, sleeps = make_client([MockResponse(200)] * 5, rate=2, burst=2, clock=lambda: now[0])
+    for token in ("a", "a", "a", "b", "a"):
+        client.get("/me", token)
+    # Token "a" spends its burst of 2, then waits 0.5 s and 1 s for refills; "b" has its own bucket
+    assert sleeps == [0.5, 1.0]
+
+def test_budget_fails_fast_instead_of_queueing_too_long():
+    now = [0.0]
+    client, sleeps = make_client([MockResponse(200)] * 2, rate=1, burst=1, max_wait=1.5, clock=lambda: now[0])
+    client.get("/me", "a", params={"n": 1})
+    client.get("/me", "a", params={"n": 2})
+    assert sleeps == [1.0]
+    # The next request would have to wait 2 s, longer than max_wait
+    with pytest.raises(BudgetExhaustedError):
+        client.get("/me", "a", params={"n": 3})
+    assert len(client.session.calls) == 2
+
+def test_exhausted_quota_and_rate_limits_block_the_token():
+    now = [0.0]
+    quota = {"X-Toggl-Quota-Remaining": "0", "X-Toggl-Quota-Resets-In": "600"}
+    client, _ = make_client([MockResponse(200, quota), MockResponse(429, {"Retry-After": "3600"}), MockResponse(200)],
+                            clock=lambda: now[0])
+    client.get("/me", "a")
+    with pytest.raises(BudgetExhaustedError) as error:
+        client.get("/me", "a", params={"again": 1})
+    assert error.value.retry_in == 600
+    # Another token is unaffected; its long Retry-After blocks it in turn
+    assert client.get("/me", "b").status_code == 429
+    with pytest.raises(BudgetExhaustedError):
+        client.get("/me", "b", params={"again": 1})
+    now[0] = 601
+    assert client.get("/me", "a", params={"later": 1}).status_code == 200
+    assert client.budget.status("a")["quota"] is None
+
+def test_concurrent_identical_gets_share_one_request():
+    release = threading.Event()
+    class SlowSession(FakeSession):
+        def get(self, url, **kwargs):
+            release.wait(5)
+            return super().get(url, **kwargs)
+    client = TogglClient(session=SlowSession([MockResponse(200)]))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get("/me/projects", "a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while client._inflight.shared < 3:
+        assert time.monotonic() < deadline, "waiters never joined the in-flight request"
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(client.session.calls) == 1
+    assert len(results) == 4 and all(r is results[0] for r in results)
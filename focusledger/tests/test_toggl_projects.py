@@ -1,4 +1,5 @@
 import pytest
+from focusledger.toggl_client import TogglClient
 from focusledger.toggl_projects import fetch_projects
 
 class MockResponse:
@@ -7,37 +8,144 @@ class MockResponse:
         self._json = json_data or []
         self.text = text
         self.ok = status_code == 200
+        self.headers = {}
     def json(self):
         return self._json
 
+@pytest.fixture(autouse=True)
+def no_retry_client(monkeypatch):
+    # Fail fast: error responses are returned without backoff sleeps
+    monkeypatch.setattr("focusledger.toggl_client._default_client", TogglClient(max_retries=0))
+
 def test_fetch_projects_success(monkeypatch):
-    def mock_get(url, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(200, json_data=[{"id": 1, "name": "Alpha", "color": "#ff0000"}])
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     projects = fetch_projects("dummy_token")
     assert isinstance(projects, list)
     assert projects[0]["name"] == "Alpha"
 
 def test_fetch_projects_unauthorized(monkeypatch):
-    def mock_get(url, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(401, text="Unauthorized")
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     with pytest.raises(Exception) as exc:
         fetch_projects("bad_token")
     assert "Unauthorized" in str(exc.value)
 
 def test_fetch_projects_rate_limit(monkeypatch):
-    def mock_get(url, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(429, text="Rate limit")
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     with pytest.raises(Exception) as exc:
         fetch_projects("token")
     assert "rate limit".lower() in str(exc.value).lower()
 
 def test_fetch_projects_api_error(monkeypatch):
-    def mock_get(url, auth):
+    def mock_get(session, url, params=None, auth=None, **kwargs):
         return MockResponse(500, text="Internal Server Error")
-    monkeypatch.setattr("requests.get", mock_get)
+    monkeypatch.setattr("requests.Session.get", mock_get)
     with pytest.raises(Exception) as exc:
         fetch_projects("token")
     assert "Toggl API error" in str(exc.value)
+
+# --- ProjectCache ---
+from focusledger.toggl_projects import ProjectCache, fetch_projects_conditional
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+class FakeConditionalFetch:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.etags = []
+    def __call__(self, api_token, etag=None):
+        self.etags.append(etag)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+def test_fetch_projects_conditional_not_modified(monkeypatch):
+    def mock_get(session, url, params=None, auth=None, headers=None, **kwargs):
+        assert headers == {"If-None-Match": "v1"}
+        return MockResponse(304)
+    monkeypatch.setattr("requests.Session.get", mock_get)
+    assert fetch_projects_conditional("token", "v1") == (None, "v1")
+
+def test_project_cache_hit_and_miss():
+    fetch = FakeConditionalFetch([([{"id": 1, "name": "Alpha"}], "v1")])
+    cache = ProjectCache(ttl=60, fetch=fetch, clock=FakeClock())
+    assert cache.get("token")[0]["name"] == "Alpha"
+    assert cache.get("token")[0]["name"] == "Alpha"
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1
+    assert stats["hit_rate"] == 0.5
+
+def test_project_cache_serves_stale_while_revalidating():
+    clock = FakeClock()
+    fetch = FakeConditionalFetch([([{"id": 1, "name": "Alpha"}], "v1"), (None, "v1"), ([{"id": 1, "name": "Renamed"}], "v2")])
+    cache = ProjectCache(ttl=60, fetch=fetch, clock=clock)
+    cache.get("token")
+    clock.now = 120
+    assert cache.get("token")[0]["name"] == "Alpha"
+    cache.join()
+    assert fetch.etags == [None, "v1"]
+    assert cache.stats()["not_modified"] == 1
+    clock.now = 240
+    assert cache.get("token")[0]["name"] == "Alpha"
+    cache.join()
+    assert cache.get("token")[0]["name"] == "Renamed"
+    assert cache.stats()["stale_hits"] == 2
+
+def test_project_cache_keeps_stale_projects_on_error():
+    clock = FakeClock()
+    fetch = FakeConditionalFetch([([{"id": 1, "name": "Alpha"}], None), Exception("boom")])
+    cache = ProjectCache(ttl=60, fetch=fetch, clock=clock)
+    cache.get("token")
+    clock.now = 120
+    assert cache.get("token")[0]["name"] == "Alpha"
+    cache.join()
+    assert cache.stats()["errors"] == 1
+    assert cache.get("token")[0]["name"] == "Alpha"
+
+def test_project_cache_drops_least_recently_used_tokens():
+    fetch = lambda api_token, etag=None: ([{"id": 1, "name": api_token}], None)
+    cache = ProjectCache(ttl=60, fetch=fetch, clock=FakeClock(), max_tokens=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+def test_project_cache_miss_propagates_errors():
+    cache = ProjectCache(fetch=FakeConditionalFetch([Exception("Unauthorized")]))
+    with pytest.raises(Exception):
+        cache.get("token")
+
+def test_project_cache_concurrent_misses_share_one_fetch():
+    import threading
+    import time
+    release = threading.Event()
+    calls = []
+    def fetch(api_token, etag=None):
+        calls.append(api_token)
+        release.wait(5)
+        return [{"id": 1, "name": "A"}], None
+    cache = ProjectCache(fetch=fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("token"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache._inflight.shared < 3:
+        assert time.monotonic() < deadline, "waiters never joined the in-flight fetch"
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["token"] and len(results) == 4
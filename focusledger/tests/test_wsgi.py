@@ -0,0 +1,29 @@
+import runpy
+from pathlib import Path
+from focusledger.app import app
+from focusledger.wsgi import server
+
+def test_wsgi_exposes_flask_server():
+    assert server is app.server
+    assert server.test_client().get("/").status_code == 200
+
+def test_gunicorn_config_reads_environment(monkeypatch):
+    monkeypatch.setenv("FOCUSLEDGER_WORKERS", "3")
+    monkeypatch.setenv("FOCUSLEDGER_THREADS", "16")
+    monkeypatch.setenv("FOCUSLEDGER_PRELOAD", "0")
+    config = runpy.run_path(str(Path(__file__).resolve().parents[2] / "gunicorn.conf.py"))
+    assert config["workers"] == 3 and config["threads"] == 16
+    assert config["preload_app"] is False and config["worker_class"] == "gthread"
+
+def test_wsgi_warm_up_can_be_disabled(monkeypatch):
+    import importlib
+    import focusledger.app
+    import focusledger.wsgi
+    calls = []
+    monkeypatch.setattr("focusledger.app.warm_up_on_start", False)
+    monkeypatch.setattr("focusledger.graphing.warm_up", lambda: calls.append(1))
+    importlib.reload(focusledger.wsgi)
+    assert calls == []
+    monkeypatch.setattr("focusledger.app.warm_up_on_start", True)
+    importlib.reload(focusledger.wsgi)
+    assert calls == [1]
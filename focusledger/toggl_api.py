@@ -1,29 +1,93 @@
-import requests
 from datetime import datetime, timedelta, timezone
+from focusledger.ingest import read_entry_columns
+from focusledger.metrics import ENTRIES_FETCHED, timed
+from focusledger.singleflight import SingleFlight
+from focusledger.toggl_client import RateLimitError, get_client
 
-def fetch_time_entries(api_token, days=7):
-    """
-    Fetch time entries from Toggl for the last `days` days.
-    Returns a list of entries.
-    Raises RateLimitError if rate limit is reached.
-    """
-    # Toggl API v9 expects 'since' as a unix timestamp (integer)
-    # Use timezone-aware UTC datetime for future compatibility
-    since_dt = datetime.now(timezone.utc) - timedelta(days=days)
-    since = int(since_dt.timestamp())
-    url = "https://api.track.toggl.com/api/v9/me/time_entries"
-    params = {"since": since}
-    auth = (api_token, "api_token")
-    resp = requests.get(url, params=params, auth=auth)
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Concurrent identical time-entry requests share one streamed response
+_inflight = SingleFlight()
+
+def _rfc3339(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _time_entry_params(days, since, start, end):
+    if start is not None and end is not None:
+        return {"start_date": _rfc3339(start), "end_date": _rfc3339(end)}
+    if since is None:
+        # Use timezone-aware UTC datetime for future compatibility
+        since_dt = datetime.now(timezone.utc) - timedelta(days=days)
+        since = int(since_dt.timestamp())
+    return {"since": since}
+
+
+def _check_time_entries_response(resp):
     if resp.status_code == 429:
         raise RateLimitError("Toggl API rate limit reached. Displaying partial data.")
     if resp.status_code == 401:
         raise Exception("Unauthorized: Invalid Toggl API token.")
     if not resp.ok:
         raise Exception(f"Toggl API error: {resp.status_code} {resp.text}")
-    return resp.json()
 
 
-# Custom exception for rate limiting
-class RateLimitError(Exception):
-    pass
+def fetch_time_entries(api_token, days=7, since=None, start=None, end=None, client=None):
+    """
+    Fetch time entries from Toggl for the last `days` days.
+    If `since` (unix timestamp) is given it overrides `days`; Toggl then returns
+    every entry modified after it, including deleted ones.
+    If `start` and `end` (unix timestamps) are given instead, Toggl returns the
+    entries that started in that range.
+    Requests go through `client`, or the shared TogglClient when omitted.
+    Returns a list of entries.
+    Raises RateLimitError if rate limit is reached.
+    """
+    # Toggl API v9 expects 'since' as a unix timestamp (integer)
+    params = _time_entry_params(days, since, start, end)
+    with timed("fetch_time_entries"):
+        resp = (client or get_client()).get("/me/time_entries", api_token, params=params)
+        _check_time_entries_response(resp)
+        entries = resp.json()
+    ENTRIES_FETCHED.inc(len(entries))
+    return entries
+
+
+def fetch_time_entry_columns(api_token, days=7, since=None, start=None, end=None, client=None):
+    """
+    Same request as fetch_time_entries, but the response body is parsed as it
+    streams in and only the fields the graphs use are kept. Callers asking for
+    the same entries at the same time share one request and its result.
+    Returns EntryColumns.
+    Raises RateLimitError if rate limit is reached, or BudgetExhaustedError
+    (a RateLimitError) without a request when the token's budget is used up.
+    """
+    params = _time_entry_params(days, since, start, end)
+    client = client or get_client()
+
+    def fetch():
+        with timed("fetch_time_entries"):
+            resp = client.get("/me/time_entries", api_token, params=params, stream=True)
+            try:
+                _check_time_entries_response(resp)
+                entries = read_entry_columns(resp.iter_content(chunk_size=STREAM_CHUNK_BYTES))
+            finally:
+                resp.close()
+        ENTRIES_FETCHED.inc(len(entries))
+        return entries
+
+    return _inflight.do((id(client), api_token, tuple(sorted(params.items()))), fetch)
+
+
+class PartialDataError(RateLimitError):
+    """
+    Raised when a chunked fetch was rate-limited part way through.
+    `received` is the number of entries that did arrive and `missing` the
+    (start, end) unix-time ranges that could not be fetched.
+    """
+
+    def __init__(self, message, received=0, missing=()):
+        super().__init__(message)
+        self.received = received
+        self.missing = list(missing)
+
@@ -0,0 +1,297 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from focusledger.singleflight import SingleFlight
+
+# Shared HTTP client for the Toggl API: one keep-alive connection pool,
+# connect/read timeouts and retries with exponential backoff and jitter.
+
+TOGGL_API_BASE_URL = "https://api.track.toggl.com/api/v9"
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class BudgetExhaustedError(RateLimitError):
+    """
+    Raised without contacting Toggl when an API token has no request budget
+    left; `retry_in` is the number of seconds until it is expected back.
+    """
+
+    def __init__(self, message, retry_in=None):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+def _retry_after_seconds(resp):
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds, or None."""
+    value = (getattr(resp, "headers", None) or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second up to `burst`.
+    reserve() takes a token even when none is left and returns how long the
+    caller must wait for it, so concurrent callers queue up in order; with
+    `max_wait`, a wait longer than that returns None and takes nothing.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def reserve(self, max_wait=None):
+        """Take one token; return the seconds to wait before using it, or None."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def wait(self):
+        """Seconds until a token is available, without taking it."""
+        with self._lock:
+            tokens = min(self.burst, self._tokens + (self._clock() - self._updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+def _header_number(resp, name):
+    value = (getattr(resp, "headers", None) or {}).get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RequestBudget:
+    """
+    Per-API-token request budget for the Toggl client.
+
+    Requests are paced by a TokenBucket of `rate` requests per second and
+    `burst` capacity (no pacing when `rate` is None). Toggl's own quota is
+    tracked from the X-Toggl-Quota-Remaining and X-Toggl-Quota-Resets-In
+    response headers, and a rate-limited response blocks the token for its
+    Retry-After. acquire() waits for the token's turn when that is at most
+    `max_wait` seconds away; otherwise it raises BudgetExhaustedError without
+    spending anything, so callers fall back to cached data instead of adding
+    to the rate limiting.
+    """
+
+    def __init__(self, rate=None, burst=1, max_wait=10.0, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self.exhausted = 0
+
+    def _state(self, api_token):
+        state = self._tokens.get(api_token)
+        if state is None:
+            bucket = TokenBucket(self.rate, self.burst, self._clock) if self.rate else None
+            state = self._tokens[api_token] = {"bucket": bucket, "quota": None, "blocked_until": 0.0}
+        return state
+
+    def _exhausted(self, retry_in):
+        self.exhausted += 1
+        raise BudgetExhaustedError(
+            f"Toggl API request budget exhausted; retry in {retry_in:.0f}s.", retry_in=retry_in
+        )
+
+    def acquire(self, api_token):
+        """
+        Claim one request for `api_token`; return the seconds to wait before
+        sending it. Raises BudgetExhaustedError when that would exceed max_wait.
+        """
+        with self._lock:
+            state = self._state(api_token)
+            blocked = state["blocked_until"] - self._clock()
+            if blocked > self.max_wait:
+                self._exhausted(blocked)
+            if state["quota"] == 0 and blocked <= 0:
+                # The reset time has passed; Toggl's next response reports the new quota
+                state["quota"] = None
+            elif state["quota"] == 0:
+                self._exhausted(blocked)
+            wait = max(0.0, blocked)
+            bucket = state["bucket"]
+        if bucket is not None:
+            delay = bucket.reserve(None if self.max_wait is None else self.max_wait - wait)
+            if delay is None:
+                with self._lock:
+                    self._exhausted(wait + bucket.wait())
+            wait += delay
+        return wait
+
+    def record(self, api_token, resp):
+        """Update the token's quota from the headers of a Toggl response."""
+        remaining = _header_number(resp, "X-Toggl-Quota-Remaining")
+        resets_in = _header_number(resp, "X-Toggl-Quota-Resets-In")
+        with self._lock:
+            state = self._state(api_token)
+            if remaining is not None:
+                state["quota"] = int(remaining)
+                if remaining <= 0 and resets_in is not None:
+                    state["blocked_until"] = max(state["blocked_until"], self._clock() + resets_in)
+
+    def block(self, api_token, seconds):
+        """Send no requests for `api_token` for the next `seconds` seconds."""
+        with self._lock:
+            state = self._state(api_token)
+            state["blocked_until"] = max(state["blocked_until"], self._clock() + seconds)
+
+    def status(self, api_token):
+        """Return the token's remaining quota (None when unknown) and seconds until it is unblocked."""
+        with self._lock:
+            state = self._state(api_token)
+            return {"quota": state["quota"], "blocked_for": max(0.0, state["blocked_until"] - self._clock())}
+
+
+class TogglClient:
+    """
+    Pooled, retrying HTTP client for the Toggl API v9.
+
+    GET requests that fail with a connection error, a timeout, 429 or 5xx are
+    retried up to `max_retries` times. The delay before a retry is the server's
+    Retry-After when present, otherwise full-jitter exponential backoff
+    (uniform between 0 and backoff_base * 2**attempt, capped at backoff_max).
+    A Retry-After longer than backoff_max is not waited out; the response is
+    returned so the caller can report the rate limit right away.
+
+    Every request (retries included) first claims its API token's
+    RequestBudget: it is paced to `rate` requests per second with `burst`
+    capacity, so one tenant's backfill cannot spend another tenant's quota,
+    and it fails fast with BudgetExhaustedError when Toggl's quota is used up
+    or the wait would exceed `max_wait` seconds. A rate-limited response the
+    client gives up on blocks the token for its Retry-After (or backoff_max).
+    Concurrent identical non-streamed GETs share one request and response.
+    """
+
+    def __init__(self, base_url=TOGGL_API_BASE_URL, connect_timeout=3.05, read_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=10.0, pool_size=10,
+                 session=None, sleep=time.sleep, rate=None, burst=1, max_wait=10.0, clock=time.monotonic):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self.budget = RequestBudget(rate, burst, max_wait, clock)
+        self._inflight = SingleFlight()
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _throttle(self, api_token):
+        delay = self.budget.acquire(api_token)
+        if delay > 0:
+            self._sleep(delay)
+
+    def _give_up(self, api_token, resp, delay=None):
+        if resp.status_code == 429:
+            self.budget.block(api_token, self.backoff_max if delay is None else delay)
+        return resp
+
+    def get(self, path, api_token, params=None, headers=None, stream=False):
+        """
+        GET `path` (relative to base_url) authenticated with `api_token`.
+        With `stream=True` the body is left unread for the caller to iterate.
+        Returns the final requests.Response; raises the last connection or
+        timeout error once retries are exhausted, and BudgetExhaustedError
+        when the token has no request budget left.
+        """
+        if stream:
+            return self._get(path, api_token, params, headers, stream)
+        key = (path, api_token, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+        return self._inflight.do(key, lambda: self._get(path, api_token, params, headers, stream))
+
+    def _get(self, path, api_token, params, headers, stream):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        auth = (api_token, "api_token")
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            self._throttle(api_token)
+            try:
+                resp = self.session.get(url, params=params, headers=headers, auth=auth,
+                                        timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self.budget.record(api_token, resp)
+                if resp.status_code not in RETRY_STATUSES or last_attempt:
+                    return self._give_up(api_token, resp, _retry_after_seconds(resp))
+                delay = _retry_after_seconds(resp)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                elif delay > self.backoff_max:
+                    return self._give_up(api_token, resp, delay)
+                if stream:
+                    # Release the unread body's connection back to the pool
+                    resp.close()
+            self._sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide TogglClient, creating it on first use from
+    TOGGL_API_BASE_URL (e.g. a local stand-in for load tests),
+    TOGGL_CONNECT_TIMEOUT, TOGGL_READ_TIMEOUT, TOGGL_MAX_RETRIES and the
+    per-token budget: TOGGL_RATE_LIMIT (requests per second, 0 for none),
+    TOGGL_RATE_BURST and TOGGL_RATE_MAX_WAIT (seconds to queue before
+    serving cached data).
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = TogglClient(
+                base_url=os.getenv("TOGGL_API_BASE_URL", TOGGL_API_BASE_URL),
+                connect_timeout=float(os.getenv("TOGGL_CONNECT_TIMEOUT", "3.05")),
+                read_timeout=float(os.getenv("TOGGL_READ_TIMEOUT", "30")),
+                max_retries=int(os.getenv("TOGGL_MAX_RETRIES", "3")),
+                rate=float(os.getenv("TOGGL_RATE_LIMIT", "1")),
+                burst=int(os.getenv("TOGGL_RATE_BURST", "4")),
+                max_wait=float(os.getenv("TOGGL_RATE_MAX_WAIT", "10")),
+            )
+        return _default_client
@@ -1,16 +1,163 @@
-import requests
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from focusledger.metrics import PROJECTS_FETCHED, timed
+from focusledger.singleflight import SingleFlight
+from focusledger.toggl_client import get_client
 
 # Fetch project metadata for display names
 
-def fetch_projects(api_token):
-    url = "https://api.track.toggl.com/api/v9/me/projects"
-    auth = (api_token, "api_token")
-    resp = requests.get(url, auth=auth)
-    if resp.status_code == 429:
-        raise Exception("Toggl API rate limit reached while fetching projects.")
-    if resp.status_code == 401:
-        raise Exception("Unauthorized: Invalid Toggl API token.")
-    if not resp.ok:
-        raise Exception(f"Toggl API error: {resp.status_code} {resp.text}")
-    return resp.json()
+def fetch_projects(api_token, client=None):
+    with timed("fetch_projects"):
+        resp = (client or get_client()).get("/me/projects", api_token)
+        if resp.status_code == 429:
+            raise Exception("Toggl API rate limit reached while fetching projects.")
+        if resp.status_code == 401:
+            raise Exception("Unauthorized: Invalid Toggl API token.")
+        if not resp.ok:
+            raise Exception(f"Toggl API error: {resp.status_code} {resp.text}")
+        projects = resp.json()
+    PROJECTS_FETCHED.inc(len(projects))
+    return projects
+
+
+def fetch_projects_conditional(api_token, etag=None, client=None):
+    """
+    Fetch projects, sending If-None-Match when an ETag from an earlier response is known.
+    Returns (projects, etag); projects is None when Toggl answers 304 Not Modified.
+    """
+    headers = {"If-None-Match": etag} if etag else None
+    with timed("fetch_projects"):
+        resp = (client or get_client()).get("/me/projects", api_token, headers=headers)
+        if resp.status_code == 304:
+            return None, etag
+        if resp.status_code == 429:
+            raise Exception("Toggl API rate limit reached while fetching projects.")
+        if resp.status_code == 401:
+            raise Exception("Unauthorized: Invalid Toggl API token.")
+        if not resp.ok:
+            raise Exception(f"Toggl API error: {resp.status_code} {resp.text}")
+        projects = resp.json()
+    PROJECTS_FETCHED.inc(len(projects))
+    return projects, resp.headers.get("ETag")
+
+
+class ProjectCache:
+    """
+    Per-token cache of project metadata with stale-while-revalidate.
+
+    Fresh entries (younger than `ttl` seconds) are served directly. Stale entries
+    are still served immediately while a background thread revalidates them with
+    a conditional request, so only the very first lookup for a token waits on Toggl;
+    concurrent first lookups share that one request.
+    At most `max_tokens` tokens are kept; the least recently used one is
+    dropped to make room (None keeps every token).
+    """
+
+    def __init__(self, ttl=300, fetch=fetch_projects_conditional, clock=time.monotonic, max_tokens=None):
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._fetch = fetch
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def get(self, api_token):
+        """
+        Return the projects for `api_token`.
+        Raises whatever the fetch raises when nothing is cached yet.
+        """
+        with self._lock:
+            entry = self._entries.get(api_token)
+            if entry is None:
+                self.misses += 1
+            elif self._clock() - entry["fetched_at"] < self.ttl:
+                self._entries.move_to_end(api_token)
+                self.hits += 1
+                return entry["projects"]
+            else:
+                self._entries.move_to_end(api_token)
+                self.stale_hits += 1
+                if api_token not in self._refreshing:
+                    thread = threading.Thread(target=self._revalidate, args=(api_token,), daemon=True)
+                    self._refreshing[api_token] = thread
+                    thread.start()
+                return entry["projects"]
+        return self._inflight.do(api_token, lambda: self._refresh(api_token))
+
+    def refresh(self, api_token):
+        """
+        Revalidate the projects for `api_token` now (a conditional request when
+        cached) and return them. Raises whatever the fetch raises.
+        """
+        return self._refresh(api_token)
+
+    def _refresh(self, api_token):
+        with self._lock:
+            entry = self._entries.get(api_token)
+        etag = entry["etag"] if entry else None
+        try:
+            projects, etag = self._fetch(api_token, etag)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+                self._refreshing.pop(api_token, None)
+            raise
+        with self._lock:
+            if entry is not None:
+                self.revalidations += 1
+            if projects is None:
+                # 304 Not Modified: keep the cached projects, restart the TTL
+                self.not_modified += 1
+                projects = entry["projects"]
+            self._entries[api_token] = {"projects": projects, "etag": etag, "fetched_at": self._clock()}
+            self._entries.move_to_end(api_token)
+            self._refreshing.pop(api_token, None)
+            while self.max_tokens is not None and len(self._entries) > self.max_tokens:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return projects
+
+    def _revalidate(self, api_token):
+        try:
+            self._refresh(api_token)
+        except Exception:
+            # Keep serving the stale projects; the next stale lookup retries
+            pass
+
+    def join(self, timeout=None):
+        """Wait for background revalidations that are currently running."""
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "not_modified": self.not_modified,
+                "errors": self.errors,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+
@@ -0,0 +1,12 @@
+from focusledger.app import app, warm_up_on_start
+from focusledger.graphing import warm_up
+
+# Production entry point: the Flask server behind the Dash app, for a WSGI
+# server such as gunicorn (see gunicorn.conf.py):
+#
+#   gunicorn -c gunicorn.conf.py focusledger.wsgi:server
+
+if warm_up_on_start:
+    warm_up()
+
+server = app.server
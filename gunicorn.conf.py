@@ -0,0 +1,23 @@
+import os
+
+# Gunicorn settings for serving FocusLedger in production:
+#
+#   gunicorn -c gunicorn.conf.py focusledger.wsgi:server
+#
+# Each worker process keeps its own stores and caches (in memory, or reopened
+# from FOCUSLEDGER_STORE files), request budget and background scheduler, and
+# threads within a worker share them. Workers sharing a store file catch up
+# with each other's syncs when a graph request needs history they lack.
+
+bind = os.getenv("FOCUSLEDGER_BIND", "0.0.0.0:8050")
+workers = int(os.getenv("FOCUSLEDGER_WORKERS", "2"))
+# Threads share a worker's caches; callbacks mostly wait on Toggl or SQLite
+worker_class = "gthread"
+threads = int(os.getenv("FOCUSLEDGER_THREADS", "8"))
+# Import the app (pandas, plotly, Dash) and warm up the graphs once in the master and fork workers from it
+preload_app = os.getenv("FOCUSLEDGER_PRELOAD", "1").lower() in ("1", "true", "yes")
+# A cold backfill of a long history can take a while
+timeout = int(os.getenv("FOCUSLEDGER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
@@ -24,3 +24,5 @@ echo "\nSetup complete! To activate the environment later, run:"
 echo "  source $ENV_DIR/bin/activate"
 echo "To run the app:"
 echo "  python focusledger/app.py"
+echo "To serve it in production:"
+echo "  gunicorn -c gunicorn.conf.py focusledger.wsgi:server"